@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+import database
+from config import ARCHIVE_INTERVAL, ARCHIVE_RETENTION_DAYS, ARCHIVE_BATCH, ARCHIVE_PAUSE
+from metrics import rows_archived
+
+logger = logging.getLogger(__name__)
+
+class Archiver:
+    # Moves rows older than the retention window out of the hot tables into <db>_archive.db,
+    # one small transaction per batch so handlers never wait behind a large DELETE
+    def __init__(self, interval: float = ARCHIVE_INTERVAL, retention_days: int = ARCHIVE_RETENTION_DAYS,
+                 batch_size: int = ARCHIVE_BATCH, pause: float = ARCHIVE_PAUSE):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def archive(self) -> Dict[str, int]:
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        moved = {}
+        for table in database.ARCHIVE_TABLES:
+            total = 0
+            while True:
+                count = await database.archive_batch(table, cutoff, self.batch_size)
+                total += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(self.pause)
+            moved[table] = total
+            if total:
+                rows_archived.inc(total, table=table)
+        if any(moved.values()):
+            logger.info(f"Перенесено в архив: {', '.join(f'{table} {count}' for table, count in moved.items())}")
+        return moved
+
+    async def run(self):
+        while True:
+            try:
+                await self.archive()
+            except Exception as e:
+                logger.error(f"Ошибка архивации: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import aiosqlite
+
+import database
+from config import BACKUP_DIR, BACKUP_KEEP, BACKUP_INTERVAL, BACKUP_PAGES, BACKUP_SLEEP, BACKUP_MAX_RESTARTS
+from metrics import backup_duration, backups_total, last_backup_timestamp
+
+logger = logging.getLogger(__name__)
+
+class _TooManyRestarts(Exception):
+    pass
+
+class _BackupProgress:
+    # A write to the source from another connection makes SQLite restart the copy from page 0;
+    # raising from the progress callback aborts the stepped backup so we can fall back.
+    def __init__(self, max_restarts: int):
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.steps = 0
+        self._remaining = None
+
+    def __call__(self, status: int, remaining: int, total: int):
+        self.steps += 1
+        if self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1
+            if self.restarts > self.max_restarts:
+                raise _TooManyRestarts()
+        self._remaining = remaining
+
+class BackupManager:
+    def __init__(self, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP, interval: float = BACKUP_INTERVAL,
+                 pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP, max_restarts: int = BACKUP_MAX_RESTARTS):
+        self.directory = directory
+        self.keep = keep
+        self.interval = interval
+        self.pages = pages
+        self.sleep = sleep
+        self.max_restarts = max_restarts
+        self._lock = asyncio.Lock()
+
+    def snapshots(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith("game_bot-") and name.endswith(".db"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def rotate(self) -> List[str]:
+        removed = self.snapshots()[:-self.keep] if self.keep > 0 else []
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    async def _copy(self, target_path: str) -> _BackupProgress:
+        progress = _BackupProgress(self.max_restarts)
+        async with aiosqlite.connect(database.DB_NAME) as source, aiosqlite.connect(target_path) as target:
+            try:
+                await source.backup(target, pages=self.pages, progress=progress, sleep=self.sleep)
+            except _TooManyRestarts:
+                logger.warning(f"Бэкап перезапускался {progress.restarts} раз из-за записи, копирую за один проход")
+                await source.backup(target, pages=-1)
+        return progress
+
+    async def _integrity_check(self, path: str) -> str:
+        async with aiosqlite.connect(path) as db:
+            cursor = await db.execute("PRAGMA integrity_check")
+            rows = await cursor.fetchall()
+        return "; ".join(row[0] for row in rows)
+
+    async def snapshot(self) -> Dict:
+        async with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"game_bot-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+            partial = path + ".part"
+            started = time.perf_counter()
+            try:
+                progress = await self._copy(partial)
+                integrity = await self._integrity_check(partial)
+                if integrity != "ok":
+                    raise RuntimeError(f"integrity_check: {integrity}")
+                os.replace(partial, path)
+            except Exception:
+                backups_total.inc(result="error")
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+            duration = time.perf_counter() - started
+            backup_duration.observe(duration)
+            backups_total.inc(result="ok")
+            last_backup_timestamp.set(time.time())
+            removed = self.rotate()
+            return {
+                "path": path,
+                "size": os.path.getsize(path),
+                "duration": duration,
+                "steps": progress.steps,
+                "restarts": progress.restarts,
+                "removed": len(removed),
+            }
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await self.snapshot()
+                logger.info(f"Бэкап {result['path']} ({result['size'] // 1024} КБ) за {result['duration']:.1f} с")
+            except Exception as e:
+                logger.error(f"Ошибка бэкапа: {e}")
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+
+import database
+from backup import BackupManager
+from benchmarks.harness import UpdateFactory, Report, use_temp_database, load_bot, seed_users, drive, choose_user, percentile
+from benchmarks.loadtest import SCENARIOS, build_scenarios
+
+async def run_load(main, builders, user_ids, args, seed: int) -> Report:
+    rng = random.Random(seed)
+    scenarios = args.scenarios or list(SCENARIOS)
+
+    def make_update(i):
+        scenario = scenarios[i % len(scenarios)]
+        return scenario, builders[scenario](choose_user(user_ids, rng))
+
+    report = Report()
+    await drive(main.dp, main.bot, make_update, args.updates, args.rate, args.concurrency, report)
+    return report
+
+def overall_p99(report: Report) -> float:
+    return percentile([value for values in report.latencies.values() for value in values], 0.99) * 1000
+
+async def run(args):
+    use_temp_database(args.snapshot)
+    main, session = load_bot()
+    await database.init_db()
+
+    if args.snapshot:
+        user_ids = [user["user_id"] for user in await database.get_all_users()][:args.users]
+    else:
+        user_ids = await seed_users(args.users)
+    auction_ids = [await database.create_auction("starter", 100, 24) for _ in range(3)]
+    builders = build_scenarios(UpdateFactory(), user_ids, auction_ids, random.Random(args.seed))
+
+    baseline = await run_load(main, builders, user_ids, args, args.seed)
+
+    manager = BackupManager(tempfile.mkdtemp(prefix="bench_backup_"), keep=2, pages=args.pages, sleep=args.sleep)
+    backups = []
+
+    async def backup_loop():
+        while True:
+            backups.append(await manager.snapshot())
+
+    backup_task = asyncio.create_task(backup_loop())
+    with_backup = await run_load(main, builders, user_ids, args, args.seed)
+    backup_task.cancel()
+    try:
+        await backup_task
+    except asyncio.CancelledError:
+        pass
+
+    result = {
+        "pages": args.pages,
+        "sleep": args.sleep,
+        "baseline_p99_ms": round(overall_p99(baseline), 2),
+        "backup_p99_ms": round(overall_p99(with_backup), 2),
+        "baseline_throughput_ups": baseline.as_dict()["throughput_ups"],
+        "backup_throughput_ups": with_backup.as_dict()["throughput_ups"],
+        "backups": len(backups),
+        "backup_duration_s": [round(item["duration"], 3) for item in backups],
+        "backup_restarts": [item["restarts"] for item in backups],
+        "backup_size_bytes": backups[-1]["size"] if backups else 0,
+    }
+    print(f"p99 without backup: {result['baseline_p99_ms']} ms, during backups: {result['backup_p99_ms']} ms")
+    print(f"throughput without backup: {result['baseline_throughput_ups']} upd/s, during backups: {result['backup_throughput_ups']} upd/s")
+    print(f"backups completed: {result['backups']}  durations: {result['backup_duration_s']}  restarts: {result['backup_restarts']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure handler latency while online backups run")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS)
+    parser.add_argument("--snapshot", help="copy of a game_bot.db to run against instead of seeding")
+    parser.add_argument("--pages", type=int, default=256, help="pages copied per backup step")
+    parser.add_argument("--sleep", type=float, default=0.01, help="pause between backup steps")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import database
+from benchmarks.gen_data import FIRST_USER_ID, generate
+from benchmarks.harness import percentile
+
+DEFAULT_SCALES = (10000, 100000, 1000000)
+
+class Context:
+    def __init__(self, users: int, seed: int):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.auction_id = None
+        self.bid = 10 ** 9
+
+    def user_id(self) -> int:
+        return FIRST_USER_ID + self.rng.randrange(self.users)
+
+    def internal_id(self) -> int:
+        return self.rng.randrange(self.users) + 1
+
+    def next_bid(self) -> int:
+        self.bid += 100
+        return self.bid
+
+# Argument builders for every public coroutine in database.py; functions
+# without an entry are reported as skipped so new ones are not silently missed.
+ARGUMENTS = {
+    "init_db": lambda ctx: (),
+    "get_next_internal_id": lambda ctx: (),
+    "get_or_create_user": lambda ctx: (ctx.user_id(),),
+    "update_user_names": lambda ctx: (ctx.user_id(), "bench", "Bench User"),
+    "get_user_stars": lambda ctx: (ctx.user_id(),),
+    "add_stars": lambda ctx: (ctx.user_id(), 10),
+    "spend_stars": lambda ctx: (ctx.user_id(), 10),
+    "buy_farm": lambda ctx: (ctx.user_id(), "starter"),
+    "activate_farms": lambda ctx: (ctx.user_id(),),
+    "get_user_farms": lambda ctx: (ctx.user_id(),),
+    "get_income_state": lambda ctx: (ctx.user_id(),),
+    "expire_farms_batch": lambda ctx: (500,),
+    "refresh_expired_income_batch": lambda ctx: (500,),
+    "get_farm_expiries": lambda ctx: (datetime.now().isoformat(), 0, 1000),
+    "get_user_farm_summary": lambda ctx: (ctx.user_id(),),
+    "rebuild_income_state": lambda ctx: (),
+    "buy_nft": lambda ctx: (ctx.user_id(), "golden_coin"),
+    "get_user_nfts": lambda ctx: (ctx.user_id(),),
+    "calculate_total_boost": lambda ctx: (ctx.user_id(),),
+    "collect_farm_income": lambda ctx: (ctx.user_id(),),
+    "register_referral": lambda ctx: (ctx.user_id(), ctx.user_id()),
+    "give_referral_reward": lambda ctx: (ctx.user_id(),),
+    "get_referral_count": lambda ctx: (ctx.user_id(),),
+    "create_auction": lambda ctx: ("starter", 100, 24),
+    "get_active_auctions": lambda ctx: (),
+    "place_bid": lambda ctx: (ctx.auction_id, ctx.user_id(), ctx.next_bid()),
+    "end_auction": lambda ctx: (ctx.auction_id,),
+    "is_banned": lambda ctx: (ctx.user_id(),),
+    "ban_user": lambda ctx: (ctx.user_id(), "bench", 0),
+    "unban_user": lambda ctx: (ctx.user_id(),),
+    "admin_add_stars": lambda ctx: (ctx.user_id(), 10),
+    "admin_add_farm": lambda ctx: (ctx.user_id(), "starter"),
+    "admin_add_nft": lambda ctx: (ctx.user_id(), "golden_coin"),
+    "get_all_users": lambda ctx: (),
+    "get_all_chats": lambda ctx: (),
+    "add_chat": lambda ctx: (-ctx.user_id(), "group", "bench"),
+    "add_chat_member": lambda ctx: (-1000000000000, ctx.user_id()),
+    "remove_chat_member": lambda ctx: (-1000000000000, ctx.user_id()),
+    "record_daily_stats": lambda ctx: (datetime.now().date().isoformat(), {"casino_bets": 100, "casino_payouts": 50}),
+    "mark_active_users": lambda ctx: (datetime.now().date().isoformat(), [ctx.user_id() for _ in range(100)]),
+    "get_stats_snapshot": lambda ctx: ((datetime.now() - timedelta(days=6)).date().isoformat(),),
+    "rebuild_stats_totals": lambda ctx: (),
+    "search_users": lambda ctx: (ctx.rng.choice(["player1", "@player2", "Player 3", str(ctx.internal_id())]), 9),
+    "get_target_user_ids": lambda ctx: ("internal_id BETWEEN ? AND ?", (1, 5000), 0, 5000),
+    "bulk_add_stars": lambda ctx: ([ctx.user_id() for _ in range(1000)], 1),
+    "bulk_add_farm": lambda ctx: ([ctx.user_id() for _ in range(1000)], "starter"),
+    "bulk_add_nft": lambda ctx: ([ctx.user_id() for _ in range(1000)], "snoop_dogg"),
+    "bulk_ban": lambda ctx: ([ctx.user_id() for _ in range(1000)], "bench", 0),
+    "bulk_unban": lambda ctx: ([ctx.user_id() for _ in range(1000)],),
+    "get_leaderboard": lambda ctx: ("stars", 10, -1000000000000 if ctx.rng.random() < 0.5 else None),
+    "get_user_rank": lambda ctx: (ctx.user_id(), "stars"),
+    "get_users_brief": lambda ctx: ([ctx.user_id() for _ in range(10)],),
+    "get_user_by_internal_id": lambda ctx: (ctx.internal_id(),),
+    "get_user_info_by_internal_id": lambda ctx: (ctx.internal_id(),),
+    "rebuild_search_index": lambda ctx: (),
+    "archive_batch": lambda ctx: (ctx.rng.choice(list(database.ARCHIVE_TABLES)), (datetime.now() - timedelta(days=1)).date().isoformat(), 500),
+    "get_archive_summary": lambda ctx: (),
+    "get_archived_user_history": lambda ctx: (ctx.user_id(),),
+    "optimize": lambda ctx: (),
+    "incremental_vacuum": lambda ctx: (100,),
+    "get_storage_stats": lambda ctx: (),
+    "get_recent_user_names": lambda ctx: ((datetime.now() - timedelta(days=7)).date().isoformat(), 5000),
+    "load_bans": lambda ctx: (),
+    "reprice_activations_batch": lambda ctx: ({"starter"}, 0, 500),
+    "reboost_holders_batch": lambda ctx: ({"golden_coin"}, 0, 500),
+}
+
+# Run last: they invalidate state the other benchmarks rely on
+RUN_LAST = ("end_auction", "rebuild_income_state", "rebuild_stats_totals")
+
+def public_functions():
+    functions = {}
+    for name, obj in vars(database).items():
+        if name.startswith("_") or not inspect.iscoroutinefunction(obj):
+            continue
+        if getattr(obj, "__module__", None) == database.__name__:
+            functions[name] = obj
+    ordered = sorted(functions, key=lambda name: (name in RUN_LAST, name))
+    return [(name, functions[name]) for name in ordered]
+
+async def time_function(func, build_args, ctx: Context, min_iterations: int, time_budget: float):
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_iterations or (time.perf_counter() - started < time_budget and len(samples) < 10000):
+        args = build_args(ctx)
+        call_started = time.perf_counter()
+        await func(*args)
+        samples.append(time.perf_counter() - call_started)
+    return {
+        "calls": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+async def bench_scale(path: str, users: int, args) -> dict:
+    database.DB_NAME = path
+    ctx = Context(users, args.seed)
+    ctx.auction_id = await database.create_auction("starter", 100, 24)
+    results = {}
+    skipped = []
+    for name, func in public_functions():
+        build_args = ARGUMENTS.get(name)
+        if build_args is None:
+            skipped.append(name)
+            continue
+        if args.only and name not in args.only:
+            continue
+        results[name] = await time_function(func, build_args, ctx, args.min_iterations, args.time_budget)
+        print(f"  {name:<32} {results[name]['mean_ms']:>10.3f} ms  ({results[name]['calls']} calls)")
+    if skipped:
+        print(f"  skipped (no argument builder): {', '.join(skipped)}")
+    return {"functions": results, "skipped": skipped}
+
+def prepare(users: int, data_dir: str, seed: int) -> str:
+    source = os.path.join(data_dir, f"users_{users}.db")
+    if not os.path.exists(source):
+        print(f"generating {users} users into {source}")
+        generate(source, users, seed)
+    working = os.path.join(data_dir, f"users_{users}.work.db")
+    shutil.copyfile(source, working)
+    return working
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncomparison against {baseline_path} (new / old mean)")
+    for scale, data in report["scales"].items():
+        old = baseline.get("scales", {}).get(scale, {}).get("functions", {})
+        for name, row in data["functions"].items():
+            if name in old and old[name]["mean_ms"]:
+                print(f"  {scale:>8} {name:<32} x{row['mean_ms'] / old[name]['mean_ms']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every public database.py function at several scales")
+    parser.add_argument("--scales", type=int, nargs="*", default=list(DEFAULT_SCALES))
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--time-budget", type=float, default=0.5, help="seconds per function")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_db.json")
+    parser.add_argument("--compare", help="previous report to compare against")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "scales": {},
+    }
+    for users in args.scales:
+        print(f"scale {users} users")
+        path = prepare(users, args.data_dir, args.seed)
+        report["scales"][str(users)] = asyncio.run(bench_scale(path, users, args))
+        os.remove(path)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
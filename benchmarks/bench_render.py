@@ -0,0 +1,32 @@
+import argparse
+import timeit
+
+from keyboards import (
+    build_catalog_renders, get_farm_shop_keyboard, get_nft_shop_keyboard,
+    get_farm_select_keyboard, get_nft_select_keyboard,
+    get_farm_catalog_text, get_nft_catalog_text
+)
+
+VIEWS = {
+    "farm_shop": lambda: (f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {12345}\n\nВыберите ферму:", get_farm_shop_keyboard()),
+    "nft_shop": lambda: (f"🎁 Магазин NFT подарков\n\n⭐ Ваши звезды: {12345}\n\n", get_nft_shop_keyboard()),
+    "farm_select": get_farm_select_keyboard,
+    "nft_select": get_nft_select_keyboard,
+    "buy_farm": lambda: (f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {12345}\n\n" + get_farm_catalog_text(), get_farm_shop_keyboard()),
+    "buy_nft": lambda: (f"🎁 Магазин NFT подарков\n\n⭐ Ваши звезды: {12345}\n\n" + get_nft_catalog_text(), get_nft_shop_keyboard()),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Render time per shop view")
+    parser.add_argument("-n", "--number", type=int, default=10000)
+    args = parser.parse_args()
+    
+    cold = timeit.timeit(build_catalog_renders, number=100) / 100
+    print(f"{'full catalog build':<20} {cold * 1e6:10.2f} us")
+    
+    for name, view in VIEWS.items():
+        per_call = timeit.timeit(view, number=args.number) / args.number
+        print(f"{name:<20} {per_call * 1e6:10.2f} us")
+
+if __name__ == "__main__":
+    main()
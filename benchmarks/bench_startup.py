@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from benchmarks.fake_api import FakeBotAPI, start_server
+from benchmarks.gen_data import generate
+from benchmarks.harness import UpdateFactory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "123456:bench"
+PLAYER_ID = 1000000000
+# Boot of a 1M player snapshot answers in about 3.2 s here; 0 turns the check off
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", 5))
+
+async def boot_once(args, snapshot: str) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_startup_")
+    shutil.copyfile(snapshot, os.path.join(directory, "game_bot.db"))
+
+    api = FakeBotAPI()
+    runner = await start_server(api, port=args.port)
+    answered = asyncio.Event()
+    api.listeners.append(lambda method, params: method == "sendMessage" and answered.set())
+    update = UpdateFactory().message(PLAYER_ID, "/start")
+    api.push_update(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+    env = dict(
+        os.environ, BOT_TOKEN=TOKEN, TELEGRAM_API_URL=f"http://127.0.0.1:{args.port}", PORT=str(args.http_port),
+        BACKUP_INTERVAL="0", CATALOG_POLL_INTERVAL="0"
+    )
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), cwd=directory, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        await asyncio.wait_for(answered.wait(), args.timeout)
+        first_update = time.perf_counter() - started
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{args.http_port}/health") as response:
+                profile = (await response.json()).get("startup", {})
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 10)
+            except asyncio.TimeoutError:
+                process.kill()
+        await runner.cleanup()
+        shutil.rmtree(directory, ignore_errors=True)
+    return dict(profile, wall_first_update=round(first_update, 4))
+
+async def run(args, snapshot: str) -> int:
+    runs = [await boot_once(args, snapshot) for _ in range(args.runs)]
+    phases = list(runs[0])
+    print(f"{'phase':<20}{'median s':>10}{'max s':>10}")
+    for phase in phases:
+        values = [result.get(phase, 0) for result in runs]
+        print(f"{phase:<20}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+
+    first_update = statistics.median(result["wall_first_update"] for result in runs)
+    over = args.budget > 0 and first_update > args.budget
+    print(f"time to first update: {first_update:.2f}s (budget {args.budget:.2f}s){' OVER BUDGET' if over else ''}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "first_update": first_update, "budget": args.budget}, f, indent=2)
+    return 1 if over else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Boot main.py against a fake Bot API and time every startup phase")
+    parser.add_argument("--snapshot", help="game_bot.db to boot from instead of a generated one")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                        help="fail when the median time to first update exceeds this many seconds (0 = no check)")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--http-port", type=int, default=8083)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+    snapshot = args.snapshot
+    if not snapshot:
+        snapshot = os.path.join(tempfile.mkdtemp(prefix="bench_startup_"), "game_bot.db")
+        generate(snapshot, args.users, verbose=False)
+    sys.exit(asyncio.run(run(args, snapshot)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+import catalog
+import database
+from benchmarks.harness import UpdateFactory, Report, use_temp_database, load_bot, seed_users, drive
+
+FARM, NFT = "starter", "golden_coin"
+
+async def check_balances(user_ids, start_stars: dict) -> dict:
+    # Stars may only leave through purchases: start - spent must equal the balance and never go below zero
+    farm_price, nft_price = catalog.current().farm(FARM).price, catalog.current().nft(NFT).price
+    violations = negative = 0
+    for user_id in user_ids:
+        stars = await database.get_user_stars(user_id)
+        farms = (await database.get_income_state(user_id))['farm_count']
+        nfts = len(await database.get_user_nfts(user_id))
+        if stars != start_stars[user_id] - farms * farm_price - nfts * nft_price:
+            violations += 1
+        if stars < 0:
+            negative += 1
+    return {"users": len(user_ids), "wrong_balance": violations, "negative_balance": negative}
+
+async def run_mode(main, factory: UpdateFactory, args, locked: bool, first_user_id: int) -> dict:
+    main.user_locks.enabled = locked
+    budget = args.purchases * catalog.current().farm(FARM).price // 2
+    user_ids = await seed_users(args.users, first_user_id=first_user_id, farms_per_user=0, stars=budget)
+    start_stars = {user_id: await database.get_user_stars(user_id) for user_id in user_ids}
+
+    # Every player fires all purchases at once, interleaved with everyone else's
+    rng = random.Random(args.seed)
+    plan = [(user_id, i) for user_id in user_ids for i in range(args.purchases)]
+    rng.shuffle(plan)
+
+    def make_update(i):
+        user_id, n = plan[i]
+        if n % 4 == 3:
+            return "buy_nft", factory.callback(user_id, f"buy_nft_{NFT}")
+        return "buy_farm", factory.callback(user_id, f"buy_farm_{FARM}")
+
+    report = Report()
+    await drive(main.dp, main.bot, make_update, len(plan), 0, args.concurrency, report)
+    result = report.as_dict()
+    result.update(await check_balances(user_ids, start_stars))
+    result["locked"] = locked
+    return result
+
+async def run(args) -> int:
+    use_temp_database()
+    main, session = load_bot()
+    await database.init_db()
+    factory = UpdateFactory()
+
+    results = [
+        await run_mode(main, factory, args, False, 2000000),
+        await run_mode(main, factory, args, True, 3000000),
+    ]
+    print(f"{'mode':<10}{'upd/s':>10}{'users':>8}{'wrong':>8}{'negative':>10}")
+    for result in results:
+        mode = "locked" if result["locked"] else "unlocked"
+        print(
+            f"{mode:<10}{result['throughput_ups']:>10}{result['users']:>8}"
+            f"{result['wrong_balance']:>8}{result['negative_balance']:>10}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    locked = results[1]
+    return 1 if locked["wrong_balance"] or locked["negative_balance"] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent purchases per player with and without per-user locks")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--purchases", type=int, default=8, help="concurrent purchases per player")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+
+import config
+import database
+from benchmarks.fake_api import FakeBotAPI, start_server
+from benchmarks.harness import UpdateFactory, Report, use_temp_database, seed_users
+from benchmarks.loadtest import SCENARIOS, build_scenarios
+
+class CompletionTracker:
+    def __init__(self, report: Report):
+        self.report = report
+        self.by_chat = {}
+        self.by_callback = {}
+        self.pending = 0
+        self.last_completion = None
+        self.done = asyncio.Event()
+
+    def expect(self, scenario: str, update: dict):
+        entry = (scenario, time.perf_counter())
+        self.pending += 1
+        self.done.clear()
+        if "callback_query" in update:
+            self.by_callback[str(update["callback_query"]["id"])] = entry
+        else:
+            chat_id = int(update["message"]["chat"]["id"])
+            self.by_chat.setdefault(chat_id, deque()).append(entry)
+
+    def __call__(self, method: str, params: dict):
+        entry = None
+        if method == "answerCallbackQuery":
+            entry = self.by_callback.pop(str(params.get("callback_query_id")), None)
+        elif method == "sendMessage":
+            queue = self.by_chat.get(int(params["chat_id"]))
+            if queue:
+                entry = queue.popleft()
+        if entry is None:
+            return
+        scenario, started = entry
+        self.last_completion = time.perf_counter()
+        self.report.add(scenario, self.last_completion - started, 0)
+        self.pending -= 1
+        if self.pending <= 0:
+            self.done.set()
+
+async def run(args):
+    # config is already imported through database -> catalog, main reads the value from there
+    config.TELEGRAM_API_URL = f"http://127.0.0.1:{args.port}"
+    use_temp_database(args.snapshot)
+    import main
+    main.throttle.limits = {}
+    main.throttle.max_in_flight = 0
+    main.callback_dedup.enabled = False
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("tracing").setLevel(logging.ERROR)
+
+    await database.init_db()
+    rng = random.Random(args.seed)
+    if args.snapshot:
+        user_ids = [user["user_id"] for user in await database.get_all_users()][:args.users]
+    else:
+        user_ids = await seed_users(args.users)
+    auction_ids = [await database.create_auction("starter", 100, 24) for _ in range(3)]
+
+    db_calls = [0]
+    database.add_call_hook(lambda function, duration, error: db_calls.__setitem__(0, db_calls[0] + 1))
+
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_limit_ratio, args.retry_after, args.seed)
+    runner = await start_server(api, port=args.port)
+    report = Report()
+    tracker = CompletionTracker(report)
+    api.listeners.append(tracker)
+
+    polling = asyncio.create_task(main.dp.start_polling(main.bot, handle_signals=False, polling_timeout=1))
+    factory = UpdateFactory()
+    builders = build_scenarios(factory, user_ids, auction_ids, rng)
+    scenarios = args.scenarios or list(SCENARIOS)
+
+    report.started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+    for i in range(args.updates):
+        if args.rate > 0:
+            next_at += 1 / args.rate
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+        scenario = scenarios[i % len(scenarios)]
+        update = builders[scenario](user_ids[i % len(user_ids)])
+        payload = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        tracker.expect(scenario, payload)
+        api.push_update(payload)
+
+    deadline = loop.time() + args.timeout
+    while not tracker.done.is_set() and loop.time() < deadline:
+        idle_since = tracker.last_completion or report.started
+        if time.perf_counter() - idle_since > args.idle_timeout:
+            break
+        await asyncio.sleep(0.1)
+    report.finish()
+    if tracker.last_completion:
+        report.finished = tracker.last_completion
+
+    await main.dp.stop_polling()
+    await polling
+    await runner.cleanup()
+
+    report.print()
+    print(f"unanswered updates: {tracker.pending}  injected 429s: {api.rate_limited}  db calls per update: {db_calls[0] / max(1, args.updates):.2f}")
+    print(f"api calls: {api.calls}")
+    if args.json:
+        data = report.as_dict()
+        data["unanswered"] = tracker.pending
+        data["rate_limited"] = api.rate_limited
+        data["db_calls_per_update"] = db_calls[0] / max(1, args.updates)
+        with open(args.json, "w") as f:
+            json.dump(data, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput through real HTTP against a fake Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS)
+    parser.add_argument("--snapshot")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--idle-timeout", type=float, default=5, help="stop waiting after this long without a reply")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
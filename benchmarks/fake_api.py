@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+BOT_USER = {"id": 8255377913, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+RATE_LIMITED_METHODS = ("sendMessage", "editMessageText", "answerCallbackQuery")
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit_ratio: float = 0.0, retry_after: int = 1, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.updates = []
+        self.new_updates = asyncio.Event()
+        self.calls = {}
+        self.rate_limited = 0
+        self.listeners = []
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+
+    def push_update(self, update: dict) -> int:
+        update_id = next(self._update_ids)
+        update["update_id"] = update_id
+        self.updates.append(update)
+        self.new_updates.set()
+        return update_id
+
+    def _message(self, chat_id, text=None) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    async def get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    async def dispatch(self, method: str, params: dict):
+        if method == "getUpdates":
+            return await self.get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method == "getChat":
+            return {"id": int(params["chat_id"]), "type": "private", "first_name": "Player"}
+        if method == "sendMessage":
+            return self._message(params["chat_id"], params.get("text"))
+        if method == "editMessageText":
+            if params.get("chat_id"):
+                return self._message(params["chat_id"], params.get("text"))
+            return True
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        params.update(request.query)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method != "getUpdates":
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+            if method in RATE_LIMITED_METHODS and self.rng.random() < self.rate_limit_ratio:
+                self.rate_limited += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+
+        result = await self.dispatch(method, params)
+        for listener in self.listeners:
+            listener(method, params)
+        return web.json_response({"ok": True, "result": result}, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        return app
+
+async def start_server(api: FakeBotAPI, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+async def serve(args):
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_limit_ratio, args.retry_after)
+    runner = await start_server(api, args.host, args.port)
+    print(f"fake Bot API on http://{args.host}:{args.port} (set TELEGRAM_API_URL to use it)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every non-polling call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="fraction of sends answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
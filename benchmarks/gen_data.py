@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import catalog
+import database
+
+FIRST_USER_ID = 1000000000
+CHUNK_SIZE = 50000
+
+def _weights(items, exponent: float):
+    return [1 / (item.price ** exponent) for item in items]
+
+def _chunks(rows, size: int = CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+class Generator:
+    def __init__(self, users: int, seed: int, now: datetime):
+        self.users = users
+        self.rng = random.Random(seed)
+        self.now = now
+        self.items = catalog.current()
+        self.farm_ids = [farm.id for farm in self.items.farms]
+        self.farm_weights = _weights(self.items.farms, 0.7)
+        self.nft_ids = [nft.id for nft in self.items.nfts]
+        self.nft_weights = _weights(self.items.nfts, 1.0)
+
+    def user_id(self, index: int) -> int:
+        return FIRST_USER_ID + index
+
+    def user_rows(self):
+        rng = self.rng
+        for i in range(self.users):
+            created = self.now - timedelta(seconds=rng.randint(0, 180 * 86400))
+            last_collect = self.now - timedelta(seconds=rng.randint(0, 7 * 86400))
+            stars = int(rng.lognormvariate(7, 2.2))
+            yield (
+                self.user_id(i), i + 1, stars, _iso(last_collect), _iso(created),
+                f"player{i}" if rng.random() < 0.6 else None, f"Player {i}"
+            )
+
+    def farm_rows(self):
+        rng = self.rng
+        for i in range(self.users):
+            count = min(int(rng.expovariate(1 / 3)), 60)
+            if not count:
+                continue
+            activated = self.now - timedelta(seconds=rng.randint(0, 48 * 3600))
+            active = 1 if (self.now - activated) < timedelta(hours=6) else 0
+            for farm_type in rng.choices(self.farm_ids, self.farm_weights, k=count):
+                yield (self.user_id(i), farm_type, _iso(activated), active)
+
+    def nft_rows(self):
+        rng = self.rng
+        for i in range(self.users):
+            if rng.random() >= 0.3:
+                continue
+            for nft_type in rng.choices(self.nft_ids, self.nft_weights, k=rng.randint(1, 3)):
+                yield (self.user_id(i), nft_type)
+
+    def referral_rows(self):
+        rng = self.rng
+        for i in range(1, self.users):
+            if rng.random() < 0.2:
+                yield (self.user_id(rng.randrange(i)), self.user_id(i), 1)
+
+    def auction_rows(self):
+        rng = self.rng
+        top_farms = self.farm_ids[-4:]
+        for i in range(max(3, self.users // 1000)):
+            farm_type = rng.choice(top_farms)
+            price = self.items.farm(farm_type).price // 2
+            ended = i >= 3
+            end_time = self.now + (timedelta(hours=-rng.randint(1, 24 * 90)) if ended else timedelta(hours=24))
+            bidder = self.user_id(rng.randrange(self.users)) if ended else None
+            yield (
+                farm_type, price, price + (rng.randint(1, 50) * 100 if ended else 0), bidder,
+                _iso(end_time), "ended" if ended else "active", _iso(end_time - timedelta(hours=24))
+            )
+
+    def ban_rows(self):
+        rng = self.rng
+        for i in range(self.users):
+            if rng.random() < 0.005:
+                yield (self.user_id(i), "Нарушение правил", 0)
+
+    def chat_rows(self):
+        for i in range(max(1, self.users // 500)):
+            yield (-1000000000000 - i, "supergroup", f"Chat {i}")
+
+    def chat_member_rows(self):
+        rng = self.rng
+        for i in range(max(1, self.users // 500)):
+            for index in rng.sample(range(self.users), min(self.users, rng.randint(5, 500))):
+                yield (-1000000000000 - i, self.user_id(index))
+
+TABLES = (
+    ("users", "INSERT INTO users (user_id, internal_id, stars, last_collect, created_at, username, full_name) VALUES (?, ?, ?, ?, ?, ?, ?)", "user_rows"),
+    ("farms", "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, ?)", "farm_rows"),
+    ("nfts", "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)", "nft_rows"),
+    ("referrals", "INSERT INTO referrals (referrer_id, referred_id, reward_given) VALUES (?, ?, ?)", "referral_rows"),
+    ("auctions", "INSERT INTO auctions (farm_type, starting_price, current_bid, current_bidder_id, end_time, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)", "auction_rows"),
+    ("bans", "INSERT INTO bans (user_id, reason, banned_by) VALUES (?, ?, ?)", "ban_rows"),
+    ("chats", "INSERT INTO chats (chat_id, chat_type, title) VALUES (?, ?, ?)", "chat_rows"),
+    ("chat_members", "INSERT INTO chat_members (chat_id, user_id) VALUES (?, ?)", "chat_member_rows"),
+)
+
+def generate(path: str, users: int, seed: int = 1, verbose: bool = True) -> dict:
+    if os.path.exists(path):
+        os.remove(path)
+    previous = database.DB_NAME
+    database.DB_NAME = path
+    try:
+        asyncio.run(database.init_db())
+    finally:
+        database.DB_NAME = previous
+
+    generator = Generator(users, seed, datetime.now())
+    counts = {}
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    try:
+        for table, sql, rows_method in TABLES:
+            started = time.perf_counter()
+            counts[table] = 0
+            for chunk in _chunks(getattr(generator, rows_method)()):
+                with conn:
+                    conn.executemany(sql, chunk)
+                counts[table] += len(chunk)
+            if verbose:
+                print(f"{table:<10} {counts[table]:>10} rows in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+    database.DB_NAME = path
+    try:
+        asyncio.run(database.rebuild_income_state())
+    finally:
+        database.DB_NAME = previous
+    conn = sqlite3.connect(path)
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a game_bot.db with synthetic players")
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    generate(args.path, args.users, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import (
+    AnswerCallbackQuery, DeleteMessage, EditMessageText, GetChat, GetMe, SendMessage
+)
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import database
+
+FAKE_BOT_ID = 8255377913
+
+_db_call_counter: ContextVar = ContextVar("bench_db_call_counter", default=None)
+
+def _count_db_call(function: str, duration: float, error: bool):
+    counter = _db_call_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+database.add_call_hook(_count_db_call)
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = method.__api_method__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            return User(id=FAKE_BOT_ID, is_bot=True, first_name="Bench", username="bench_bot")
+        if isinstance(method, GetChat):
+            return Chat(id=method.chat_id, type="private")
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id or 0, type="private"),
+                text=method.text
+            )
+        if isinstance(method, (AnswerCallbackQuery, DeleteMessage)):
+            return True
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+class UpdateFactory:
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"Player{user_id}", username=f"player{user_id}")
+
+    def message(self, user_id: int, text: str, chat_id: int = None, chat_type: str = "private") -> Update:
+        return Update(
+            update_id=next(self._ids),
+            message=Message(
+                message_id=next(self._ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id or user_id, type=chat_type),
+                from_user=self._user(user_id),
+                text=text
+            )
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update(
+            update_id=next(self._ids),
+            callback_query=CallbackQuery(
+                id=str(next(self._ids)),
+                from_user=self._user(user_id),
+                chat_instance=str(user_id),
+                data=data,
+                message=Message(
+                    message_id=next(self._ids),
+                    date=datetime.now(),
+                    chat=Chat(id=user_id, type="private"),
+                    text="bench"
+                )
+            )
+        )
+
+def use_temp_database(snapshot: str = None) -> str:
+    directory = tempfile.mkdtemp(prefix="bench_")
+    path = os.path.join(directory, "game_bot.db")
+    if snapshot:
+        shutil.copyfile(snapshot, path)
+    database.DB_NAME = path
+    return path
+
+def load_bot(throttle: bool = False):
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("aiogram").setLevel(logging.WARNING)
+    logging.getLogger("tracing").setLevel(logging.ERROR)
+    if not throttle:
+        # Synthetic load replays a handful of players far faster than anyone can click
+        main.throttle.limits = {}
+        main.throttle.max_in_flight = 0
+        main.callback_dedup.enabled = False
+    session = FakeSession()
+    session.middleware = main.bot.session.middleware
+    main.bot.session = session
+    return main, session
+
+async def seed_users(count: int, first_user_id: int = 1000000, farms_per_user: int = 3, stars: int = 10 ** 9):
+    import catalog
+    farm_types = [farm.id for farm in catalog.current().farms[:4]]
+    user_ids = [first_user_id + i for i in range(count)]
+    for user_id in user_ids:
+        await database.get_or_create_user(user_id)
+        await database.admin_add_stars(user_id, stars)
+        for i in range(farms_per_user):
+            await database.admin_add_farm(user_id, farm_types[i % len(farm_types)])
+        await database.activate_farms(user_id)
+    return user_ids
+
+async def timed_feed(dp, bot, update: Update):
+    counter = [0]
+    _db_call_counter.set(counter)
+    started = time.perf_counter()
+    error = None
+    try:
+        await dp.feed_update(bot, update)
+    except Exception as e:
+        error = e
+    return time.perf_counter() - started, counter[0], error
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+class Report:
+    def __init__(self):
+        self.latencies = {}
+        self.db_calls = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, scenario: str, latency: float, db_calls: int, error=None):
+        self.latencies.setdefault(scenario, []).append(latency)
+        self.db_calls.setdefault(scenario, []).append(db_calls)
+        if error is not None:
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        total = sum(len(values) for values in self.latencies.values())
+        scenarios = {}
+        for scenario, values in sorted(self.latencies.items()):
+            calls = self.db_calls[scenario]
+            scenarios[scenario] = {
+                "count": len(values),
+                "errors": self.errors.get(scenario, 0),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "db_calls_per_update": round(sum(calls) / len(calls), 2),
+            }
+        return {
+            "updates": total,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_ups": round(total / elapsed, 2) if elapsed else 0.0,
+            "scenarios": scenarios,
+        }
+
+    def print(self):
+        data = self.as_dict()
+        print(f"updates: {data['updates']}  elapsed: {data['elapsed_s']}s  throughput: {data['throughput_ups']} upd/s")
+        print(f"{'scenario':<14}{'count':>8}{'err':>6}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'db/upd':>9}")
+        for name, row in data["scenarios"].items():
+            print(
+                f"{name:<14}{row['count']:>8}{row['errors']:>6}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['db_calls_per_update']:>9}"
+            )
+
+async def drive(dp, bot, make_update, total: int, rate: float, concurrency: int, report: Report):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+
+    async def run(scenario: str, update: Update):
+        try:
+            latency, db_calls, error = await timed_feed(dp, bot, update)
+            report.add(scenario, latency, db_calls, error)
+        finally:
+            semaphore.release()
+
+    for i in range(total):
+        if rate > 0:
+            next_at += 1 / rate
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        scenario, update = make_update(i)
+        task = asyncio.create_task(run(scenario, update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    report.finish()
+
+def choose_user(user_ids, rng: random.Random) -> int:
+    return user_ids[rng.randrange(len(user_ids))]
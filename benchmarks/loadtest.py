@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+
+import database
+from benchmarks.harness import (
+    UpdateFactory, Report, use_temp_database, load_bot, seed_users, drive, choose_user
+)
+
+SCENARIOS = ("start", "profile", "collect", "activate", "buy_farm", "buy_nft", "bid", "dice", "slots", "roulette")
+
+def build_scenarios(factory: UpdateFactory, user_ids, auction_ids, rng: random.Random):
+    bid_amounts = itertools.count(1000000, 10)
+
+    def bid(user_id):
+        auction_id = auction_ids[rng.randrange(len(auction_ids))]
+        return factory.callback(user_id, f"bid_{auction_id}_{next(bid_amounts)}")
+
+    return {
+        "start": lambda user_id: factory.message(user_id, "/start"),
+        "profile": lambda user_id: factory.message(user_id, "/profile"),
+        "collect": lambda user_id: factory.message(user_id, "/collect"),
+        "activate": lambda user_id: factory.message(user_id, "/activate"),
+        "buy_farm": lambda user_id: factory.callback(user_id, "buy_farm_starter"),
+        "buy_nft": lambda user_id: factory.callback(user_id, "buy_nft_golden_coin"),
+        "bid": bid,
+        "dice": lambda user_id: factory.message(user_id, "/dice 10"),
+        "slots": lambda user_id: factory.message(user_id, "/slots 10"),
+        "roulette": lambda user_id: factory.message(user_id, "/roulette 10"),
+    }
+
+async def run(args):
+    use_temp_database(args.snapshot)
+    main, session = load_bot()
+    await database.init_db()
+
+    rng = random.Random(args.seed)
+    if args.snapshot:
+        users = await database.get_all_users()
+        user_ids = [user["user_id"] for user in users][:args.users]
+    else:
+        user_ids = await seed_users(args.users)
+    auction_ids = [await database.create_auction("starter", 100, 24) for _ in range(3)]
+
+    factory = UpdateFactory()
+    builders = build_scenarios(factory, user_ids, auction_ids, rng)
+    scenarios = args.scenarios or list(SCENARIOS)
+
+    def make_update(i):
+        scenario = scenarios[i % len(scenarios)]
+        return scenario, builders[scenario](choose_user(user_ids, rng))
+
+    report = Report()
+    await drive(main.dp, main.bot, make_update, args.updates, args.rate, args.concurrency, report)
+    report.print()
+    print(f"outgoing calls: {session.calls}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.as_dict(), f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the dispatcher with synthetic updates")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0, help="target updates per second, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS)
+    parser.add_argument("--snapshot", help="copy of a game_bot.db to run against instead of seeding")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+
+from aiogram.types import Update
+
+import config
+import database
+from recorder import anonymize_snapshot
+from metrics import updates_throttled, updates_shed, callback_duplicates
+from benchmarks.harness import Report, use_temp_database, load_bot, timed_feed
+
+def read_capture(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def sender_ids(path: str) -> set:
+    ids = set()
+    for record in read_capture(path):
+        for event in record["update"].values():
+            if isinstance(event, dict) and "id" in event.get("from", {}):
+                ids.add(event["from"]["id"])
+    return ids
+
+def count_known(snapshot: str, user_ids: set) -> int:
+    conn = sqlite3.connect(snapshot)
+    try:
+        ids, known = list(user_ids), 0
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cursor = conn.execute(
+                f"SELECT COUNT(*) FROM users WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            known += cursor.fetchone()[0]
+        return known
+    finally:
+        conn.close()
+
+def read_salt(path: str) -> str:
+    # The salt the capture was recorded with; a fresh one would map ids somewhere else
+    if config.RECORD_UPDATES_SALT:
+        return config.RECORD_UPDATES_SALT
+    if not os.path.exists(path):
+        raise SystemExit(f"no salt: set RECORD_UPDATES_SALT or pass --salt-file (tried {path})")
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+def scenario_of(main, update: Update) -> str:
+    event = update.message or update.callback_query
+    if event is None:
+        return update.event_type
+    return main.handler_label(event)
+
+async def replay(args) -> int:
+    path = use_temp_database(args.snapshot)
+    if args.snapshot:
+        if args.anonymize:
+            anonymize_snapshot(path, read_salt(args.salt_file))
+        senders = sender_ids(args.capture)
+        known = count_known(path, senders)
+        print(f"capture senders found in the snapshot: {known}/{len(senders)}")
+        if senders and not known:
+            # Every update would hit a brand new player, which is not the load the capture recorded
+            print("none of the capture's players are in the snapshot: anonymize it with the capture's salt (--anonymize)",
+                  file=sys.stderr)
+            return 2
+    main, session = load_bot(throttle=args.throttle)
+    await database.init_db()
+
+    report = Report()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tasks = set()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_ts = None
+
+    async def run(scenario: str, update: Update):
+        try:
+            latency, db_calls, error = await timed_feed(main.dp, main.bot, update)
+            report.add(scenario, latency, db_calls, error)
+        finally:
+            semaphore.release()
+
+    for index, record in enumerate(read_capture(args.capture)):
+        if args.limit and index >= args.limit:
+            break
+        if args.speed > 0:
+            if first_ts is None:
+                first_ts = record["ts"]
+            delay = started + (record["ts"] - first_ts) / args.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.model_validate(record["update"], context={"bot": main.bot})
+        await semaphore.acquire()
+        task = asyncio.create_task(run(scenario_of(main, update), update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    report.finish()
+    report.print()
+    print(f"outgoing calls: {session.calls}")
+    if args.throttle:
+        print(
+            f"throttled: {int(updates_throttled.total())}, shed: {int(updates_shed.total())}, "
+            f"duplicate taps: {int(callback_duplicates.total())}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.as_dict(), f, indent=2)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded update capture through the dispatcher")
+    parser.add_argument("capture", help="JSONL file written by recorder.UpdateRecorder")
+    parser.add_argument("--snapshot", help="game_bot.db snapshot to replay against (copied, never modified)")
+    parser.add_argument("--anonymize", action="store_true",
+                        help="rewrite the copied snapshot's ids with the capture's salt so its players match")
+    parser.add_argument("--salt-file", default=config.RECORD_UPDATES_SALT_PATH,
+                        help="salt the capture was recorded with, unless RECORD_UPDATES_SALT is set")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--throttle", action="store_true",
+                        help="keep the flood throttle and callback dedup on, as in production (meaningful at --speed 1)")
+    parser.add_argument("--json", help="write the report to this file")
+    sys.exit(asyncio.run(replay(parser.parse_args())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import database
+from config import BULK_CHUNK_SIZE, BULK_PROGRESS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class TargetSpec:
+    # Parsed admin target such as "1-1000", "1,5,9", "all", "stars>1000".
+    # Conditions are built only from the fixed fragments below, values go in as parameters.
+    def __init__(self, conditions: List[str], params: List[int], description: str):
+        self.conditions = conditions
+        self.params = params
+        self.description = description
+
+    @property
+    def condition(self) -> str:
+        return " OR ".join(f"({condition})" for condition in self.conditions)
+
+    @property
+    def is_single(self) -> bool:
+        return self.conditions == ["internal_id IN (?)"]
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["TargetSpec"]:
+        conditions, params, ids = [], [], []
+        try:
+            for part in text.lower().split(","):
+                part = part.strip()
+                if not part:
+                    continue
+                if part == "all":
+                    conditions.append("1")
+                elif part.startswith("stars>"):
+                    conditions.append("stars > ?")
+                    params.append(int(part[6:]))
+                elif part.startswith("stars<"):
+                    conditions.append("stars < ?")
+                    params.append(int(part[6:]))
+                elif "-" in part.lstrip("-"):
+                    start, end = part.split("-", 1)
+                    conditions.append("internal_id BETWEEN ? AND ?")
+                    params.extend(sorted((int(start), int(end))))
+                else:
+                    ids.append(int(part))
+        except ValueError:
+            return None
+        if ids:
+            conditions.append(f"internal_id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        if not conditions:
+            return None
+        return cls(conditions, params, text)
+
+async def run_bulk(spec: TargetSpec, operation: Callable[[List[int]], Awaitable[int]],
+                   progress: Optional[Callable[[int], Awaitable[None]]] = None,
+                   chunk_size: int = BULK_CHUNK_SIZE, exclude=()) -> int:
+    done = 0
+    after = 0
+    exclude = set(exclude)
+    while True:
+        user_ids, after = await database.get_target_user_ids(spec.condition, tuple(spec.params), after, chunk_size)
+        if not user_ids:
+            break
+        chunk = [user_id for user_id in user_ids if user_id not in exclude]
+        if chunk:
+            done += await operation(chunk)
+        if progress:
+            await progress(done)
+        if len(user_ids) < chunk_size:
+            break
+    return done
+
+class ProgressMessage:
+    def __init__(self, message, title: str, interval: float = BULK_PROGRESS_INTERVAL):
+        self.message = message
+        self.title = title
+        self.interval = interval
+        self._last = time.monotonic()
+
+    async def __call__(self, done: int):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            await self.message.edit_text(f"⏳ {self.title}\n\nОбработано: {done}")
+        except Exception as e:
+            logger.debug(f"Не удалось обновить прогресс: {e}")
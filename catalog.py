@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from config import CATALOG_PATH, CATALOG_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Ids end up in callback data such as buy_nft_<id>
+_ID_PATTERN = re.compile(r"^[a-z0-9_]{1,40}$")
+
+class CatalogError(ValueError):
+    pass
+
+@dataclass(frozen=True, slots=True)
+class FarmType:
+    ordinal: int
+    id: str
+    name: str
+    price: int
+    income_per_hour: int
+    income_per_min: float
+
+@dataclass(frozen=True, slots=True)
+class NftGift:
+    ordinal: int
+    id: str
+    name: str
+    price: int
+    boost: float
+    boost_percent: int
+
+class Catalog:
+    # Records are immutable, a reload builds a new Catalog and swaps it in as a whole
+    __slots__ = ("farms", "nfts", "farm_by_id", "nft_by_id", "mtime")
+
+    def __init__(self, farms: Tuple[FarmType, ...], nfts: Tuple[NftGift, ...], mtime: float = 0.0):
+        self.farms = farms
+        self.nfts = nfts
+        self.farm_by_id: Dict[str, FarmType] = {farm.id: farm for farm in farms}
+        self.nft_by_id: Dict[str, NftGift] = {nft.id: nft for nft in nfts}
+        self.mtime = mtime
+
+    def farm(self, farm_id: str) -> Optional[FarmType]:
+        return self.farm_by_id.get(farm_id)
+
+    def nft(self, nft_id: str) -> Optional[NftGift]:
+        return self.nft_by_id.get(nft_id)
+
+    def income_changes(self, old: "Catalog") -> Tuple[frozenset, frozenset]:
+        # Farm and NFT ids whose values are stored per user (activation income, boost) and changed
+        def changed(new_values: Dict[str, float], old_values: Dict[str, float]) -> frozenset:
+            return frozenset(key for key in new_values.keys() | old_values.keys() if new_values.get(key) != old_values.get(key))
+        return (
+            changed({farm.id: farm.income_per_hour for farm in self.farms}, {farm.id: farm.income_per_hour for farm in old.farms}),
+            changed({nft.id: nft.boost for nft in self.nfts}, {nft.id: nft.boost for nft in old.nfts}),
+        )
+
+def _ids(items: list, kind: str):
+    seen = set()
+    for item in items:
+        item_id = item.get("id")
+        if not isinstance(item_id, str) or not _ID_PATTERN.match(item_id):
+            raise CatalogError(f"{kind}: недопустимый id {item_id!r}")
+        if item_id in seen:
+            raise CatalogError(f"{kind}: повторяется id {item_id}")
+        seen.add(item_id)
+
+def _positive(item: dict, field: str, kind: str):
+    value = item.get(field)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise CatalogError(f"{kind} {item.get('id')}: поле {field} должно быть положительным числом")
+    return value
+
+def compile_catalog(data: dict, mtime: float = 0.0) -> Catalog:
+    farms_data, nfts_data = data.get("farms"), data.get("nfts")
+    if not isinstance(farms_data, list) or not isinstance(nfts_data, list) or not farms_data:
+        raise CatalogError("ожидаются непустой список farms и список nfts")
+    _ids(farms_data, "farms")
+    _ids(nfts_data, "nfts")
+    try:
+        farms = tuple(
+            FarmType(
+                ordinal=ordinal,
+                id=item["id"],
+                name=str(item["name"]),
+                price=int(_positive(item, "price", "farms")),
+                income_per_hour=int(_positive(item, "income_per_hour", "farms")),
+                income_per_min=round(item["income_per_hour"] / 60, 2),
+            )
+            for ordinal, item in enumerate(farms_data)
+        )
+        nfts = tuple(
+            NftGift(
+                ordinal=ordinal,
+                id=item["id"],
+                name=str(item["name"]),
+                price=int(_positive(item, "price", "nfts")),
+                boost=float(_positive(item, "boost", "nfts")),
+                boost_percent=int((item["boost"] - 1) * 100),
+            )
+            for ordinal, item in enumerate(nfts_data)
+        )
+    except KeyError as e:
+        raise CatalogError(f"нет поля {e}")
+    return Catalog(farms, nfts, mtime)
+
+def load_catalog(path: str = CATALOG_PATH) -> Catalog:
+    mtime = os.path.getmtime(path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise CatalogError(f"{path}: {e}")
+    return compile_catalog(data, mtime)
+
+_current: Optional[Catalog] = None
+
+_reload_listeners = []
+
+def add_reload_listener(listener):
+    _reload_listeners.append(listener)
+
+def current() -> Catalog:
+    global _current
+    if _current is None:
+        _current = load_catalog()
+    return _current
+
+def reload(path: str = CATALOG_PATH) -> Catalog:
+    # Parsing and validation happen before the swap, a broken file leaves the old catalog in place
+    global _current
+    new = load_catalog(path)
+    old, _current = _current, new
+    for listener in _reload_listeners:
+        listener(old, new)
+    return new
+
+async def watch(path: str = CATALOG_PATH, interval: float = CATALOG_POLL_INTERVAL):
+    seen = current().mtime
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime == seen:
+                continue
+            # A broken file is reported once per change, not on every poll
+            seen = mtime
+            new = reload(path)
+            logger.info(f"Каталог перезагружен: ферм {len(new.farms)}, NFT {len(new.nfts)}")
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки каталога: {e}")
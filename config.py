@@ -9,124 +9,74 @@ GAME_NAME = "0DAY FARM EMPIRE"
 INITIAL_STARS = 200
 FARM_BASE_PRICE = 50
 FARM_BASE_INCOME = 5
+FARM_ACTIVE_HOURS = 6
 
 ADMIN_IDS = [5538590798, 891015442, 5253753886]
 
-NFT_GIFTS = {
-    "snoop_dogg": {
-        "name": "🎤 Snoop Dogg",
-        "price": 5000,
-        "boost": 1.5,        "gift_id": "snoop_dogg"
-    },
-    "lunar_snake": {
-        "name": "🐍 Lunar Snake",
-        "price": 3500,
-        "boost": 1.3,        "gift_id": "lunar_snake"
-    },
-    "crystal_ball": {
-        "name": "🔮 Crystal Ball",
-        "price": 6000,
-        "boost": 1.6,        "gift_id": "crystal_ball"
-    },
-    "golden_coin": {
-        "name": "🪙 Golden Coin",
-        "price": 3000,
-        "boost": 1.25,        "gift_id": "golden_coin"
-    },
-    "diamond_ring": {
-        "name": "💍 Diamond Ring",
-        "price": 10000,
-        "boost": 2.0,        "gift_id": "diamond_ring"
-    },
-    "magic_lamp": {
-        "name": "🪔 Magic Lamp",
-        "price": 7500,
-        "boost": 1.7,        "gift_id": "magic_lamp"
-    },
-    "fire_dragon": {
-        "name": "🐉 Fire Dragon",
-        "price": 12000,
-        "boost": 2.2,        "gift_id": "fire_dragon"
-    },
-    "cosmic_star": {
-        "name": "⭐ Cosmic Star",
-        "price": 8000,
-        "boost": 1.8,        "gift_id": "cosmic_star"
-    },
-    "golden_crown": {
-        "name": "👑 Golden Crown",
-        "price": 15000,
-        "boost": 2.5,        "gift_id": "golden_crown"
-    },
-    "mystic_orb": {
-        "name": "🔮 Mystic Orb",
-        "price": 9000,
-        "boost": 1.9,        "gift_id": "mystic_orb"
-    }
-}
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+USER_NAME_CACHE_TTL = int(os.getenv("USER_NAME_CACHE_TTL", 3600))
+USER_NAME_CACHE_SIZE = int(os.getenv("USER_NAME_CACHE_SIZE", 100000))
+
+TRACE_SLOW_UPDATE_MS = int(os.getenv("TRACE_SLOW_UPDATE_MS", 500))
+TRACE_DB_CALL_BUDGET = int(os.getenv("TRACE_DB_CALL_BUDGET", 10))
+
+RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH")
+RECORD_UPDATES_SALT = os.getenv("RECORD_UPDATES_SALT", "")
+RECORD_UPDATES_SALT_PATH = os.getenv("RECORD_UPDATES_SALT_PATH", os.path.expanduser("~/.record_updates_salt"))
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 10))
+LEADERBOARD_RANK_TTL = int(os.getenv("LEADERBOARD_RANK_TTL", 60))
+LEADERBOARD_RANK_CACHE_SIZE = int(os.getenv("LEADERBOARD_RANK_CACHE_SIZE", 100000))
+CHAT_MEMBER_CACHE_SIZE = int(os.getenv("CHAT_MEMBER_CACHE_SIZE", 200000))
+
+STATS_FLUSH_INTERVAL = int(os.getenv("STATS_FLUSH_INTERVAL", 30))
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 5000))
+BULK_PROGRESS_INTERVAL = float(os.getenv("BULK_PROGRESS_INTERVAL", 3))
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 7))
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", 6 * 3600))
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", 256))
+BACKUP_SLEEP = float(os.getenv("BACKUP_SLEEP", 0.01))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", 5))
+
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", 3600))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", 30))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", 500))
+ARCHIVE_PAUSE = float(os.getenv("ARCHIVE_PAUSE", 0.05))
+
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", 900))
+MAINTENANCE_IDLE_RATE = float(os.getenv("MAINTENANCE_IDLE_RATE", 1.0))
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", 256))
+MAINTENANCE_MAX_STEPS = int(os.getenv("MAINTENANCE_MAX_STEPS", 200))
+MAINTENANCE_PAUSE = float(os.getenv("MAINTENANCE_PAUSE", 0.1))
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json"))
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", 5))
+
+STARTUP_DEFER = float(os.getenv("STARTUP_DEFER", 30))
+PRELOAD_USERS = int(os.getenv("PRELOAD_USERS", 5000))
+PRELOAD_DAYS = int(os.getenv("PRELOAD_DAYS", 7))
+BAN_RELOAD_INTERVAL = int(os.getenv("BAN_RELOAD_INTERVAL", 60))
+
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.5))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.1))
+LOOP_MONITOR_DEBUG = bool(int(os.getenv("LOOP_MONITOR_DEBUG", 0)))
+
+# class=rate per second:burst; "chat" is shared by everyone in a group
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "casino=0.5:3,purchase=2:5,command=2:8,callback=3:10,chat=5:20")
+THROTTLE_NOTICE_INTERVAL = float(os.getenv("THROTTLE_NOTICE_INTERVAL", 10))
+THROTTLE_MAX_IN_FLIGHT = int(os.getenv("THROTTLE_MAX_IN_FLIGHT", 200))
+
+USER_LOCK_STRIPES = int(os.getenv("USER_LOCK_STRIPES", 1024))
+
+EXPIRY_NOTIFY_RATE = int(os.getenv("EXPIRY_NOTIFY_RATE", 20))
+FARM_SWEEP_INTERVAL = int(os.getenv("FARM_SWEEP_INTERVAL", 60))
+FARM_SWEEP_BATCH = int(os.getenv("FARM_SWEEP_BATCH", 500))
+FARM_SWEEP_PAUSE = float(os.getenv("FARM_SWEEP_PAUSE", 0.05))
 
 REFERRAL_REWARD = 100
 
-FARM_TYPES = {
-    "starter": {
-        "name": "🌱 Стартовая ферма",
-        "price": 200,
-        "income_per_hour": 60
-    },
-    "basic": {
-        "name": "🌾 Базовая ферма",
-        "price": 500,
-        "income_per_hour": 240
-    },
-    "advanced": {
-        "name": "🚜 Продвинутая ферма",
-        "price": 2000,
-        "income_per_hour": 1200
-    },
-    "premium": {
-        "name": "🏭 Премиум ферма",
-        "price": 8000,
-        "income_per_hour": 5400
-    },
-    "elite": {
-        "name": "💎 Элитная ферма",
-        "price": 25000,
-        "income_per_hour": 18000
-    },
-    "legendary": {
-        "name": "👑 Легендарная ферма",
-        "price": 75000,
-        "income_per_hour": 60000
-    },
-    "mythic": {
-        "name": "🌟 Мифическая ферма",
-        "price": 200000,
-        "income_per_hour": 180000
-    },
-    "ultimate": {
-        "name": "⚡ Ультимативная ферма",
-        "price": 500000,
-        "income_per_hour": 450000
-    },
-    "quantum": {
-        "name": "⚛️ Квантовая ферма",
-        "price": 1000000,
-        "income_per_hour": 900000
-    },
-    "cosmic": {
-        "name": "🌌 Космическая ферма",
-        "price": 2500000,
-        "income_per_hour": 2250000
-    },
-    "divine": {
-        "name": "✨ Божественная ферма",
-        "price": 5000000,
-        "income_per_hour": 4500000
-    },
-    "infinity": {
-        "name": "♾️ Бесконечная ферма",
-        "price": 10000000,
-        "income_per_hour": 9000000
-    }
-}
 
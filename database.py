@@ -1,12 +1,139 @@
 import aiosqlite
 import asyncio
+import contextvars
+import os
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from functools import wraps
+from typing import List, Dict, Optional, Set
+
+import catalog
+from config import FARM_ACTIVE_HOURS, REFERRAL_REWARD
 
 DB_NAME = "game_bot.db"
 
+# Bump whenever init_db gains a table, column, index or trigger: files already at this
+# version skip the schema pass on boot
+SCHEMA_VERSION = 3
+
+_call_hooks = []
+# Set while a db_call helper runs, so nested helpers don't report twice
+_call_depth = contextvars.ContextVar("db_call_depth", default=0)
+
+_balance_listeners = []
+
+def add_balance_listener(listener):
+    _balance_listeners.append(listener)
+
+def _notify_balance(field: str, user_id: Optional[int], value=None):
+    # user_id None means many rows changed at once
+    for listener in _balance_listeners:
+        listener(field, user_id, value)
+
+STATS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+        INSERT INTO stats_totals (key, value) VALUES ('users', 1), ('stars', NEW.stars)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+        INSERT INTO stats_daily (day, key, value) VALUES (date('now', 'localtime'), 'new_users', 1)
+            ON CONFLICT(day, key) DO UPDATE SET value = value + excluded.value;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_users_stars AFTER UPDATE OF stars ON users WHEN NEW.stars <> OLD.stars BEGIN
+        INSERT INTO stats_totals (key, value) VALUES ('stars', NEW.stars - OLD.stars)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_farms_insert AFTER INSERT ON farms BEGIN
+        INSERT INTO stats_totals (key, value) VALUES ('farms:' || NEW.farm_type, 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_farms_delete AFTER DELETE ON farms BEGIN
+        UPDATE stats_totals SET value = value - 1 WHERE key = 'farms:' || OLD.farm_type;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_nfts_insert AFTER INSERT ON nfts BEGIN
+        INSERT INTO stats_totals (key, value) VALUES ('nfts:' || NEW.nft_type, 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_nfts_delete AFTER DELETE ON nfts BEGIN
+        UPDATE stats_totals SET value = value - 1 WHERE key = 'nfts:' || OLD.nft_type;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_auction_sold AFTER UPDATE OF status ON auctions
+    WHEN NEW.status = 'ended' AND OLD.status = 'active' AND NEW.current_bidder_id IS NOT NULL BEGIN
+        INSERT INTO stats_daily (day, key, value) VALUES
+            (date('now', 'localtime'), 'auctions_sold', 1),
+            (date('now', 'localtime'), 'auction_volume', NEW.current_bid)
+            ON CONFLICT(day, key) DO UPDATE SET value = value + excluded.value;
+    END""",
+)
+
+# The income board ranks by the rate players are actually paid, so every write of
+# income_rate or boost carries it along
+BOOSTED_INCOME_TRIGGER = """CREATE TRIGGER IF NOT EXISTS users_boosted_income AFTER UPDATE OF income_rate, boost ON users
+    WHEN NEW.boosted_income IS NOT CAST(NEW.income_rate * NEW.boost AS INTEGER) BEGIN
+        UPDATE users SET boosted_income = CAST(NEW.income_rate * NEW.boost AS INTEGER) WHERE user_id = NEW.user_id;
+    END"""
+
+USERS_FTS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, username, full_name) VALUES (NEW.user_id, NEW.username, NEW.full_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, full_name ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, username, full_name) VALUES ('delete', OLD.user_id, OLD.username, OLD.full_name);
+        INSERT INTO users_fts (rowid, username, full_name) VALUES (NEW.user_id, NEW.username, NEW.full_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, username, full_name) VALUES ('delete', OLD.user_id, OLD.username, OLD.full_name);
+    END""",
+)
+
+# Cold rows no hot query reads any more: table -> (copied columns, unique key, condition on the cutoff, archive indexes)
+ARCHIVE_TABLES = {
+    "auctions": (
+        "id, farm_type, starting_price, current_bid, current_bidder_id, end_time, status, created_at",
+        "id", "status = 'ended' AND end_time < ?", ("current_bidder_id",),
+    ),
+    "farm_activations": (
+        "id, user_id, activated_at, expires_at, income_per_hour, farm_count",
+        "id", "expires_at < ?", ("user_id",),
+    ),
+    "daily_active": (
+        "day, user_id",
+        "day, user_id", "day < ?", ("user_id",),
+    ),
+}
+
+def add_call_hook(hook):
+    _call_hooks.append(hook)
+
+def db_call(func):
+    name = func.__name__
+    
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _call_depth.get():
+            # Helpers called from another helper are part of its time, not a query of their own
+            return await func(*args, **kwargs)
+        token = _call_depth.set(1)
+        started = time.perf_counter()
+        error = False
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            _call_depth.reset(token)
+            duration = time.perf_counter() - started
+            for hook in _call_hooks:
+                hook(name, duration, error)
+    return wrapper
+
+@db_call
 async def init_db():
     async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("PRAGMA user_version")
+        if (await cursor.fetchone())[0] >= SCHEMA_VERSION:
+            return
+        # Takes effect for a new file only, existing ones are converted by _migrate
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
@@ -22,6 +149,13 @@ async def init_db():
         except:
             pass
         
+        for column in ("username TEXT", "full_name TEXT"):
+            try:
+                await db.execute(f"ALTER TABLE users ADD COLUMN {column}")
+                await db.commit()
+            except:
+                pass
+        
         try:
             await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_internal_id ON users(internal_id)")
         except:
@@ -107,8 +241,191 @@ async def init_db():
             )
         """)
         
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS farm_activations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                activated_at TIMESTAMP,
+                expires_at TIMESTAMP,
+                income_per_hour INTEGER,
+                farm_count INTEGER,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """)
+        
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS chat_members (
+                chat_id INTEGER,
+                user_id INTEGER,
+                PRIMARY KEY (chat_id, user_id)
+            ) WITHOUT ROWID
+        """)
+        
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farms_user ON farms(user_id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_nfts_user ON nfts(user_id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farm_activations_user ON farm_activations(user_id, expires_at)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farm_activations_expiry ON farm_activations(expires_at)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farms_active_since ON farms(last_activated) WHERE is_active = 1")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_auctions_status_end ON auctions(status, end_time)")
+        
+        income_columns_added = False
+        for column in ("boost REAL DEFAULT 1.0", "farm_count INTEGER DEFAULT 0", "income_rate INTEGER DEFAULT 0",
+                       "active_farms INTEGER DEFAULT 0", "next_expiry TIMESTAMP"):
+            try:
+                await db.execute(f"ALTER TABLE users ADD COLUMN {column}")
+                income_columns_added = True
+            except:
+                pass
+        
+        try:
+            await db.execute("ALTER TABLE users ADD COLUMN boosted_income INTEGER DEFAULT 0")
+            await db.execute("UPDATE users SET boosted_income = CAST(income_rate * boost AS INTEGER)")
+        except:
+            pass
+        await db.execute(BOOSTED_INCOME_TRIGGER)
+        
+        if income_columns_added:
+            await _rebuild_income_state(db)
+        
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_next_expiry ON users(next_expiry) WHERE next_expiry IS NOT NULL")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_stars ON users(stars)")
+        await db.execute("DROP INDEX IF EXISTS idx_users_income_rate")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_boosted_income ON users(boosted_income)")
+        
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_totals'")
+        stats_created = await cursor.fetchone() is None
+        await db.execute("CREATE TABLE IF NOT EXISTS stats_totals (key TEXT PRIMARY KEY, value INTEGER DEFAULT 0) WITHOUT ROWID")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day TEXT,
+                key TEXT,
+                value INTEGER DEFAULT 0,
+                PRIMARY KEY (day, key)
+            ) WITHOUT ROWID
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS daily_active (
+                day TEXT,
+                user_id INTEGER,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+        """)
+        for trigger in STATS_TRIGGERS:
+            await db.execute(trigger)
+        if stats_created:
+            await _rebuild_stats_totals(db)
+        
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+        fts_created = await cursor.fetchone() is None
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                username, full_name,
+                content = 'users', content_rowid = 'user_id',
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+        for trigger in USERS_FTS_TRIGGERS:
+            await db.execute(trigger)
+        if fts_created:
+            await db.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        
         await db.commit()
+        await _migrate(db)
+
+async def _migrate(db):
+    cursor = await db.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    if version < 1:
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] != 2:
+            # auto_vacuum of an existing file only changes when the whole file is rebuilt
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+    await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    await db.commit()
 
+async def _rebuild_income_state(db):
+    items = catalog.current()
+    now = datetime.now()
+    cutoff = (now - timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+    
+    # Expired batches are history for the archiver, only the running ones are recreated
+    await db.execute("DELETE FROM farm_activations WHERE expires_at > ?", (now.isoformat(),))
+    batches = {}
+    cursor = await db.execute(
+        "SELECT user_id, last_activated, farm_type, COUNT(*) FROM farms "
+        "WHERE is_active = 1 AND last_activated > ? GROUP BY user_id, last_activated, farm_type",
+        (cutoff,)
+    )
+    async for user_id, activated_at, farm_type, count in cursor:
+        batch = batches.setdefault((user_id, activated_at), [0, 0])
+        farm = items.farm(farm_type)
+        if farm:
+            batch[0] += farm.income_per_hour * count
+        batch[1] += count
+    await db.executemany(
+        "INSERT INTO farm_activations (user_id, activated_at, expires_at, income_per_hour, farm_count) VALUES (?, ?, ?, ?, ?)",
+        [
+            (user_id, activated_at, _farm_expiry(activated_at), income, count)
+            for (user_id, activated_at), (income, count) in batches.items()
+        ]
+    )
+    
+    boosts = {}
+    cursor = await db.execute("SELECT user_id, nft_type FROM nfts ORDER BY id")
+    async for user_id, nft_type in cursor:
+        nft = items.nft(nft_type)
+        if nft:
+            boosts[user_id] = boosts.get(user_id, 1.0) * nft.boost
+    await db.execute("UPDATE users SET boost = 1.0")
+    await db.executemany("UPDATE users SET boost = ? WHERE user_id = ?", [(boost, user_id) for user_id, boost in boosts.items()])
+    
+    await db.execute("UPDATE users SET farm_count = (SELECT COUNT(*) FROM farms WHERE farms.user_id = users.user_id)")
+    await db.execute("""
+        UPDATE users SET
+            income_rate = COALESCE((SELECT SUM(income_per_hour) FROM farm_activations a
+                                    WHERE a.user_id = users.user_id AND a.expires_at > ?), 0),
+            active_farms = COALESCE((SELECT SUM(farm_count) FROM farm_activations a
+                                     WHERE a.user_id = users.user_id AND a.expires_at > ?), 0),
+            next_expiry = (SELECT MIN(expires_at) FROM farm_activations a
+                           WHERE a.user_id = users.user_id AND a.expires_at > ?)
+    """, (now.isoformat(), now.isoformat(), now.isoformat()))
+
+async def _rebuild_stats_totals(db):
+    await db.execute("DELETE FROM stats_totals")
+    await db.execute("INSERT INTO stats_totals (key, value) SELECT 'users', COUNT(*) FROM users")
+    await db.execute("INSERT INTO stats_totals (key, value) SELECT 'stars', COALESCE(SUM(stars), 0) FROM users")
+    await db.execute("INSERT INTO stats_totals (key, value) SELECT 'farms:' || farm_type, COUNT(*) FROM farms GROUP BY farm_type")
+    await db.execute("INSERT INTO stats_totals (key, value) SELECT 'nfts:' || nft_type, COUNT(*) FROM nfts GROUP BY nft_type")
+
+def _farm_expiry(activated_at: str) -> str:
+    return (datetime.fromisoformat(activated_at) + timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+
+async def _refresh_income_state(db, user_id: int, now: datetime):
+    now_iso = now.isoformat()
+    cursor = await db.execute(
+        "SELECT COALESCE(SUM(income_per_hour), 0), COALESCE(SUM(farm_count), 0), MIN(expires_at) "
+        "FROM farm_activations WHERE user_id = ? AND expires_at > ?",
+        (user_id, now_iso)
+    )
+    income_rate, active_farms, next_expiry = await cursor.fetchone()
+    cursor = await db.execute(
+        "UPDATE users SET income_rate = ?, active_farms = ?, next_expiry = ? WHERE user_id = ? "
+        "RETURNING CAST(income_rate * boost AS INTEGER)",
+        (income_rate, active_farms, next_expiry, user_id)
+    )
+    row = await cursor.fetchone()
+    if row:
+        _notify_balance("boosted_income", user_id, row[0])
+
+@db_call
+async def rebuild_income_state():
+    async with aiosqlite.connect(DB_NAME) as db:
+        await _rebuild_income_state(db)
+        await db.commit()
+    _notify_balance("boosted_income", None)
+
+@db_call
 async def get_next_internal_id() -> int:
     async with aiosqlite.connect(DB_NAME) as db:
         cursor = await db.execute("SELECT MAX(internal_id) FROM users WHERE internal_id IS NOT NULL")
@@ -116,6 +433,7 @@ async def get_next_internal_id() -> int:
         max_id = result[0] if result[0] is not None else 0
         return max_id + 1
 
+@db_call
 async def get_or_create_user(user_id: int) -> Dict:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -132,6 +450,7 @@ async def get_or_create_user(user_id: int) -> Dict:
                 (user_id, internal_id, 200, datetime.now().isoformat())
             )
             await db.commit()
+            _notify_balance("stars", user_id, 200)
             cursor = await db.execute(
                 "SELECT * FROM users WHERE user_id = ?",
                 (user_id,)
@@ -152,82 +471,268 @@ async def get_or_create_user(user_id: int) -> Dict:
         
         return dict(user)
 
+@db_call
+async def update_user_names(user_id: int, username: Optional[str], full_name: Optional[str]) -> bool:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            "UPDATE users SET username = ?, full_name = ? WHERE user_id = ?",
+            (username, full_name, user_id)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+@db_call
+async def get_recent_user_names(since_day: str, limit: int) -> List[tuple]:
+    # Most recently active players first, used to warm the name cache before polling starts
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            "SELECT u.user_id, u.username, u.full_name FROM "
+            "(SELECT user_id, MAX(day) AS last_day FROM daily_active WHERE day >= ? GROUP BY user_id "
+            "ORDER BY last_day DESC LIMIT ?) AS recent JOIN users u ON u.user_id = recent.user_id",
+            (since_day, limit)
+        )
+        return await cursor.fetchall()
+
+@db_call
 async def get_user_stars(user_id: int) -> int:
     user = await get_or_create_user(user_id)
     return user['stars']
 
+@db_call
 async def add_stars(user_id: int, amount: int):
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+        cursor = await db.execute(
+            "UPDATE users SET stars = stars + ? WHERE user_id = ? RETURNING stars",
             (amount, user_id)
         )
+        row = await cursor.fetchone()
+        await cursor.close()
         await db.commit()
+    if row:
+        _notify_balance("stars", user_id, row[0])
 
+@db_call
 async def spend_stars(user_id: int, amount: int) -> bool:
     current_stars = await get_user_stars(user_id)
     if current_stars >= amount:
         async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "UPDATE users SET stars = stars - ? WHERE user_id = ?",
+            cursor = await db.execute(
+                "UPDATE users SET stars = stars - ? WHERE user_id = ? RETURNING stars",
                 (amount, user_id)
             )
+            row = await cursor.fetchone()
+            await cursor.close()
             await db.commit()
+        if row:
+            _notify_balance("stars", user_id, row[0])
         return True
     return False
 
+@db_call
 async def buy_farm(user_id: int, farm_type: str) -> bool:
-    from config import FARM_TYPES
-    
-    if farm_type not in FARM_TYPES:
+    farm = catalog.current().farm(farm_type)
+    if not farm:
         return False
     
-    price = FARM_TYPES[farm_type]["price"]
-    
-    if await spend_stars(user_id, price):
+    if await spend_stars(user_id, farm.price):
         async with aiosqlite.connect(DB_NAME) as db:
             await db.execute(
                 "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
                 (user_id, farm_type, datetime.now().isoformat())
             )
+            await db.execute("UPDATE users SET farm_count = farm_count + 1 WHERE user_id = ?", (user_id,))
             await db.commit()
         return True
     return False
 
-async def activate_farms(user_id: int) -> tuple[int, int]:
-    farms = await get_user_farms(user_id)
-    if not farms:
-        return 0, 0
-    
-    activated_count = 0
+@db_call
+async def activate_farms(user_id: int) -> tuple[int, int, Optional[str]]:
     now = datetime.now()
+    cutoff = (now - timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
     
     async with aiosqlite.connect(DB_NAME) as db:
-        for farm in farms:
-            farm_id = farm['id']
-            last_activated = farm.get('last_activated')
-            is_active = farm.get('is_active', 0)
-            
-            can_activate = False
-            if not last_activated or not is_active:
-                can_activate = True
-            else:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (now - last_activated_dt).total_seconds() / 3600
-                if hours_passed >= 6:
-                    can_activate = True
-            
-            if can_activate:
-                await db.execute(
-                    "UPDATE farms SET last_activated = ?, is_active = 1 WHERE id = ?",
-                    (now.isoformat(), farm_id)
-                )
-                activated_count += 1
+        cursor = await db.execute("SELECT farm_count FROM users WHERE user_id = ?", (user_id,))
+        row = await cursor.fetchone()
+        total = row[0] if row else 0
+        if not total:
+            return 0, 0, None
+        
+        await db.execute(
+            "UPDATE farms SET is_active = 0 WHERE user_id = ? AND is_active = 1 AND last_activated <= ?",
+            (user_id, cutoff)
+        )
+        cursor = await db.execute(
+            "SELECT farm_type, COUNT(*) FROM farms WHERE user_id = ? AND is_active = 0 GROUP BY farm_type",
+            (user_id,)
+        )
+        groups = await cursor.fetchall()
+        activated_count = sum(count for _, count in groups)
+        if not activated_count:
+            await db.commit()
+            return 0, total, None
         
+        farms = catalog.current().farm_by_id
+        income = sum(farms[farm_type].income_per_hour * count for farm_type, count in groups if farm_type in farms)
+        expires_at = (now + timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+        await db.execute(
+            "UPDATE farms SET last_activated = ?, is_active = 1 WHERE user_id = ? AND is_active = 0",
+            (now.isoformat(), user_id)
+        )
+        await db.execute(
+            "INSERT INTO farm_activations (user_id, activated_at, expires_at, income_per_hour, farm_count) VALUES (?, ?, ?, ?, ?)",
+            (user_id, now.isoformat(), expires_at, income, activated_count)
+        )
+        await _refresh_income_state(db, user_id, now)
         await db.commit()
     
-    return activated_count, len(farms)
+    return activated_count, total, expires_at
+
+@db_call
+async def get_income_state(user_id: int) -> Dict:
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        query = (
+            "SELECT internal_id, stars, boost, farm_count, income_rate, boosted_income AS boosted_rate, "
+            "active_farms, next_expiry, last_collect FROM users WHERE user_id = ?"
+        )
+        cursor = await db.execute(query, (user_id,))
+        state = await cursor.fetchone()
+        if not state:
+            await get_or_create_user(user_id)
+            cursor = await db.execute(query, (user_id,))
+            state = await cursor.fetchone()
+        
+        now = datetime.now()
+        if state['next_expiry'] and state['next_expiry'] <= now.isoformat():
+            await _refresh_income_state(db, user_id, now)
+            await db.commit()
+            cursor = await db.execute(query, (user_id,))
+            state = await cursor.fetchone()
+        
+        return dict(state)
+
+@db_call
+async def get_user_farm_summary(user_id: int) -> List[Dict]:
+    # is_active lags expiry by up to one sweep interval, so the count uses the same cutoff as the income state
+    cutoff = (datetime.now() - timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT farm_type, COUNT(*) AS total, "
+            "SUM(is_active = 1 AND last_activated > ?) AS active "
+            "FROM farms WHERE user_id = ? GROUP BY farm_type ORDER BY MIN(id)",
+            (cutoff, user_id)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+@db_call
+async def expire_farms_batch(limit: int) -> int:
+    cutoff = (datetime.now() - timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            "UPDATE farms SET is_active = 0 WHERE id IN "
+            "(SELECT id FROM farms WHERE is_active = 1 AND last_activated <= ? LIMIT ?)",
+            (cutoff, limit)
+        )
+        await db.commit()
+        return cursor.rowcount
+
+@db_call
+async def refresh_expired_income_batch(limit: int) -> int:
+    now = datetime.now().isoformat()
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("""
+            UPDATE users SET
+                income_rate = COALESCE((SELECT SUM(income_per_hour) FROM farm_activations a
+                                        WHERE a.user_id = users.user_id AND a.expires_at > ?1), 0),
+                active_farms = COALESCE((SELECT SUM(farm_count) FROM farm_activations a
+                                         WHERE a.user_id = users.user_id AND a.expires_at > ?1), 0),
+                next_expiry = (SELECT MIN(expires_at) FROM farm_activations a
+                               WHERE a.user_id = users.user_id AND a.expires_at > ?1)
+            WHERE user_id IN (SELECT user_id FROM users WHERE next_expiry <= ?1 LIMIT ?2)
+        """, (now, limit))
+        await db.commit()
+        refreshed = cursor.rowcount
+    if refreshed:
+        _notify_balance("boosted_income", None)
+    return refreshed
+
+@db_call
+async def reprice_activations_batch(farm_types, after_id: int, limit: int) -> tuple[int, int]:
+    # Running activations that include the given farm types take their income from the current
+    # catalog; expired ones keep what they paid. Returns the last id scanned and the rows scanned
+    items = catalog.current()
+    now = datetime.now()
+    async with aiosqlite.connect(DB_NAME) as db:
+        # The farms of an activation are the ones stamped with its activated_at, counted per type in one pass
+        cursor = await db.execute("""
+            SELECT a.id, a.user_id, f.farm_type, COUNT(f.id)
+            FROM (SELECT id, user_id, activated_at FROM farm_activations
+                  WHERE expires_at > ? AND id > ? ORDER BY id LIMIT ?) a
+            LEFT JOIN farms f ON f.user_id = a.user_id AND f.last_activated = a.activated_at
+            GROUP BY a.id, f.farm_type
+            ORDER BY a.id
+        """, (now.isoformat(), after_id, limit))
+        rows = await cursor.fetchall()
+        if not rows:
+            return after_id, 0
+        groups = {}
+        for activation_id, user_id, farm_type, count in rows:
+            groups.setdefault((activation_id, user_id), []).append((farm_type, count))
+        farms = items.farm_by_id
+        updates, user_ids = [], set()
+        for (activation_id, user_id), types in groups.items():
+            if not any(farm_type in farm_types for farm_type, _ in types):
+                continue
+            income = sum(farms[farm_type].income_per_hour * count for farm_type, count in types if farm_type in farms)
+            updates.append((income, activation_id))
+            user_ids.add(user_id)
+        await db.executemany("UPDATE farm_activations SET income_per_hour = ? WHERE id = ?", updates)
+        for user_id in user_ids:
+            await _refresh_income_state(db, user_id, now)
+        await db.commit()
+        return rows[-1][0], len(groups)
+
+@db_call
+async def reboost_holders_batch(nft_types, after_user_id: int, limit: int) -> tuple[int, int]:
+    # Boost of players holding any of the given NFT types, recomputed from the current catalog.
+    # Returns the last user_id scanned and the number of players updated
+    items = catalog.current()
+    types = sorted(nft_types)
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            f"SELECT DISTINCT user_id FROM nfts WHERE user_id > ? AND nft_type IN ({','.join('?' * len(types))}) "
+            "ORDER BY user_id LIMIT ?",
+            (after_user_id, *types, limit)
+        )
+        user_ids = [row[0] for row in await cursor.fetchall()]
+        if not user_ids:
+            return after_user_id, 0
+        boosts = dict.fromkeys(user_ids, 1.0)
+        cursor = await db.execute(
+            f"SELECT user_id, nft_type FROM nfts WHERE user_id IN ({','.join('?' * len(user_ids))}) ORDER BY id",
+            user_ids
+        )
+        for user_id, nft_type in await cursor.fetchall():
+            nft = items.nft(nft_type)
+            if nft:
+                boosts[user_id] *= nft.boost
+        await db.executemany("UPDATE users SET boost = ? WHERE user_id = ?", [(boost, user_id) for user_id, boost in boosts.items()])
+        await db.commit()
+    _notify_balance("boosted_income", None)
+    return user_ids[-1], len(user_ids)
+
+@db_call
+async def get_farm_expiries(after: str, after_id: int = 0, limit: int = 10000) -> List[tuple]:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            "SELECT id, user_id, expires_at FROM farm_activations "
+            "WHERE expires_at > ? OR (expires_at = ? AND id > ?) ORDER BY expires_at, id LIMIT ?",
+            (after, after, after_id, limit)
+        )
+        return await cursor.fetchall()
 
+@db_call
 async def get_user_farms(user_id: int) -> List[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -238,24 +743,30 @@ async def get_user_farms(user_id: int) -> List[Dict]:
         farms = await cursor.fetchall()
         return [dict(farm) for farm in farms]
 
+@db_call
 async def buy_nft(user_id: int, nft_type: str) -> bool:
-    from config import NFT_GIFTS
-    
-    if nft_type not in NFT_GIFTS:
+    nft = catalog.current().nft(nft_type)
+    if not nft:
         return False
     
-    price = NFT_GIFTS[nft_type]["price"]
-    
-    if await spend_stars(user_id, price):
+    if await spend_stars(user_id, nft.price):
         async with aiosqlite.connect(DB_NAME) as db:
             await db.execute(
                 "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
                 (user_id, nft_type)
             )
+            cursor = await db.execute(
+                "UPDATE users SET boost = boost * ? WHERE user_id = ? RETURNING CAST(income_rate * boost AS INTEGER)",
+                (nft.boost, user_id)
+            )
+            row = await cursor.fetchone()
             await db.commit()
+        if row:
+            _notify_balance("boosted_income", user_id, row[0])
         return True
     return False
 
+@db_call
 async def get_user_nfts(user_id: int) -> List[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -266,81 +777,47 @@ async def get_user_nfts(user_id: int) -> List[Dict]:
         nfts = await cursor.fetchall()
         return [dict(nft) for nft in nfts]
 
+@db_call
 async def calculate_total_boost(user_id: int) -> float:
-    from config import NFT_GIFTS
-    
-    nfts = await get_user_nfts(user_id)
-    total_boost = 1.0
-    
-    for nft in nfts:
-        nft_type = nft['nft_type']
-        if nft_type in NFT_GIFTS:
-            total_boost *= NFT_GIFTS[nft_type]["boost"]
-    
-    return total_boost
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT boost FROM users WHERE user_id = ?", (user_id,))
+        row = await cursor.fetchone()
+        return row[0] if row and row[0] else 1.0
 
+@db_call
 async def collect_farm_income(user_id: int) -> int:
-    from config import FARM_TYPES
-    
     user = await get_or_create_user(user_id)
-    farms = await get_user_farms(user_id)
-    
-    if not farms:
+    if not user['farm_count']:
         return 0
     
-    last_collect = datetime.fromisoformat(user['last_collect']) if user['last_collect'] else datetime.now()
     now = datetime.now()
-    hours_passed = (now - last_collect).total_seconds() / 3600
-    
-    hours_passed = min(hours_passed, 24)
-    
-    total_income = 0
-    for farm in farms:
-        is_active = farm.get('is_active', 0)
-        if not is_active:
-            continue
-        
-        last_activated = farm.get('last_activated')
-        if last_activated:
-            last_activated_dt = datetime.fromisoformat(last_activated)
-            hours_since_activation = (now - last_activated_dt).total_seconds() / 3600
-            if hours_since_activation >= 6:
-                async with aiosqlite.connect(DB_NAME) as db:
-                    await db.execute(
-                        "UPDATE farms SET is_active = 0 WHERE id = ?",
-                        (farm['id'],)
-                    )
-                    await db.commit()
-                continue
-        
-        farm_type = farm['farm_type']
-        if farm_type in FARM_TYPES:
-            income_per_hour = FARM_TYPES[farm_type]["income_per_hour"]
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                collect_from = max(last_activated_dt, last_collect)
-                hours_for_income = (now - collect_from).total_seconds() / 3600
-                hours_for_income = min(hours_for_income, hours_passed)
-            else:
-                hours_for_income = hours_passed
-            
-            total_income += income_per_hour * hours_for_income
-    
-    boost = await calculate_total_boost(user_id)
-    total_income = int(total_income * boost)
+    last_collect = datetime.fromisoformat(user['last_collect']) if user['last_collect'] else now
     
     async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE users SET last_collect = ? WHERE user_id = ?",
-            (now.isoformat(), user_id)
+        cursor = await db.execute(
+            "SELECT activated_at, income_per_hour FROM farm_activations WHERE user_id = ? AND expires_at > ?",
+            (user_id, now.isoformat())
         )
+        total_income = 0
+        for activated_at, income_per_hour in await cursor.fetchall():
+            collect_from = max(datetime.fromisoformat(activated_at), last_collect)
+            hours_for_income = max((now - collect_from).total_seconds() / 3600, 0)
+            total_income += income_per_hour * hours_for_income
+        
+        total_income = int(total_income * (user['boost'] or 1.0))
+        cursor = await db.execute(
+            "UPDATE users SET last_collect = ?, stars = stars + ? WHERE user_id = ? RETURNING stars",
+            (now.isoformat(), total_income, user_id)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
         await db.commit()
     
-    if total_income > 0:
-        await add_stars(user_id, total_income)
-    
+    if row and total_income:
+        _notify_balance("stars", user_id, row[0])
     return total_income
 
+@db_call
 async def register_referral(referrer_id: int, referred_id: int) -> bool:
     if referrer_id == referred_id:
         return False
@@ -362,9 +839,8 @@ async def register_referral(referrer_id: int, referred_id: int) -> bool:
         await db.commit()
         return True
 
+@db_call
 async def give_referral_reward(referred_id: int) -> bool:
-    from config import REFERRAL_REWARD
-    
     async with aiosqlite.connect(DB_NAME) as db:
         cursor = await db.execute(
             "SELECT * FROM referrals WHERE referred_id = ? AND reward_given = 0",
@@ -384,6 +860,7 @@ async def give_referral_reward(referred_id: int) -> bool:
         await db.commit()
         return True
 
+@db_call
 async def get_referral_count(user_id: int) -> int:
     async with aiosqlite.connect(DB_NAME) as db:
         cursor = await db.execute(
@@ -393,10 +870,9 @@ async def get_referral_count(user_id: int) -> int:
         result = await cursor.fetchone()
         return result[0] if result else 0
 
+@db_call
 async def create_auction(farm_type: str, starting_price: int, duration_hours: int = 24) -> int:
-    from config import FARM_TYPES
-    
-    if farm_type not in FARM_TYPES:
+    if not catalog.current().farm(farm_type):
         return 0
     
     end_time = datetime.now() + timedelta(hours=duration_hours)
@@ -409,6 +885,7 @@ async def create_auction(farm_type: str, starting_price: int, duration_hours: in
         await db.commit()
         return cursor.lastrowid
 
+@db_call
 async def get_active_auctions() -> List[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -418,6 +895,7 @@ async def get_active_auctions() -> List[Dict]:
         auctions = await cursor.fetchall()
         return [dict(auction) for auction in auctions]
 
+@db_call
 async def place_bid(auction_id: int, user_id: int, bid_amount: int) -> tuple[bool, str]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -462,6 +940,7 @@ async def place_bid(auction_id: int, user_id: int, bid_amount: int) -> tuple[boo
         
         return True, f"Ставка принята: {bid_amount} ⭐"
 
+@db_call
 async def end_auction(auction_id: int) -> Optional[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -493,11 +972,32 @@ async def end_auction(auction_id: int) -> Optional[Dict]:
                 "INSERT INTO farms (user_id, farm_type) VALUES (?, ?)",
                 (winner_id, farm_type)
             )
+            await db.execute("UPDATE users SET farm_count = farm_count + 1 WHERE user_id = ?", (winner_id,))
             await db.commit()
         
         return auction_dict
 
+# Every banned user_id once load_bans() ran. From then on it is the only thing is_banned reads:
+# the ban functions below keep it in sync, changes made outside this process (a restored backup,
+# an import, a manual edit) are seen at the next load_bans, which the bot repeats every BAN_RELOAD_INTERVAL
+_banned_ids: Optional[Set[int]] = None
+
+@db_call
+async def load_bans() -> int:
+    global _banned_ids
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT user_id FROM bans")
+        _banned_ids = {row[0] for row in await cursor.fetchall()}
+    return len(_banned_ids)
+
 async def is_banned(user_id: int) -> bool:
+    # Checked on every update, so it stays off the database once the ban list is loaded
+    if _banned_ids is not None:
+        return user_id in _banned_ids
+    return await _query_banned(user_id)
+
+@db_call
+async def _query_banned(user_id: int) -> bool:
     try:
         async with aiosqlite.connect(DB_NAME) as db:
             cursor = await db.execute(
@@ -509,6 +1009,7 @@ async def is_banned(user_id: int) -> bool:
     except Exception as e:
         return False
 
+@db_call
 async def ban_user(user_id: int, reason: str, admin_id: int):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute(
@@ -516,7 +1017,10 @@ async def ban_user(user_id: int, reason: str, admin_id: int):
             (user_id, reason, admin_id)
         )
         await db.commit()
+    if _banned_ids is not None:
+        _banned_ids.add(user_id)
 
+@db_call
 async def unban_user(user_id: int):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute(
@@ -524,26 +1028,125 @@ async def unban_user(user_id: int):
             (user_id,)
         )
         await db.commit()
+    if _banned_ids is not None:
+        _banned_ids.discard(user_id)
 
+@db_call
 async def admin_add_stars(user_id: int, amount: int):
     await add_stars(user_id, amount)
 
+@db_call
 async def admin_add_farm(user_id: int, farm_type: str):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute(
             "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
             (user_id, farm_type, datetime.now().isoformat())
         )
+        await db.execute("UPDATE users SET farm_count = farm_count + 1 WHERE user_id = ?", (user_id,))
         await db.commit()
 
+@db_call
 async def admin_add_nft(user_id: int, nft_type: str):
+    nft = catalog.current().nft(nft_type)
+    
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute(
             "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
             (user_id, nft_type)
         )
+        row = None
+        if nft:
+            cursor = await db.execute(
+                "UPDATE users SET boost = boost * ? WHERE user_id = ? RETURNING CAST(income_rate * boost AS INTEGER)",
+                (nft.boost, user_id)
+            )
+            row = await cursor.fetchone()
+        await db.commit()
+    if row:
+        _notify_balance("boosted_income", user_id, row[0])
+
+@db_call
+async def get_target_user_ids(condition: str, params: tuple, after_internal_id: int, limit: int) -> tuple[List[int], int]:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(
+            f"SELECT user_id, internal_id FROM users WHERE internal_id > ? AND ({condition}) ORDER BY internal_id LIMIT ?",
+            (after_internal_id, *params, limit)
+        )
+        rows = await cursor.fetchall()
+    if not rows:
+        return [], after_internal_id
+    return [user_id for user_id, _ in rows], rows[-1][1]
+
+@db_call
+async def bulk_add_stars(user_ids: List[int], amount: int) -> int:
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany(
+            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+            [(amount, user_id) for user_id in user_ids]
+        )
+        await db.commit()
+    _notify_balance("stars", None)
+    return len(user_ids)
+
+@db_call
+async def bulk_add_farm(user_ids: List[int], farm_type: str) -> int:
+    now = datetime.now().isoformat()
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany(
+            "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
+            [(user_id, farm_type, now) for user_id in user_ids]
+        )
+        await db.executemany(
+            "UPDATE users SET farm_count = farm_count + 1 WHERE user_id = ?",
+            [(user_id,) for user_id in user_ids]
+        )
+        await db.commit()
+    return len(user_ids)
+
+@db_call
+async def bulk_add_nft(user_ids: List[int], nft_type: str) -> int:
+    nft = catalog.current().nft(nft_type)
+    
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany(
+            "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
+            [(user_id, nft_type) for user_id in user_ids]
+        )
+        if nft:
+            await db.executemany(
+                "UPDATE users SET boost = boost * ? WHERE user_id = ?",
+                [(nft.boost, user_id) for user_id in user_ids]
+            )
+        await db.commit()
+    if nft:
+        _notify_balance("boosted_income", None)
+    return len(user_ids)
+
+@db_call
+async def bulk_ban(user_ids: List[int], reason: str, admin_id: int) -> int:
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO bans (user_id, reason, banned_by) VALUES (?, ?, ?)",
+            [(user_id, reason, admin_id) for user_id in user_ids]
+        )
         await db.commit()
+    if _banned_ids is not None:
+        _banned_ids.update(user_ids)
+    return len(user_ids)
 
+@db_call
+async def bulk_unban(user_ids: List[int]) -> int:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.executemany(
+            "DELETE FROM bans WHERE user_id = ?",
+            [(user_id,) for user_id in user_ids]
+        )
+        await db.commit()
+    if _banned_ids is not None:
+        _banned_ids.difference_update(user_ids)
+    return max(cursor.rowcount, 0)
+
+@db_call
 async def get_all_users() -> List[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -551,6 +1154,174 @@ async def get_all_users() -> List[Dict]:
         users = await cursor.fetchall()
         return [dict(user) for user in users]
 
+@db_call
+async def add_chat_member(chat_id: int, user_id: int):
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO chat_members (chat_id, user_id) VALUES (?, ?)",
+            (chat_id, user_id)
+        )
+        await db.commit()
+
+@db_call
+async def remove_chat_member(chat_id: int, user_id: int):
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute(
+            "DELETE FROM chat_members WHERE chat_id = ? AND user_id = ?",
+            (chat_id, user_id)
+        )
+        await db.commit()
+
+LEADERBOARD_FIELDS = ("stars", "boosted_income")
+
+@db_call
+async def get_leaderboard(field: str, limit: int, chat_id: Optional[int] = None) -> List[Dict]:
+    if field not in LEADERBOARD_FIELDS:
+        raise ValueError(f"Unknown leaderboard field: {field}")
+    
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        if chat_id is None:
+            cursor = await db.execute(
+                f"SELECT user_id, internal_id, username, full_name, {field} AS value "
+                f"FROM users ORDER BY {field} DESC LIMIT ?",
+                (limit,)
+            )
+        else:
+            cursor = await db.execute(
+                f"SELECT u.user_id, u.internal_id, u.username, u.full_name, u.{field} AS value "
+                f"FROM chat_members m JOIN users u ON u.user_id = m.user_id "
+                f"WHERE m.chat_id = ? ORDER BY u.{field} DESC LIMIT ?",
+                (chat_id, limit)
+            )
+        return [dict(row) for row in await cursor.fetchall()]
+
+@db_call
+async def get_user_rank(user_id: int, field: str, chat_id: Optional[int] = None) -> Optional[tuple[int, int]]:
+    if field not in LEADERBOARD_FIELDS:
+        raise ValueError(f"Unknown leaderboard field: {field}")
+    
+    # COUNT over the covering index visits every row ranked above the player: cheap near the
+    # top, about 15 ms at rank 1M. Global ranks are cached by leaderboard.Leaderboards.rank
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute(f"SELECT {field} FROM users WHERE user_id = ?", (user_id,))
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        value = row[0]
+        if chat_id is None:
+            cursor = await db.execute(f"SELECT COUNT(*) FROM users WHERE {field} > ?", (value,))
+        else:
+            cursor = await db.execute(
+                f"SELECT COUNT(*) FROM chat_members m JOIN users u ON u.user_id = m.user_id "
+                f"WHERE m.chat_id = ? AND u.{field} > ?",
+                (chat_id, value)
+            )
+        ahead = (await cursor.fetchone())[0]
+        return ahead + 1, value
+
+@db_call
+async def get_users_brief(user_ids: List[int]) -> Dict[int, Dict]:
+    if not user_ids:
+        return {}
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        placeholders = ", ".join("?" * len(user_ids))
+        cursor = await db.execute(
+            f"SELECT user_id, internal_id, username, full_name FROM users WHERE user_id IN ({placeholders})",
+            list(user_ids)
+        )
+        return {row['user_id']: dict(row) for row in await cursor.fetchall()}
+
+@db_call
+async def rebuild_stats_totals():
+    async with aiosqlite.connect(DB_NAME) as db:
+        await _rebuild_stats_totals(db)
+        await db.commit()
+
+@db_call
+async def record_daily_stats(day: str, counters: Dict[str, int]):
+    if not counters:
+        return
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.executemany(
+            "INSERT INTO stats_daily (day, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, key) DO UPDATE SET value = value + excluded.value",
+            [(day, key, value) for key, value in counters.items()]
+        )
+        await db.commit()
+
+@db_call
+async def mark_active_users(day: str, user_ids) -> int:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.executemany(
+            "INSERT OR IGNORE INTO daily_active (day, user_id) VALUES (?, ?)",
+            [(day, user_id) for user_id in user_ids]
+        )
+        added = cursor.rowcount
+        if added > 0:
+            await db.execute(
+                "INSERT INTO stats_daily (day, key, value) VALUES (?, 'dau', ?) "
+                "ON CONFLICT(day, key) DO UPDATE SET value = value + excluded.value",
+                (day, added)
+            )
+        await db.commit()
+        return max(added, 0)
+
+@db_call
+async def get_stats_snapshot(since_day: str) -> Dict:
+    async with aiosqlite.connect(DB_NAME) as db:
+        cursor = await db.execute("SELECT key, value FROM stats_totals")
+        totals = dict(await cursor.fetchall())
+        cursor = await db.execute("SELECT day, key, value FROM stats_daily WHERE day >= ?", (since_day,))
+        daily = {}
+        for day, key, value in await cursor.fetchall():
+            daily.setdefault(day, {})[key] = value
+        return {"totals": totals, "daily": daily}
+
+def _fts_query(query: str) -> Optional[str]:
+    column = ""
+    if query.startswith("@"):
+        column, query = "username : ", query[1:]
+    terms = [term.replace('"', '""') for term in query.split() if term]
+    if not terms:
+        return None
+    return " ".join(f'{column}"{term}"*' for term in terms)
+
+@db_call
+async def search_users(query: str, limit: int, offset: int = 0) -> List[Dict]:
+    query = query.strip()
+    columns = "u.user_id, u.internal_id, u.username, u.full_name, u.stars"
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        found = []
+        if query.lstrip("-").isdigit():
+            number = int(query)
+            if not offset:
+                cursor = await db.execute(
+                    f"SELECT {columns} FROM users u WHERE u.user_id = ? UNION SELECT {columns} FROM users u WHERE u.internal_id = ?",
+                    (number, number)
+                )
+                found = [dict(row) for row in await cursor.fetchall()]
+            return found
+        
+        match = _fts_query(query)
+        if not match:
+            return found
+        cursor = await db.execute(
+            f"SELECT {columns} FROM users_fts f JOIN users u ON u.user_id = f.rowid "
+            f"WHERE users_fts MATCH ? ORDER BY f.rowid LIMIT ? OFFSET ?",
+            (match, limit, offset)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+@db_call
+async def rebuild_search_index():
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        await db.commit()
+
+@db_call
 async def get_all_chats() -> List[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -558,6 +1329,7 @@ async def get_all_chats() -> List[Dict]:
         chats = await cursor.fetchall()
         return [dict(chat) for chat in chats]
 
+@db_call
 async def add_chat(chat_id: int, chat_type: str, title: str = None):
     async with aiosqlite.connect(DB_NAME) as db:
         await db.execute(
@@ -566,6 +1338,7 @@ async def add_chat(chat_id: int, chat_type: str, title: str = None):
         )
         await db.commit()
 
+@db_call
 async def get_next_internal_id() -> int:
     async with aiosqlite.connect(DB_NAME) as db:
         cursor = await db.execute("SELECT MAX(internal_id) FROM users WHERE internal_id IS NOT NULL")
@@ -573,6 +1346,7 @@ async def get_next_internal_id() -> int:
         max_id = result[0] if result[0] is not None else 0
         return max_id + 1
 
+@db_call
 async def get_user_by_internal_id(internal_id: int) -> Optional[Dict]:
     async with aiosqlite.connect(DB_NAME) as db:
         db.row_factory = aiosqlite.Row
@@ -583,6 +1357,7 @@ async def get_user_by_internal_id(internal_id: int) -> Optional[Dict]:
         user = await cursor.fetchone()
         return dict(user) if user else None
 
+@db_call
 async def get_user_info_by_internal_id(internal_id: int) -> Optional[Dict]:
     user = await get_user_by_internal_id(internal_id)
     if user:
@@ -593,3 +1368,107 @@ async def get_user_info_by_internal_id(internal_id: int) -> Optional[Dict]:
         }
     return None
 
+def _archive_path() -> str:
+    return os.path.splitext(DB_NAME)[0] + "_archive.db"
+
+async def _attach_archive(db):
+    await db.execute("ATTACH DATABASE ? AS archive", (_archive_path(),))
+    for table, (columns, key, _, indexes) in ARCHIVE_TABLES.items():
+        await db.execute(
+            f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT {columns}, NULL AS archived_at FROM main.{table} WHERE 0"
+        )
+        await db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_{table}_key ON {table}({key})")
+        for column in indexes:
+            await db.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_{column} ON {table}({column})")
+
+@db_call
+async def archive_batch(table: str, cutoff: str, limit: int) -> int:
+    columns, key, condition, _ = ARCHIVE_TABLES[table]
+    async with aiosqlite.connect(DB_NAME) as db:
+        await _attach_archive(db)
+        await db.execute(
+            f"CREATE TEMP TABLE archive_batch AS SELECT {key} FROM main.{table} WHERE {condition} LIMIT ?",
+            (cutoff, limit)
+        )
+        # Copy and delete commit together, the archive file is part of the same transaction
+        await db.execute(
+            f"INSERT OR REPLACE INTO archive.{table} ({columns}, archived_at) "
+            f"SELECT {columns}, ? FROM main.{table} WHERE ({key}) IN (SELECT {key} FROM temp.archive_batch)",
+            (datetime.now().isoformat(),)
+        )
+        cursor = await db.execute(
+            f"DELETE FROM main.{table} WHERE ({key}) IN (SELECT {key} FROM temp.archive_batch)"
+        )
+        await db.commit()
+        return cursor.rowcount
+
+@db_call
+async def get_archive_summary() -> Dict[str, Dict]:
+    async with aiosqlite.connect(DB_NAME) as db:
+        await _attach_archive(db)
+        summary = {}
+        for table in ARCHIVE_TABLES:
+            cursor = await db.execute(f"SELECT COUNT(*), MIN(archived_at), MAX(archived_at) FROM archive.{table}")
+            rows, first, last = await cursor.fetchone()
+            summary[table] = {'rows': rows, 'first': first, 'last': last}
+        return summary
+
+@db_call
+async def get_archived_user_history(user_id: int, limit: int = 5) -> Dict:
+    async with aiosqlite.connect(DB_NAME) as db:
+        db.row_factory = aiosqlite.Row
+        await _attach_archive(db)
+        cursor = await db.execute(
+            "SELECT COUNT(*) AS won, COALESCE(SUM(current_bid), 0) AS spent FROM archive.auctions WHERE current_bidder_id = ?",
+            (user_id,)
+        )
+        history = dict(await cursor.fetchone())
+        cursor = await db.execute(
+            "SELECT id, farm_type, current_bid, end_time FROM archive.auctions "
+            "WHERE current_bidder_id = ? ORDER BY end_time DESC LIMIT ?",
+            (user_id, limit)
+        )
+        history['auctions'] = [dict(row) for row in await cursor.fetchall()]
+        cursor = await db.execute(
+            "SELECT COUNT(*) AS activations, COALESCE(SUM(farm_count), 0) AS farms_activated, "
+            "MAX(activated_at) AS last_activated FROM archive.farm_activations WHERE user_id = ?",
+            (user_id,)
+        )
+        history.update(dict(await cursor.fetchone()))
+        cursor = await db.execute(
+            "SELECT COUNT(*) AS active_days, MAX(day) AS last_active_day FROM archive.daily_active WHERE user_id = ?",
+            (user_id,)
+        )
+        history.update(dict(await cursor.fetchone()))
+        return history
+
+@db_call
+async def optimize():
+    async with aiosqlite.connect(DB_NAME) as db:
+        await db.execute("PRAGMA analysis_limit = 400")
+        if aiosqlite.sqlite_version_info >= (3, 46, 0):
+            await db.execute("PRAGMA optimize = 0x10002")
+        else:
+            # Before 3.46 optimize only considers tables this connection has queried
+            await db.execute("ANALYZE")
+        await db.commit()
+
+@db_call
+async def incremental_vacuum(pages: int) -> int:
+    async with aiosqlite.connect(DB_NAME) as db:
+        # execute() steps a pragma once and frees a single page, executescript runs it to completion
+        await db.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        cursor = await db.execute("PRAGMA freelist_count")
+        return (await cursor.fetchone())[0]
+
+@db_call
+async def get_storage_stats() -> Dict:
+    async with aiosqlite.connect(DB_NAME) as db:
+        stats = {}
+        for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum", "journal_mode"):
+            cursor = await db.execute(f"PRAGMA {pragma}")
+            stats[pragma] = (await cursor.fetchone())[0]
+    for key, path in (("file_bytes", DB_NAME), ("wal_bytes", DB_NAME + "-wal"), ("archive_bytes", _archive_path())):
+        stats[key] = os.path.getsize(path) if os.path.exists(path) else 0
+    stats["free_bytes"] = stats["freelist_count"] * stats["page_size"]
+    return stats
@@ -1,5 +1,5 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from config import FARM_TYPES, NFT_GIFTS
+import catalog
 
 def get_main_menu():
     keyboard = ReplyKeyboardMarkup(
@@ -13,40 +13,92 @@ def get_main_menu():
     )
     return keyboard
 
-def get_farm_shop_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+_catalog_renders = {}
+
+def build_catalog_renders():
+    global _catalog_renders
     
-    for farm_id, farm_data in FARM_TYPES.items():
-        keyboard.inline_keyboard.append([
+    items = catalog.current()
+    farm_shop_rows = []
+    farm_select_rows = []
+    farm_catalog_text = ""
+    for farm in items.farms:
+        farm_shop_rows.append([
             InlineKeyboardButton(
-                text=f"{farm_data['name']} - {farm_data['price']}⭐ ({farm_data['income_per_hour']}⭐/час)",
-                callback_data=f"buy_farm_{farm_id}"
+                text=f"{farm.name} - {farm.price}⭐ ({farm.income_per_hour}⭐/час)",
+                callback_data=f"buy_farm_{farm.id}"
             )
         ])
+        farm_select_rows.append([
+            InlineKeyboardButton(
+                text=farm.name,
+                callback_data=f"admin_farm_{farm.id}"
+            )
+        ])
+        farm_catalog_text += (
+            f"{farm.name}\n"
+            f"💰 Цена: {farm.price} ⭐\n"
+            f"📈 Доход: {farm.income_per_min} ⭐/мин | {farm.income_per_hour} ⭐/час\n\n"
+        )
     
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")
-    ])
-    
-    return keyboard
-
-def get_nft_shop_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    for nft_id, nft_data in NFT_GIFTS.items():
-        boost_text = f"+{int((nft_data['boost'] - 1) * 100)}%"
-        keyboard.inline_keyboard.append([
+    nft_shop_rows = []
+    nft_select_rows = []
+    nft_catalog_text = ""
+    for nft in items.nfts:
+        boost_text = f"+{nft.boost_percent}%"
+        nft_shop_rows.append([
             InlineKeyboardButton(
-                text=f"{nft_data['name']} - {nft_data['price']}⭐ ({boost_text})",
-                callback_data=f"buy_nft_{nft_id}"
+                text=f"{nft.name} - {nft.price}⭐ ({boost_text})",
+                callback_data=f"buy_nft_{nft.id}"
             )
         ])
+        nft_select_rows.append([
+            InlineKeyboardButton(
+                text=nft.name,
+                callback_data=f"admin_nft_{nft.id}"
+            )
+        ])
+        nft_catalog_text += (
+            f"{nft.name}\n"
+            f"💰 Цена: {nft.price} ⭐\n"
+            f"⚡ Буст: {boost_text}\n\n"
+        )
     
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")
-    ])
+    back_to_main = [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
+    back_to_admin = [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
     
-    return keyboard
+    # Rendered objects are shared between requests and must never be mutated by callers
+    _catalog_renders = {
+        "farm_shop": InlineKeyboardMarkup(inline_keyboard=farm_shop_rows + [back_to_main]),
+        "nft_shop": InlineKeyboardMarkup(inline_keyboard=nft_shop_rows + [back_to_main]),
+        "farm_select": InlineKeyboardMarkup(inline_keyboard=farm_select_rows + [back_to_admin]),
+        "nft_select": InlineKeyboardMarkup(inline_keyboard=nft_select_rows + [back_to_admin]),
+        "farm_catalog_text": farm_catalog_text,
+        "nft_catalog_text": nft_catalog_text,
+    }
+    return _catalog_renders
+
+def invalidate_catalog_renders():
+    global _catalog_renders
+    _catalog_renders = {}
+
+catalog.add_reload_listener(lambda old, new: invalidate_catalog_renders())
+
+def _get_catalog_render(key: str):
+    renders = _catalog_renders or build_catalog_renders()
+    return renders[key]
+
+def get_farm_shop_keyboard():
+    return _get_catalog_render("farm_shop")
+
+def get_nft_shop_keyboard():
+    return _get_catalog_render("nft_shop")
+
+def get_farm_catalog_text():
+    return _get_catalog_render("farm_catalog_text")
+
+def get_nft_catalog_text():
+    return _get_catalog_render("nft_catalog_text")
 
 def get_back_keyboard():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -92,6 +144,17 @@ def get_admin_menu():
     ])
     return keyboard
 
+def get_top_keyboard(scope: str, field: str):
+    buttons = [
+        InlineKeyboardButton(
+            text=("• " if key == field else "") + label,
+            callback_data=f"top_{scope}_{key}"
+        )
+        for key, label in (("stars", "⭐ Звезды"), ("income", "🌾 Доход"))
+    ]
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons])
+    return keyboard
+
 def get_casino_menu():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🎲 Кости (x2)", callback_data="casino_dice")],
@@ -102,29 +165,7 @@ def get_casino_menu():
     return keyboard
 
 def get_farm_select_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    for farm_id, farm_data in FARM_TYPES.items():
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text=farm_data['name'],
-                callback_data=f"admin_farm_{farm_id}"
-            )
-        ])
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")
-    ])
-    return keyboard
+    return _get_catalog_render("farm_select")
 
 def get_nft_select_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    for nft_id, nft_data in NFT_GIFTS.items():
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text=nft_data['name'],
-                callback_data=f"admin_nft_{nft_id}"
-            )
-        ])
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")
-    ])
-    return keyboard
+    return _get_catalog_render("nft_select")
@@ -0,0 +1,97 @@
+import logging
+from typing import Dict, List, Optional
+
+import database
+from cache import TTLCache
+from config import LEADERBOARD_SIZE, LEADERBOARD_RANK_TTL, LEADERBOARD_RANK_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+class TopK:
+    # Everyone outside the cached entries is known to be at or below `floor`, so a balance
+    # change only matters if it lifts a user above the floor or drops a cached user below it.
+    def __init__(self, field: str, size: int, slack: int):
+        self.field = field
+        self.size = size
+        self.capacity = size + slack
+        self.entries: Dict[int, int] = {}
+        self.floor = None
+        self.stale = True
+
+    async def refresh(self):
+        rows = await database.get_leaderboard(self.field, self.capacity)
+        self.entries = {row['user_id']: row['value'] for row in rows}
+        self.floor = rows[-1]['value'] if len(rows) >= self.capacity else None
+        self.stale = False
+
+    def update(self, user_id: Optional[int], value):
+        if self.stale:
+            return
+        if user_id is None:
+            self.stale = True
+            return
+        if self.floor is not None and value < self.floor:
+            if self.entries.pop(user_id, None) is not None and len(self.entries) < self.size:
+                self.stale = True
+            return
+        if self.floor is not None and value == self.floor and user_id not in self.entries:
+            return
+        self.entries[user_id] = value
+        if len(self.entries) > self.capacity:
+            lowest = min(self.entries, key=self.entries.get)
+            del self.entries[lowest]
+            self.floor = min(self.entries.values())
+
+    def rank(self, user_id: int) -> Optional[tuple]:
+        # Exact for cached entries: everyone outside them is at or below the floor
+        if self.stale or user_id not in self.entries:
+            return None
+        value = self.entries[user_id]
+        return 1 + sum(1 for other in self.entries.values() if other > value), value
+
+    async def top(self) -> List[tuple]:
+        if self.stale:
+            await self.refresh()
+        ranked = sorted(self.entries.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:self.size]
+
+class Leaderboards:
+    def __init__(self, size: int = LEADERBOARD_SIZE, slack: int = LEADERBOARD_SIZE * 4):
+        self.size = size
+        self.boards = {field: TopK(field, size, slack) for field in database.LEADERBOARD_FIELDS}
+        # Global ranks outside the cached entries come from get_user_rank, O(rank) each: they are
+        # kept for the TTL and dropped when the player's own balance changes
+        self.ranks = TTLCache(ttl=LEADERBOARD_RANK_TTL, max_size=LEADERBOARD_RANK_CACHE_SIZE)
+        database.add_balance_listener(self.on_balance_change)
+
+    def on_balance_change(self, field: str, user_id: Optional[int], value):
+        board = self.boards.get(field)
+        if board is not None:
+            board.update(user_id, value)
+        if user_id is None:
+            self.ranks.clear()
+        else:
+            self.ranks.pop((field, user_id))
+
+    async def top(self, field: str, chat_id: Optional[int] = None) -> List[Dict]:
+        if chat_id is not None:
+            return await database.get_leaderboard(field, self.size, chat_id)
+        ranked = await self.boards[field].top()
+        users = await database.get_users_brief([user_id for user_id, _ in ranked])
+        return [
+            dict(users.get(user_id, {'user_id': user_id}), value=value)
+            for user_id, value in ranked
+        ]
+
+    async def rank(self, field: str, user_id: int, chat_id: Optional[int] = None) -> Optional[tuple]:
+        if chat_id is not None:
+            return await database.get_user_rank(user_id, field, chat_id)
+        rank = self.boards[field].rank(user_id)
+        if rank is not None:
+            return rank
+        rank = self.ranks.get((field, user_id))
+        if rank is None:
+            rank = await database.get_user_rank(user_id, field)
+            if rank is not None:
+                self.ranks.set((field, user_id), rank)
+        return rank
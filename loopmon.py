@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from config import LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD, LOOP_MONITOR_DEBUG
+from metrics import loop_lag, loop_blocks
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+STACK_DEPTH = 12
+MAX_SAMPLES = 20
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _where(stack: traceback.StackSummary) -> str:
+    # Innermost frame in our own code: the handler or helper that held the loop
+    for frame in reversed(stack):
+        if frame.filename.startswith(PROJECT_DIR) and not frame.filename.endswith("loopmon.py"):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    frame = stack[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+
+class LoopMonitor:
+    # Lag is the delay of a timer wake-up past its deadline: anything that keeps the loop busy,
+    # whether one slow callback or a long queue of short ones, shows up here.
+    # With debug on, a watchdog thread pings the loop and samples its stack while a ping waits
+    # longer than block_threshold, which points at the code that stalls every other update.
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, block_threshold: float = LOOP_BLOCK_THRESHOLD,
+                 debug: bool = LOOP_MONITOR_DEBUG, window: int = 120):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self.lags = deque(maxlen=window)
+        self.blocks = deque(maxlen=20)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def summary(self) -> Dict:
+        lags = list(self.lags)
+        result = {
+            "lag_ms": round(lags[-1] * 1000, 2) if lags else 0,
+            "p99_lag_ms": round(_percentile(lags, 0.99) * 1000, 2) if lags else 0,
+            "max_lag_ms": round(max(lags) * 1000, 2) if lags else 0,
+        }
+        if self.debug:
+            result["blocks"] = [
+                {"at": block["at"], "ms": block["ms"], "where": block["where"]} for block in list(self.blocks)
+            ]
+        return result
+
+    def _sample(self, thread_id: int) -> Optional[traceback.StackSummary]:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return None
+        return traceback.extract_stack(frame, limit=STACK_DEPTH)
+
+    def _record(self, started: float, duration: float, samples: List[traceback.StackSummary]):
+        loop_blocks.inc()
+        if not samples:
+            return
+        counts = Counter(tuple(stack.format()) for stack in samples)
+        formatted, hits = counts.most_common(1)[0]
+        stack = next(stack for stack in samples if tuple(stack.format()) == formatted)
+        where = _where(stack)
+        self.blocks.append({
+            "at": time.strftime("%H:%M:%S", time.localtime(started)),
+            "ms": round(duration * 1000, 1),
+            "where": where,
+            "stack": "".join(formatted),
+        })
+        logger.warning(
+            f"Цикл событий заблокирован на {duration * 1000:.0f} мс в {where} "
+            f"({hits} из {len(samples)} снимков стека):\n{''.join(formatted)}"
+        )
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        step = self.block_threshold / 2
+        while not self._stop.is_set():
+            answered = threading.Event()
+            posted, wall = time.monotonic(), time.time()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return
+            if answered.wait(self.block_threshold):
+                self._stop.wait(self.block_threshold)
+                continue
+            samples = []
+            while not answered.wait(step):
+                if self._stop.is_set():
+                    return
+                if len(samples) < MAX_SAMPLES:
+                    stack = self._sample(thread_id)
+                    if stack:
+                        samples.append(stack)
+            self._record(wall, time.monotonic() - posted, samples)
+
+    def start_watchdog(self):
+        loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, args=(loop, threading.get_ident()), name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop_watchdog(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        if self.debug:
+            self.start_watchdog()
+        try:
+            while True:
+                deadline = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, loop.time() - deadline)
+                self.lags.append(lag)
+                loop_lag.observe(lag)
+        finally:
+            self.stop_watchdog()
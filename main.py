@@ -1,13 +1,48 @@
 import asyncio
 import logging
 import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+# Taken before aiogram loads, so the startup profile includes import time
+IMPORT_STARTED = time.perf_counter()
+
 from aiohttp import web
 from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandStart
-from config import BOT_TOKEN, FARM_TYPES, NFT_GIFTS, GAME_NAME, ADMIN_IDS
+from config import (
+    BOT_TOKEN, GAME_NAME, ADMIN_IDS, REFERRAL_REWARD, TELEGRAM_API_URL,
+    USER_NAME_CACHE_TTL, USER_NAME_CACHE_SIZE, RECORD_UPDATES_PATH, RECORD_UPDATES_SALT,
+    RECORD_UPDATES_SALT_PATH, CHAT_MEMBER_CACHE_SIZE, BACKUP_INTERVAL, ARCHIVE_INTERVAL, MAINTENANCE_INTERVAL,
+    CATALOG_POLL_INTERVAL, STARTUP_DEFER, PRELOAD_USERS, PRELOAD_DAYS, BAN_RELOAD_INTERVAL, LOOP_MONITOR_INTERVAL
+)
+from cache import TTLCache
+from metrics import (
+    REGISTRY, observe_db_call, update_metrics_middleware,
+    handler_metrics_middleware, RequestMetricsMiddleware, startup_seconds
+)
+from tracing import record_db_call, trace_middleware, RequestTraceMiddleware
+from recorder import UpdateRecorder, load_salt
+from scheduler import ExpiryNotifier, FarmSweeper, IncomeRepricer
+from leaderboard import Leaderboards
+from stats import StatsBuffer
+from bulk import TargetSpec, run_bulk, ProgressMessage
+import catalog
+from catalog import CatalogError
+from backup import BackupManager
+from archive import Archiver
+from maintenance import Maintenance
+from startup import StartupProfile
+from loopmon import LoopMonitor
+from throttle import Throttle, CallbackDedup
+from userlock import UserLocks
 from database import (
-    init_db, get_or_create_user, get_user_stars, 
+    init_db, add_call_hook, get_or_create_user, get_user_stars, 
     buy_farm, get_user_farms, buy_nft, get_user_nfts,
     calculate_total_boost, collect_farm_income,
     register_referral, give_referral_reward, get_referral_count,
@@ -15,17 +50,26 @@ from database import (
     activate_farms, is_banned, ban_user, unban_user,
     admin_add_stars, admin_add_farm, admin_add_nft,
     get_all_users, get_all_chats, add_chat, spend_stars, add_stars,
-    get_user_by_internal_id, get_user_info_by_internal_id
+    get_user_by_internal_id, get_user_info_by_internal_id, update_user_names,
+    get_income_state, get_user_farm_summary, add_chat_member, remove_chat_member,
+    search_users, get_users_brief,
+    bulk_add_stars, bulk_add_farm, bulk_add_nft, bulk_ban, bulk_unban,
+    get_archive_summary, get_archived_user_history,
+    load_bans, get_recent_user_names
 )
 from keyboards import (
     get_main_menu, get_farm_shop_keyboard, 
     get_nft_shop_keyboard, get_back_keyboard, get_auction_keyboard,
-    get_admin_menu, get_casino_menu, get_farm_select_keyboard, get_nft_select_keyboard
+    get_admin_menu, get_casino_menu, get_farm_select_keyboard, get_nft_select_keyboard,
+    get_farm_catalog_text, get_nft_catalog_text, build_catalog_renders, get_top_keyboard
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+startup_profile = StartupProfile(IMPORT_STARTED, startup_seconds)
+startup_profile.mark("imports")
+
 if not BOT_TOKEN or BOT_TOKEN == "8255377913:AAFlkYfXZeqi-vxSbOLHAKmZ6qkZTaBDwrw":
     logger.error("BOT_TOKEN не установлен! Установите переменную окружения BOT_TOKEN")
     raise ValueError("BOT_TOKEN не установлен")
@@ -36,9 +80,79 @@ if len(BOT_TOKEN.split(":")) != 2:
 
 logger.info(f"Токен бота загружен (длина: {len(BOT_TOKEN)})")
 
-bot = Bot(token=BOT_TOKEN)
+if TELEGRAM_API_URL:
+    logger.info(f"Используется Bot API сервер {TELEGRAM_API_URL}")
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=BOT_TOKEN)
+bot.session.middleware(RequestMetricsMiddleware())
+bot.session.middleware(RequestTraceMiddleware())
 dp = Dispatcher()
 
+add_call_hook(observe_db_call)
+add_call_hook(record_db_call)
+
+MENU_BUTTONS = {button.text for row in get_main_menu().keyboard for button in row}
+
+# Callback prefixes followed by a catalog id, which may itself contain underscores
+CATALOG_CALLBACKS = ("buy_farm_", "buy_nft_", "admin_farm_", "admin_nft_")
+# Every other routed callback: prefixes followed by an id, page or tab, and exact values
+CALLBACK_PREFIXES = CATALOG_CALLBACKS + ("top_", "find_page_", "bid_", "auction_", "admin_user_")
+CALLBACK_LABELS = {
+    "casino_slots", "casino_roulette", "casino_dice", "back_to_main",
+    "admin_users", "admin_stats", "admin_help", "admin_back",
+    "admin_give_stars", "admin_give_nft", "admin_give_farm",
+}
+
+_commands: Optional[frozenset] = None
+
+def registered_commands() -> frozenset:
+    # Read from the routers on first use, after every handler has been registered
+    global _commands
+    if _commands is None:
+        _commands = frozenset(
+            "/" + command
+            for handler in dp.message.handlers
+            for handler_filter in handler.filters or ()
+            if isinstance(handler_filter.callback, Command)
+            for command in handler_filter.callback.commands
+            if isinstance(command, str)
+        )
+    return _commands
+
+def handler_label(event) -> str:
+    # Labels end up in metric series and bucket keys, so anything not routed
+    # to a handler collapses into "other" instead of echoing client input
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        if data in CALLBACK_LABELS:
+            return data
+        for prefix in CALLBACK_PREFIXES:
+            if data.startswith(prefix):
+                return prefix[:-1]
+        return "other"
+    text = event.text or ""
+    if text.startswith("/"):
+        command = text.split()[0].split("@")[0]
+        return command if command in registered_commands() else "other"
+    if text in MENU_BUTTONS:
+        return text
+    return "message"
+
+# Handlers that spend stars or write several rows per update get their own, tighter bucket
+THROTTLE_CLASSES = {
+    "/dice": "casino", "/slots": "casino", "/roulette": "casino",
+    "buy_farm": "purchase", "buy_nft": "purchase", "bid": "purchase",
+    "/collect": "purchase", "💰 Собрать доход": "purchase", "/activate": "purchase",
+}
+
+def throttle_class(event) -> Optional[str]:
+    label = handler_label(event)
+    if label == "message":
+        # Plain chat text has no handler, only the group member bookkeeping
+        return None
+    return THROTTLE_CLASSES.get(label, "callback" if isinstance(event, CallbackQuery) else "command")
+
 async def ban_check_middleware(handler, event, data):
     if isinstance(event, (Message, CallbackQuery)):
         if hasattr(event, 'from_user') and event.from_user:
@@ -55,6 +169,89 @@ async def ban_check_middleware(handler, event, data):
                 logger.error(f"Ошибка проверки бана для user_id {user_id}: {db_error}")
     return await handler(event, data)
 
+user_names = TTLCache(ttl=USER_NAME_CACHE_TTL, max_size=USER_NAME_CACHE_SIZE)
+
+async def user_names_middleware(handler, event, data):
+    if isinstance(event, (Message, CallbackQuery)) and event.from_user:
+        user = event.from_user
+        names = (user.username, user.full_name)
+        if user_names.get(user.id) != names:
+            try:
+                # Cached even when no row was touched: players without a users row (group members
+                # who never ran /start) would otherwise cost a write on every update
+                await update_user_names(user.id, *names)
+                user_names.set(user.id, names)
+            except Exception as db_error:
+                logger.error(f"Ошибка сохранения имени для user_id {user.id}: {db_error}")
+    return await handler(event, data)
+
+chat_members = TTLCache(ttl=USER_NAME_CACHE_TTL, max_size=CHAT_MEMBER_CACHE_SIZE)
+
+async def chat_members_middleware(handler, event, data):
+    if isinstance(event, Message) and event.chat.type in ("group", "supergroup"):
+        try:
+            if event.left_chat_member:
+                key = (event.chat.id, event.left_chat_member.id)
+                chat_members.pop(key)
+                await remove_chat_member(*key)
+            elif event.from_user and not event.from_user.is_bot:
+                key = (event.chat.id, event.from_user.id)
+                if chat_members.get(key) is None:
+                    await add_chat_member(*key)
+                    chat_members.set(key, True)
+        except Exception as db_error:
+            logger.error(f"Ошибка учета участника чата {event.chat.id}: {db_error}")
+    return await handler(event, data)
+
+def get_display_name(user: dict) -> str:
+    username, full_name = user_names.get(user['user_id']) or (user.get('username'), user.get('full_name'))
+    if username:
+        return f"@{username}"
+    return full_name or "Неизвестно"
+
+expiry_notifier = ExpiryNotifier(bot)
+leaderboards = Leaderboards()
+farm_sweeper = FarmSweeper()
+income_repricer = IncomeRepricer()
+
+stats = StatsBuffer()
+backup_manager = BackupManager()
+archiver = Archiver()
+maintenance = Maintenance()
+loop_monitor = LoopMonitor()
+
+def on_catalog_reload(old, new):
+    # Stored activation income and boost were computed from the old values, rewrite the affected ones
+    if old:
+        income_repricer.request(*new.income_changes(old))
+
+catalog.add_reload_listener(on_catalog_reload)
+
+update_recorder = None
+if RECORD_UPDATES_PATH:
+    salt = RECORD_UPDATES_SALT or load_salt(RECORD_UPDATES_SALT_PATH, RECORD_UPDATES_PATH)
+    update_recorder = UpdateRecorder(RECORD_UPDATES_PATH, salt, keep_texts=MENU_BUTTONS)
+    dp.update.outer_middleware(update_recorder)
+
+dp.update.outer_middleware(startup_profile.middleware)
+dp.update.outer_middleware(update_metrics_middleware)
+throttle = Throttle(throttle_class)
+callback_dedup = CallbackDedup(handler_label)
+user_locks = UserLocks()
+dp.callback_query.outer_middleware(callback_dedup)
+dp.message.outer_middleware(throttle)
+dp.callback_query.outer_middleware(throttle)
+dp.message.outer_middleware(user_locks.middleware)
+dp.callback_query.outer_middleware(user_locks.middleware)
+dp.message.outer_middleware(chat_members_middleware)
+dp.message.outer_middleware(stats.middleware)
+dp.callback_query.outer_middleware(stats.middleware)
+dp.message.middleware(handler_metrics_middleware(handler_label))
+dp.callback_query.middleware(handler_metrics_middleware(handler_label))
+dp.message.middleware(trace_middleware(handler_label))
+dp.callback_query.middleware(trace_middleware(handler_label))
+dp.message.middleware(user_names_middleware)
+dp.callback_query.middleware(user_names_middleware)
 dp.message.middleware(ban_check_middleware)
 dp.callback_query.middleware(ban_check_middleware)
 
@@ -73,7 +270,6 @@ async def cmd_start(message: Message):
                 if is_new_user:
                     await give_referral_reward(user_id)
                     try:
-                        from config import REFERRAL_REWARD
                         referrer_name = message.from_user.full_name or f"@{message.from_user.username}" if message.from_user.username else "Пользователь"
                         referrer_mention = f"@{message.from_user.username}" if message.from_user.username else referrer_name
                         notification = (
@@ -87,6 +283,9 @@ async def cmd_start(message: Message):
             pass
     
     user = await get_or_create_user(user_id)
+    if user.get('username') is None and user.get('full_name') is None:
+        # The name may have been cached before the row existed, store it with the new row
+        await update_user_names(user_id, message.from_user.username, message.from_user.full_name)
     
     welcome_text = (
         f"🌟 Добро пожаловать в {GAME_NAME}!\n\n"
@@ -96,7 +295,6 @@ async def cmd_start(message: Message):
     )
     
     if is_new_user:
-        from config import REFERRAL_REWARD
         welcome_text += f"🎉 Вы получили {REFERRAL_REWARD} ⭐ за регистрацию по реферальной ссылке!\n\n"
     
     welcome_text += "Используйте меню для навигации или команду /help для списка команд!"
@@ -119,7 +317,8 @@ async def cmd_help(message: Message):
         "🔹 /collect - Собрать доход с ферм\n"
         "🔹 /activate - Активировать фермы (каждые 6 часов)\n"
         "🔹 /referral - Получить реферальную ссылку\n"
-        "🔹 /auction - Показать активные аукционы\n\n"
+        "🔹 /auction - Показать активные аукционы\n"
+        "🔹 /top - Рейтинг игроков (в группе - рейтинг чата)\n\n"
         "💡 Важно:\n"
         "• Фермы нужно активировать каждые 6 часов\n"
         "• Только активированные фермы приносят доход\n"
@@ -140,6 +339,23 @@ async def cmd_profile(message: Message):
 async def show_profile(message: Message):
     await show_profile_handler(message)
 
+async def render_user_profile(user: dict) -> str:
+    user_id = user['user_id']
+    state = await get_income_state(user_id)
+    nfts = await get_user_nfts(user_id)
+    referrals = await get_referral_count(user_id)
+    
+    return (
+        f"👤 Профиль пользователя\n\n"
+        f"🆔 ID: {user['internal_id']}\n"
+        f"📱 Telegram: {get_display_name(user)} ({user_id})\n"
+        f"⭐ Звезд: {state['stars']}\n"
+        f"🌾 Ферм: {state['farm_count']} (активных: {state['active_farms']})\n"
+        f"🎁 NFT: {len(nfts)}\n"
+        f"⚡ Буст к доходу: {int((state['boost'] - 1) * 100)}%\n"
+        f"🔗 Рефералов: {referrals}\n"
+    )
+
 @dp.message(Command("profile_id"))
 async def cmd_profile_id(message: Message):
     if message.from_user.id not in ADMIN_IDS:
@@ -157,89 +373,34 @@ async def cmd_profile_id(message: Message):
             await message.reply(f"❌ Пользователь с ID {internal_id} не найден!")
             return
         
-        user_id = user['user_id']
-        stars = user['stars']
-        farms = await get_user_farms(user_id)
-        nfts = await get_user_nfts(user_id)
-        boost = await calculate_total_boost(user_id)
-        referrals = await get_referral_count(user_id)
-        
-        from datetime import datetime
-        active_farms = 0
-        for farm in farms:
-            is_active = farm.get('is_active', 0)
-            if is_active:
-                last_activated = farm.get('last_activated')
-                if last_activated:
-                    last_activated_dt = datetime.fromisoformat(last_activated)
-                    hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                    if hours_passed < 6:
-                        active_farms += 1
-        
-        try:
-            tg_user = await bot.get_chat(user_id)
-            username = f"@{tg_user.username}" if tg_user.username else tg_user.full_name or "Неизвестно"
-        except:
-            username = "Неизвестно"
-        
-        profile_text = (
-            f"👤 Профиль пользователя\n\n"
-            f"🆔 ID: {internal_id}\n"
-            f"📱 Telegram: {username} ({user_id})\n"
-            f"⭐ Звезд: {stars}\n"
-            f"🌾 Ферм: {len(farms)} (активных: {active_farms})\n"
-            f"🎁 NFT: {len(nfts)}\n"
-            f"⚡ Буст к доходу: {int((boost - 1) * 100)}%\n"
-            f"🔗 Рефералов: {referrals}\n"
-        )
-        
-        await message.reply(profile_text)
+        await message.reply(await render_user_profile(user))
     except ValueError:
         await message.reply("❌ Неверный формат! Используйте: /profile_id internal_id")
 
 async def show_profile_handler(message: Message):
     user_id = message.from_user.id
-    user = await get_or_create_user(user_id)
-    stars = user['stars']
-    
-    farms = await get_user_farms(user_id)
+    state = await get_income_state(user_id)
+    farm_summary = await get_user_farm_summary(user_id) if state['farm_count'] else []
     nfts = await get_user_nfts(user_id)
-    boost = await calculate_total_boost(user_id)
     referrals = await get_referral_count(user_id)
     
-    from datetime import datetime
-    active_farms = 0
-    for farm in farms:
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    active_farms += 1
-    
-    internal_id = user.get('internal_id', 'N/A')
+    internal_id = state.get('internal_id', 'N/A')
     profile_text = (
         f"👤 Ваш профиль\n\n"
         f"🆔 ID: {internal_id}\n"
-        f"⭐ Звезд: {stars}\n"
-        f"🌾 Ферм: {len(farms)} (активных: {active_farms})\n"
+        f"⭐ Звезд: {state['stars']}\n"
+        f"🌾 Ферм: {state['farm_count']} (активных: {state['active_farms']})\n"
         f"🎁 NFT: {len(nfts)}\n"
-        f"⚡ Буст к доходу: {int((boost - 1) * 100)}%\n"
+        f"⚡ Буст к доходу: {int((state['boost'] - 1) * 100)}%\n"
         f"🔗 Рефералов: {referrals}\n\n"
     )
     
-    if farms:
+    if farm_summary:
         profile_text += "Ваши фермы:\n"
-        farm_counts = {}
-        for farm in farms:
-            farm_type = farm['farm_type']
-            farm_counts[farm_type] = farm_counts.get(farm_type, 0) + 1
-        
-        for farm_type, count in farm_counts.items():
-            if farm_type in FARM_TYPES:
-                profile_text += f"  {FARM_TYPES[farm_type]['name']}: {count} шт.\n"
+        for row in farm_summary:
+            farm = catalog.current().farm(row['farm_type'])
+            if farm:
+                profile_text += f"  {farm.name}: {row['total']} шт.\n"
     
     if nfts:
         profile_text += "\nВаши NFT:\n"
@@ -249,8 +410,9 @@ async def show_profile_handler(message: Message):
             nft_counts[nft_type] = nft_counts.get(nft_type, 0) + 1
         
         for nft_type, count in nft_counts.items():
-            if nft_type in NFT_GIFTS:
-                profile_text += f"  {NFT_GIFTS[nft_type]['name']}: {count} шт.\n"
+            nft = catalog.current().nft(nft_type)
+            if nft:
+                profile_text += f"  {nft.name}: {count} шт.\n"
     
     if message.chat.type == "private":
         await message.answer(profile_text)
@@ -267,9 +429,9 @@ async def show_farms(message: Message):
 
 async def show_farms_handler(message: Message):
     user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
+    state = await get_income_state(user_id)
     
-    if not farms:
+    if not state['farm_count']:
         response = "У вас пока нет ферм. Купите их в магазине! 🛒"
         if message.chat.type == "private":
             await message.answer(response)
@@ -277,56 +439,29 @@ async def show_farms_handler(message: Message):
             await message.reply(response)
         return
     
-    from datetime import datetime
-    farm_counts = {}
-    active_count = 0
-    inactive_count = 0
-    
-    for farm in farms:
-        farm_type = farm['farm_type']
-        farm_counts[farm_type] = farm_counts.get(farm_type, {'total': 0, 'active': 0})
-        farm_counts[farm_type]['total'] += 1
-        
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    farm_counts[farm_type]['active'] += 1
-                    active_count += 1
-                else:
-                    inactive_count += 1
-            else:
-                inactive_count += 1
-        else:
-            inactive_count += 1
+    farm_summary = await get_user_farm_summary(user_id)
     
     farms_text = "🌾 Ваши фермы:\n\n"
-    total_income = 0
-    total_active_income = 0
-    
-    for farm_type, data in farm_counts.items():
-        if farm_type in FARM_TYPES:
-            farm_data = FARM_TYPES[farm_type]
-            total = data['total']
-            active = data['active']
-            inactive = total - active
+    
+    for row in farm_summary:
+        farm = catalog.current().farm(row['farm_type'])
+        if farm:
+            total = row['total']
+            active = row['active']
             
-            income = farm_data['income_per_hour'] * active
-            total_active_income += income
-            total_income += farm_data['income_per_hour'] * total
+            income = farm.income_per_hour * active
             
-            income_per_min = round(income / 60, 2)
+            income_per_min = round(farm.income_per_min * active, 2)
             status = "✅" if active > 0 else "❌"
-            farms_text += f"{status} {farm_data['name']}: {total} шт. (активных: {active})\n"
+            farms_text += f"{status} {farm.name}: {total} шт. (активных: {active})\n"
             if active > 0:
                 farms_text += f"  Доход: {income_per_min} ⭐/мин | {income} ⭐/час\n\n"
             else:
                 farms_text += f"  ⚠️ Требуется активация (/activate)\n\n"
     
-    boost = await calculate_total_boost(user_id)
+    total_active_income = state['income_rate']
+    inactive_count = state['farm_count'] - state['active_farms']
+    boost = state['boost']
     if boost > 1.0:
         total_income_boosted = int(total_active_income * boost)
         total_income_boosted_per_min = round(total_income_boosted / 60, 2)
@@ -390,9 +525,9 @@ async def show_nft_shop_handler(message: Message):
 @dp.message(Command("activate"))
 async def cmd_activate(message: Message):
     user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
+    activated, total, expires_at = await activate_farms(user_id)
     
-    if not farms:
+    if not total:
         response = "У вас нет ферм для активации! Купите фермы в магазине. 🛒"
         if message.chat.type == "private":
             await message.answer(response)
@@ -400,31 +535,20 @@ async def cmd_activate(message: Message):
             await message.reply(response)
         return
     
-    activated, total = await activate_farms(user_id)
-    
     if activated > 0:
+        expiry_notifier.schedule(user_id, expires_at)
         response = (
             f"✅ Активировано ферм: {activated} из {total}\n\n"
             f"🌾 Ваши фермы активны на следующие 6 часов!\n"
             f"💡 Не забудьте собрать доход командой /collect"
         )
     else:
-        from datetime import datetime
-        can_activate_soon = False
-        min_hours_left = 6
-        for farm in farms:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                hours_left = 6 - hours_passed
-                if hours_left > 0:
-                    min_hours_left = min(min_hours_left, hours_left)
-                    can_activate_soon = True
+        state = await get_income_state(user_id)
         
-        if can_activate_soon:
-            hours = int(min_hours_left)
-            minutes = int((min_hours_left - hours) * 60)
+        if state['next_expiry']:
+            hours_left = (datetime.fromisoformat(state['next_expiry']) - datetime.now()).total_seconds() / 3600
+            hours = int(hours_left)
+            minutes = int((hours_left - hours) * 60)
             response = (
                 f"⏰ Все фермы уже активированы!\n\n"
                 f"🔄 Следующая активация через: {hours}ч {minutes}м"
@@ -440,6 +564,54 @@ async def cmd_activate(message: Message):
     else:
         await message.reply(response)
 
+TOP_FIELDS = {
+    "stars": ("stars", "⭐ Топ по звездам", "⭐"),
+    "income": ("boosted_income", "🌾 Топ по доходу", "⭐/час"),
+}
+
+async def render_top(user_id: int, scope: str, key: str, chat_id: int) -> str:
+    field, title, unit = TOP_FIELDS[key]
+    rank_chat_id = chat_id if scope == "chat" else None
+    rows = [row for row in await leaderboards.top(field, rank_chat_id) if row['value'] > 0]
+    
+    text = f"{title}{' чата' if scope == 'chat' else ''}\n\n"
+    if not rows:
+        text += "Пока никого нет в рейтинге.\n"
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    for position, row in enumerate(rows, 1):
+        name = get_display_name(row) if row.get('username') or row.get('full_name') else f"Игрок #{row.get('internal_id')}"
+        text += f"{medals.get(position, f'{position}.')} {name} — {int(row['value'])} {unit}\n"
+    
+    rank = await leaderboards.rank(field, user_id, rank_chat_id)
+    if rank:
+        text += f"\n📍 Ваше место: {rank[0]} ({int(rank[1])} {unit})"
+    return text
+
+@dp.message(Command("top"))
+async def cmd_top(message: Message):
+    scope = "global" if message.chat.type == "private" else "chat"
+    text = await render_top(message.from_user.id, scope, "stars", message.chat.id)
+    keyboard = get_top_keyboard(scope, "stars")
+    
+    if message.chat.type == "private":
+        await message.answer(text, reply_markup=keyboard)
+    else:
+        await message.reply(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("top_"))
+async def handle_top(callback: CallbackQuery):
+    _, scope, key = callback.data.split("_")
+    if scope not in ("global", "chat") or key not in TOP_FIELDS:
+        await callback.answer()
+        return
+    
+    text = await render_top(callback.from_user.id, scope, key, callback.message.chat.id)
+    await callback.answer()
+    try:
+        await callback.message.edit_text(text, reply_markup=get_top_keyboard(scope, key))
+    except Exception:
+        pass
+
 @dp.message(Command("collect"))
 async def cmd_collect(message: Message):
     await collect_income_handler(message)
@@ -450,9 +622,9 @@ async def collect_income(message: Message):
 
 async def collect_income_handler(message: Message):
     user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
+    state = await get_income_state(user_id)
     
-    if not farms:
+    if not state['farm_count']:
         response = "У вас нет ферм для сбора дохода! Купите фермы в магазине. 🛒"
         if message.chat.type == "private":
             await message.answer(response)
@@ -461,24 +633,10 @@ async def collect_income_handler(message: Message):
         return
     
     income = await collect_farm_income(user_id)
-    stars = await get_user_stars(user_id)
-    boost = await calculate_total_boost(user_id)
-    
-    from datetime import datetime
-    total_income_per_hour = 0
-    active_farms_count = 0
-    for farm in farms:
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    farm_type = farm['farm_type']
-                    if farm_type in FARM_TYPES:
-                        total_income_per_hour += FARM_TYPES[farm_type]['income_per_hour']
-                        active_farms_count += 1
+    stars = state['stars'] + income
+    boost = state['boost']
+    total_income_per_hour = state['income_rate']
+    active_farms_count = state['active_farms']
     
     total_income_per_hour_boosted = int(total_income_per_hour * boost)
     total_income_per_min_boosted = round(total_income_per_hour_boosted / 60, 2)
@@ -523,86 +681,70 @@ async def collect_income_handler(message: Message):
 
 @dp.callback_query(F.data.startswith("buy_farm_"))
 async def handle_buy_farm(callback: CallbackQuery):
-    farm_id = callback.data.split("_")[2]
+    farm_id = callback.data[len("buy_farm_"):]
+    farm = catalog.current().farm(farm_id)
     
-    if farm_id not in FARM_TYPES:
+    if not farm:
         await callback.answer("Ошибка: неверный тип фермы", show_alert=True)
         return
     
     user_id = callback.from_user.id
-    farm_data = FARM_TYPES[farm_id]
     
     success = await buy_farm(user_id, farm_id)
     
     if success:
         stars = await get_user_stars(user_id)
         await callback.answer(
-            f"✅ Вы купили {farm_data['name']}!",
+            f"✅ Вы купили {farm.name}!",
             show_alert=True
         )
         
-        shop_text = f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {stars}\n\n"
-        shop_text += f"✅ Вы купили {farm_data['name']}!\n\n"
-        
-        for farm_id_item, farm_data_item in FARM_TYPES.items():
-            income_per_min = round(farm_data_item['income_per_hour'] / 60, 2)
-            shop_text += (
-                f"{farm_data_item['name']}\n"
-                f"💰 Цена: {farm_data_item['price']} ⭐\n"
-                f"📈 Доход: {income_per_min} ⭐/мин | {farm_data_item['income_per_hour']} ⭐/час\n\n"
-            )
+        shop_text = (
+            f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {stars}\n\n"
+            f"✅ Вы купили {farm.name}!\n\n"
+        ) + get_farm_catalog_text()
         
         await callback.message.edit_text(shop_text, reply_markup=get_farm_shop_keyboard())
     else:
         stars = await get_user_stars(user_id)
         await callback.answer(
-            f"❌ Недостаточно звезд! Нужно {farm_data['price']}, у вас {stars}",
+            f"❌ Недостаточно звезд! Нужно {farm.price}, у вас {stars}",
             show_alert=True
         )
 
 @dp.callback_query(F.data.startswith("buy_nft_"))
 async def handle_buy_nft(callback: CallbackQuery):
-    nft_id = callback.data.split("_")[2]
+    nft_id = callback.data[len("buy_nft_"):]
+    nft = catalog.current().nft(nft_id)
     
-    if nft_id not in NFT_GIFTS:
+    if not nft:
         await callback.answer("Ошибка: неверный тип NFT", show_alert=True)
         return
     
     user_id = callback.from_user.id
-    nft_data = NFT_GIFTS[nft_id]
     
     success = await buy_nft(user_id, nft_id)
     
     if success:
         stars = await get_user_stars(user_id)
         boost = await calculate_total_boost(user_id)
-        boost_text = f"+{int((nft_data['boost'] - 1) * 100)}%"
-        
         await callback.answer(
-            f"✅ Вы купили {nft_data['name']}! Буст: {boost_text}",
+            f"✅ Вы купили {nft.name}! Буст: +{nft.boost_percent}%",
             show_alert=True
         )
         
         shop_text = (
             f"🎁 Магазин NFT подарков\n\n"
             f"⭐ Ваши звезды: {stars}\n\n"
-            f"✅ Вы купили {nft_data['name']}!\n"
+            f"✅ Вы купили {nft.name}!\n"
             f"⚡ Общий буст: {int((boost - 1) * 100)}%\n\n"
-        )
-        
-        for nft_id_item, nft_data_item in NFT_GIFTS.items():
-            boost_item_text = f"+{int((nft_data_item['boost'] - 1) * 100)}%"
-            shop_text += (
-                f"{nft_data_item['name']}\n"
-                f"💰 Цена: {nft_data_item['price']} ⭐\n"
-                f"⚡ Буст: {boost_item_text}\n\n"
-            )
+        ) + get_nft_catalog_text()
         
         await callback.message.edit_text(shop_text, reply_markup=get_nft_shop_keyboard())
     else:
         stars = await get_user_stars(user_id)
         await callback.answer(
-            f"❌ Недостаточно звезд! Нужно {nft_data['price']}, у вас {stars}",
+            f"❌ Недостаточно звезд! Нужно {nft.price}, у вас {stars}",
             show_alert=True
         )
 
@@ -618,8 +760,7 @@ async def show_referral_link_handler(message: Message):
     user_id = message.from_user.id
     referrals = await get_referral_count(user_id)
     
-    from config import REFERRAL_REWARD
-    bot_username = (await bot.get_me()).username
+    bot_username = (await bot.me()).username
     referral_link = f"https://t.me/{bot_username}?start={user_id}"
     
     referral_text = (
@@ -646,7 +787,6 @@ async def show_auctions(message: Message):
 async def show_auctions_handler(message: Message):
     user_id = message.from_user.id
     
-    from datetime import datetime
     active_auctions = await get_active_auctions()
     for auction in active_auctions:
         end_time = datetime.fromisoformat(auction['end_time'])
@@ -656,14 +796,10 @@ async def show_auctions_handler(message: Message):
     auctions = await get_active_auctions()
     
     if not auctions:
-        from random import choice
-        
-        farm_types = list(FARM_TYPES.keys())[-4:]
+        top_farms = catalog.current().farms[-4:]
         for i in range(3):
-            farm_type = choice(farm_types)
-            farm_data = FARM_TYPES[farm_type]
-            starting_price = farm_data['price'] // 2
-            await create_auction(farm_type, starting_price, 24)
+            farm = random.choice(top_farms)
+            await create_auction(farm.id, farm.price // 2, 24)
         
         auctions = await get_active_auctions()
     
@@ -675,29 +811,26 @@ async def show_auctions_handler(message: Message):
             await message.reply(response)
         return
     
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
     auctions_text = "🔨 Активные аукционы:\n\n"
     keyboard_buttons = []
     
     for auction in auctions:
-        farm_type = auction['farm_type']
-        if farm_type in FARM_TYPES:
-            farm_data = FARM_TYPES[farm_type]
+        farm = catalog.current().farm(auction['farm_type'])
+        if farm:
             end_time = datetime.fromisoformat(auction['end_time'])
             time_left = end_time - datetime.now()
             hours_left = int(time_left.total_seconds() / 3600)
             minutes_left = int((time_left.total_seconds() % 3600) / 60)
             
             auctions_text += (
-                f"{farm_data['name']}\n"
+                f"{farm.name}\n"
                 f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
                 f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
             )
             
             keyboard_buttons.append([
                 InlineKeyboardButton(
-                    text=f"{farm_data['name']} - {auction['current_bid']} ⭐",
+                    text=f"{farm.name} - {auction['current_bid']} ⭐",
                     callback_data=f"auction_{auction['id']}"
                 )
             ])
@@ -721,17 +854,15 @@ async def handle_auction_select(callback: CallbackQuery):
         await callback.answer("Аукцион не найден или уже завершен", show_alert=True)
         return
     
-    from datetime import datetime
-    farm_type = auction['farm_type']
-    if farm_type in FARM_TYPES:
-        farm_data = FARM_TYPES[farm_type]
+    farm = catalog.current().farm(auction['farm_type'])
+    if farm:
         end_time = datetime.fromisoformat(auction['end_time'])
         time_left = end_time - datetime.now()
         hours_left = int(time_left.total_seconds() / 3600)
         minutes_left = int((time_left.total_seconds() % 3600) / 60)
         
         auction_text = (
-            f"🔨 Аукцион: {farm_data['name']}\n\n"
+            f"🔨 Аукцион: {farm.name}\n\n"
             f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
             f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
             f"Выберите размер ставки:"
@@ -752,17 +883,15 @@ async def handle_bid(callback: CallbackQuery):
         auctions = await get_active_auctions()
         auction = next((a for a in auctions if a['id'] == auction_id), None)
         if auction:
-            from datetime import datetime
-            farm_type = auction['farm_type']
-            if farm_type in FARM_TYPES:
-                farm_data = FARM_TYPES[farm_type]
+            farm = catalog.current().farm(auction['farm_type'])
+            if farm:
                 end_time = datetime.fromisoformat(auction['end_time'])
                 time_left = end_time - datetime.now()
                 hours_left = int(time_left.total_seconds() / 3600)
                 minutes_left = int((time_left.total_seconds() % 3600) / 60)
                 
                 auction_text = (
-                    f"🔨 Аукцион: {farm_data['name']}\n\n"
+                    f"🔨 Аукцион: {farm.name}\n\n"
                     f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
                     f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
                     f"✅ Ваша ставка принята!\n\n"
@@ -808,19 +937,33 @@ async def cmd_ahelp(message: Message):
             "  Пример: /give_stars 1 1000\n\n"
             "• /give_farm farm_id internal_id - Выдать ферму пользователю\n"
             "  Пример: /give_farm starter 1\n"
-            "  Доступные типы: starter, basic, advanced, premium, elite, legendary, mythic, ultimate, quantum, cosmic, divine, infinity\n\n"
+            f"  Доступные типы: {', '.join(farm.id for farm in catalog.current().farms)}\n\n"
             "• /give_nft nft_id internal_id - Выдать NFT пользователю\n"
             "  Пример: /give_nft snoop_dogg 1\n"
-            "  Доступные NFT: snoop_dogg, lunar_snake, crystal_ball, golden_coin, diamond_ring, magic_lamp, fire_dragon, cosmic_star, golden_crown, mystic_orb\n\n"
+            f"  Доступные NFT: {', '.join(nft.id for nft in catalog.current().nfts)}\n\n"
             "🚫 Управление пользователями:\n"
             "• /ban internal_id [причина] - Забанить пользователя\n"
             "  Пример: /ban 1 Нарушение правил\n"
             "  Пример: /ban 1 (без причины)\n\n"
             "• /unban internal_id - Разбанить пользователя\n"
             "  Пример: /unban 1\n\n"
+            "📦 Массовые операции (вместо одного ID):\n"
+            "• Диапазон и список: 1-1000,2000,2005\n"
+            "• Все игроки: all\n"
+            "• По балансу: stars>1000 или stars<100\n"
+            "  Пример: /give_stars 1-1000 500\n"
+            "  Пример: /give_farm starter stars<100\n\n"
             "👤 Просмотр профиля:\n"
             "• /profile_id internal_id - Показать профиль пользователя\n"
             "  Пример: /profile_id 1\n\n"
+            "• /find запрос - Найти пользователя по имени, @username, Telegram ID или ID\n"
+            "  Пример: /find @player\n\n"
+            "💾 Бэкап:\n"
+            "• /backup - Снять снимок базы без остановки бота\n\n"
+            "📦 Каталог:\n"
+            "• /reload_catalog - Перечитать каталог ферм и NFT без перезапуска\n\n"
+            "🗄 Архив:\n"
+            "• /archive [internal_id] - Сводка архива или архивная история игрока\n\n"
             "📢 Рассылка:\n"
             "• /broadcast - Рассылка всем пользователям и чатам\n"
             "  Использование: Ответьте на сообщение командой /broadcast\n"
@@ -851,16 +994,30 @@ async def admin_help_callback(callback: CallbackQuery):
         "  Пример: /give_stars 123456789 1000\n\n"
         "• /give_farm farm_id user_id - Выдать ферму пользователю\n"
         "  Пример: /give_farm starter 123456789\n"
-        "  Доступные типы: starter, basic, advanced, premium, elite, legendary, mythic, ultimate, quantum, cosmic, divine, infinity\n\n"
+        f"  Доступные типы: {', '.join(farm.id for farm in catalog.current().farms)}\n\n"
         "• /give_nft nft_id user_id - Выдать NFT пользователю\n"
         "  Пример: /give_nft snoop_dogg 123456789\n"
-        "  Доступные NFT: snoop_dogg, lunar_snake, crystal_ball, golden_coin, diamond_ring, magic_lamp, fire_dragon, cosmic_star, golden_crown, mystic_orb\n\n"
+        f"  Доступные NFT: {', '.join(nft.id for nft in catalog.current().nfts)}\n\n"
         "🚫 Управление пользователями:\n"
         "• /ban user_id [причина] - Забанить пользователя\n"
         "  Пример: /ban 123456789 Нарушение правил\n"
         "  Пример: /ban 123456789 (без причины)\n\n"
         "• /unban user_id - Разбанить пользователя\n"
         "  Пример: /unban 123456789\n\n"
+        "📦 Массовые операции (вместо одного ID):\n"
+        "• Диапазон и список: 1-1000,2000,2005\n"
+        "• Все игроки: all\n"
+        "• По балансу: stars>1000 или stars<100\n"
+        "  Пример: /give_stars 1-1000 500\n"
+        "  Пример: /give_farm starter stars<100\n\n"
+        "• /find запрос - Найти пользователя по имени, @username, Telegram ID или ID\n"
+        "  Пример: /find @player\n\n"
+        "💾 Бэкап:\n"
+        "• /backup - Снять снимок базы без остановки бота\n\n"
+        "📦 Каталог:\n"
+        "• /reload_catalog - Перечитать каталог ферм и NFT без перезапуска\n\n"
+        "🗄 Архив:\n"
+        "• /archive [internal_id] - Сводка архива или архивная история игрока\n\n"
         "📢 Рассылка:\n"
         "• /broadcast - Рассылка всем пользователям и чатам\n"
         "  Использование: Ответьте на сообщение командой /broadcast\n"
@@ -879,6 +1036,149 @@ async def admin_back(callback: CallbackQuery):
         return
     await callback.message.edit_text("🔐 Админ панель\n\nВыберите действие:", reply_markup=get_admin_menu())
 
+admin_searches = TTLCache(ttl=USER_NAME_CACHE_TTL, max_size=len(ADMIN_IDS) or 1)
+SEARCH_PAGE_SIZE = 8
+
+async def render_search_page(query: str, page: int):
+    rows = await search_users(query, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE)
+    has_next = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    
+    if not rows:
+        text = f"🔍 По запросу «{query}» ничего не найдено"
+    else:
+        text = f"🔍 Результаты по запросу «{query}» (стр. {page + 1})"
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"#{row['internal_id']} {get_display_name(row)} — {row['stars']} ⭐",
+            callback_data=f"admin_user_{row['user_id']}"
+        )]
+        for row in rows
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text="⬅️", callback_data=f"find_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="➡️", callback_data=f"find_page_{page + 1}"))
+    if navigation:
+        buttons.append(navigation)
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@dp.callback_query(F.data == "admin_users")
+async def admin_users_handler(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "👤 Управление пользователями\n\n"
+        "Найдите пользователя по имени, @username, Telegram ID или ID:\n"
+        "<code>/find запрос</code>",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
+        ])
+    )
+
+@dp.message(Command("find"))
+async def cmd_find(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2:
+        await message.reply("Использование: /find запрос\nПример: /find @player")
+        return
+    
+    query = args[1].strip()
+    admin_searches.set(message.from_user.id, (query, 0))
+    text, keyboard = await render_search_page(query, 0)
+    await message.reply(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("find_page_"))
+async def find_page_handler(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    search = admin_searches.get(callback.from_user.id)
+    if not search:
+        await callback.answer("Поиск устарел, повторите /find", show_alert=True)
+        return
+    
+    page = int(callback.data.split("_")[2])
+    admin_searches.set(callback.from_user.id, (search[0], page))
+    text, keyboard = await render_search_page(search[0], page)
+    await callback.answer()
+    await callback.message.edit_text(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("admin_user_"))
+async def admin_user_handler(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    user_id = int(callback.data.split("_")[2])
+    user = (await get_users_brief([user_id])).get(user_id)
+    if not user:
+        await callback.answer("❌ Пользователь не найден!", show_alert=True)
+        return
+    
+    search = admin_searches.get(callback.from_user.id)
+    back = f"find_page_{search[1]}" if search else "admin_users"
+    await callback.answer()
+    await callback.message.edit_text(await render_user_profile(user), reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔙 Назад", callback_data=back)]
+    ]))
+
+@dp.callback_query(F.data == "admin_stats")
+async def admin_stats_handler(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    snapshot = await stats.snapshot(days=7)
+    totals = snapshot['totals']
+    daily = snapshot['daily']
+    today = daily.get(date.today().isoformat(), {})
+    yesterday = daily.get((date.today() - timedelta(days=1)).isoformat(), {})
+    week = {}
+    for values in daily.values():
+        for key, value in values.items():
+            week[key] = week.get(key, 0) + value
+    
+    farms = sorted(((key[6:], value) for key, value in totals.items() if key.startswith("farms:") and value), key=lambda item: -item[1])
+    nfts = sorted(((key[5:], value) for key, value in totals.items() if key.startswith("nfts:") and value), key=lambda item: -item[1])
+    casino_today = today.get('casino_bets', 0) - today.get('casino_payouts', 0)
+    casino_week = week.get('casino_bets', 0) - week.get('casino_payouts', 0)
+    
+    stats_text = (
+        "📊 Статистика\n\n"
+        f"👥 Игроков: {totals.get('users', 0)} (+{today.get('new_users', 0)} сегодня)\n"
+        f"🟢 Активны сегодня: {today.get('dau', 0)}, вчера: {yesterday.get('dau', 0)}\n"
+        f"⭐ Звезд в обороте: {totals.get('stars', 0)}\n\n"
+        f"🌾 Ферм: {sum(value for _, value in farms)}\n"
+    )
+    for farm_type, value in farms:
+        farm = catalog.current().farm(farm_type)
+        stats_text += f"  {farm.name if farm else farm_type}: {value}\n"
+    stats_text += f"\n🎁 NFT: {sum(value for _, value in nfts)}\n"
+    for nft_type, value in nfts:
+        nft = catalog.current().nft(nft_type)
+        stats_text += f"  {nft.name if nft else nft_type}: {value}\n"
+    stats_text += (
+        f"\n🔨 Аукционы сегодня: {today.get('auctions_sold', 0)} продано на {today.get('auction_volume', 0)} ⭐\n"
+        f"🔨 За 7 дней: {week.get('auctions_sold', 0)} продано на {week.get('auction_volume', 0)} ⭐\n\n"
+        f"🎰 Казино сегодня: ставок {today.get('casino_bets', 0)} ⭐, выплат {today.get('casino_payouts', 0)} ⭐, итог {casino_today:+} ⭐\n"
+        f"🎰 За 7 дней: итог {casino_week:+} ⭐"
+    )
+    
+    await callback.answer()
+    await callback.message.edit_text(stats_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
+    ]))
+
 @dp.callback_query(F.data == "admin_give_stars")
 async def admin_give_stars_handler(callback: CallbackQuery):
     if callback.from_user.id not in ADMIN_IDS:
@@ -894,6 +1194,21 @@ async def admin_give_stars_handler(callback: CallbackQuery):
         ])
     )
 
+async def run_admin_bulk(message: Message, spec: TargetSpec, title: str, operation, exclude=()):
+    status = await message.reply(f"⏳ {title}\n\nЦель: {spec.description}")
+    started = time.perf_counter()
+    try:
+        done = await run_bulk(spec, operation, ProgressMessage(status, title), exclude=exclude)
+    except Exception as e:
+        logger.error(f"Ошибка массовой операции '{title}' ({spec.description}): {e}")
+        await status.edit_text(f"❌ {title}: ошибка, часть изменений могла быть применена\n\n{e}")
+        return
+    await status.edit_text(
+        f"✅ {title}\n\n"
+        f"Цель: {spec.description}\n"
+        f"Обработано пользователей: {done} за {time.perf_counter() - started:.1f} с"
+    )
+
 @dp.message(Command("give_stars"))
 async def cmd_give_stars(message: Message):
     if message.from_user.id not in ADMIN_IDS:
@@ -905,6 +1220,12 @@ async def cmd_give_stars(message: Message):
         return
     
     try:
+        spec = TargetSpec.parse(args[1])
+        if spec and not spec.is_single:
+            amount = int(args[2])
+            await run_admin_bulk(message, spec, f"Выдача {amount} ⭐", lambda user_ids: bulk_add_stars(user_ids, amount))
+            return
+        
         internal_id = int(args[1])
         amount = int(args[2])
         user = await get_user_by_internal_id(internal_id)
@@ -934,10 +1255,14 @@ async def admin_give_farm_select(callback: CallbackQuery):
         await callback.answer("❌ Нет доступа!", show_alert=True)
         return
     
-    farm_id = callback.data.split("_")[2]
+    farm = catalog.current().farm(callback.data[len("admin_farm_"):])
+    if not farm:
+        await callback.answer("Ошибка: неверный тип фермы", show_alert=True)
+        return
+    farm_id = farm.id
     await callback.message.edit_text(
         f"🌾 Выдача фермы\n\n"
-        f"Тип: {FARM_TYPES[farm_id]['name']}\n\n"
+        f"Тип: {farm.name}\n\n"
         f"Отправьте ID пользователя:\n"
         f"<code>/give_farm {farm_id} user_id</code>",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -957,17 +1282,26 @@ async def cmd_give_farm(message: Message):
     
     try:
         farm_id = args[1]
+        farm = catalog.current().farm(farm_id)
+        spec = TargetSpec.parse(args[2])
+        if spec and not spec.is_single:
+            if not farm:
+                await message.reply("❌ Неверный тип фермы!")
+                return
+            await run_admin_bulk(message, spec, f"Выдача {farm.name}", lambda user_ids: bulk_add_farm(user_ids, farm_id))
+            return
+        
         internal_id = int(args[2])
         user = await get_user_by_internal_id(internal_id)
         if not user:
             await message.reply(f"❌ Пользователь с ID {internal_id} не найден!")
             return
         user_id = user['user_id']
-        if farm_id not in FARM_TYPES:
+        if not farm:
             await message.reply("❌ Неверный тип фермы!")
             return
         await admin_add_farm(user_id, farm_id)
-        await message.reply(f"✅ Пользователю ID {internal_id} (TG: {user_id}) выдана {FARM_TYPES[farm_id]['name']}")
+        await message.reply(f"✅ Пользователю ID {internal_id} (TG: {user_id}) выдана {farm.name}")
     except ValueError:
         await message.reply("❌ Неверный формат! Используйте: /give_farm farm_id internal_id")
 
@@ -988,10 +1322,14 @@ async def admin_give_nft_select(callback: CallbackQuery):
         await callback.answer("❌ Нет доступа!", show_alert=True)
         return
     
-    nft_id = callback.data.split("_")[2]
+    nft = catalog.current().nft(callback.data[len("admin_nft_"):])
+    if not nft:
+        await callback.answer("Ошибка: неверный тип NFT", show_alert=True)
+        return
+    nft_id = nft.id
     await callback.message.edit_text(
         f"🎁 Выдача NFT\n\n"
-        f"Тип: {NFT_GIFTS[nft_id]['name']}\n\n"
+        f"Тип: {nft.name}\n\n"
         f"Отправьте ID пользователя:\n"
         f"<code>/give_nft {nft_id} user_id</code>",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -1011,17 +1349,26 @@ async def cmd_give_nft(message: Message):
     
     try:
         nft_id = args[1]
+        nft = catalog.current().nft(nft_id)
+        spec = TargetSpec.parse(args[2])
+        if spec and not spec.is_single:
+            if not nft:
+                await message.reply("❌ Неверный тип NFT!")
+                return
+            await run_admin_bulk(message, spec, f"Выдача {nft.name}", lambda user_ids: bulk_add_nft(user_ids, nft_id))
+            return
+        
         internal_id = int(args[2])
         user = await get_user_by_internal_id(internal_id)
         if not user:
             await message.reply(f"❌ Пользователь с ID {internal_id} не найден!")
             return
         user_id = user['user_id']
-        if nft_id not in NFT_GIFTS:
+        if not nft:
             await message.reply("❌ Неверный тип NFT!")
             return
         await admin_add_nft(user_id, nft_id)
-        await message.reply(f"✅ Пользователю ID {internal_id} (TG: {user_id}) выдано {NFT_GIFTS[nft_id]['name']}")
+        await message.reply(f"✅ Пользователю ID {internal_id} (TG: {user_id}) выдано {nft.name}")
     except ValueError:
         await message.reply("❌ Неверный формат! Используйте: /give_nft nft_id internal_id")
 
@@ -1036,8 +1383,14 @@ async def cmd_ban(message: Message):
         return
     
     try:
-        internal_id = int(args[1])
         reason = args[2] if len(args) > 2 else "Нарушение правил"
+        spec = TargetSpec.parse(args[1])
+        if spec and not spec.is_single:
+            admin_id = message.from_user.id
+            await run_admin_bulk(message, spec, "Бан", lambda user_ids: bulk_ban(user_ids, reason, admin_id), exclude=ADMIN_IDS)
+            return
+        
+        internal_id = int(args[1])
         user = await get_user_by_internal_id(internal_id)
         if not user:
             await message.reply(f"❌ Пользователь с ID {internal_id} не найден!")
@@ -1059,6 +1412,11 @@ async def cmd_unban(message: Message):
         return
     
     try:
+        spec = TargetSpec.parse(args[1])
+        if spec and not spec.is_single:
+            await run_admin_bulk(message, spec, "Разбан", bulk_unban)
+            return
+        
         internal_id = int(args[1])
         user = await get_user_by_internal_id(internal_id)
         if not user:
@@ -1070,6 +1428,92 @@ async def cmd_unban(message: Message):
     except ValueError:
         await message.reply("❌ Неверный формат! Используйте: /unban internal_id")
 
+@dp.message(Command("backup"))
+async def cmd_backup(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    status = await message.reply("⏳ Создаю бэкап базы...")
+    try:
+        result = await backup_manager.snapshot()
+    except Exception as e:
+        logger.error(f"Ошибка бэкапа по команде: {e}")
+        await status.edit_text(f"❌ Ошибка бэкапа: {e}")
+        return
+    
+    await status.edit_text(
+        f"✅ Бэкап создан\n\n"
+        f"📁 {os.path.basename(result['path'])}\n"
+        f"📦 Размер: {result['size'] / 1024 / 1024:.1f} МБ\n"
+        f"⏱ Время: {result['duration']:.1f} с (шагов: {result['steps']}, перезапусков: {result['restarts']})\n"
+        f"🩺 Проверка целостности: ok\n"
+        f"🗑 Удалено старых снимков: {result['removed']}"
+    )
+
+@dp.message(Command("reload_catalog"))
+async def cmd_reload_catalog(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    try:
+        new = catalog.reload()
+    except (CatalogError, OSError) as e:
+        await message.reply(f"❌ Каталог не перезагружен, остается прежний: {e}")
+        return
+    
+    await message.reply(f"✅ Каталог перезагружен: ферм {len(new.farms)}, NFT {len(new.nfts)}")
+
+ARCHIVE_LABELS = {
+    "auctions": "🔨 Аукционы",
+    "farm_activations": "🌾 Активации ферм",
+    "daily_active": "📅 Дни активности",
+}
+
+@dp.message(Command("archive"))
+async def cmd_archive(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    if len(args) < 2:
+        summary = await get_archive_summary()
+        text = "🗄 Архив\n\n"
+        for table, info in summary.items():
+            text += f"{ARCHIVE_LABELS.get(table, table)}: {info['rows']}"
+            if info['last']:
+                text += f" (последний перенос {info['last'][:16].replace('T', ' ')})"
+            text += "\n"
+        text += "\nИстория игрока: /archive internal_id"
+        await message.reply(text)
+        return
+    
+    try:
+        internal_id = int(args[1])
+    except ValueError:
+        await message.reply("❌ Неверный формат! Используйте: /archive internal_id")
+        return
+    user = await get_user_by_internal_id(internal_id)
+    if not user:
+        await message.reply(f"❌ Пользователь с ID {internal_id} не найден!")
+        return
+    
+    history = await get_archived_user_history(user['user_id'])
+    text = (
+        f"🗄 Архив игрока ID {internal_id} ({get_display_name(user)})\n\n"
+        f"🔨 Выиграно аукционов: {history['won']} на {history['spent']} ⭐\n"
+        f"🌾 Активаций: {history['activations']} (ферм: {history['farms_activated']})\n"
+        f"📅 Дней активности: {history['active_days']}\n"
+    )
+    if history['last_activated']:
+        text += f"Последняя архивная активация: {history['last_activated'][:16].replace('T', ' ')}\n"
+    if history['auctions']:
+        text += "\nПоследние выигранные аукционы:\n"
+        for auction in history['auctions']:
+            farm = catalog.current().farm(auction['farm_type'])
+            farm_name = farm.name if farm else auction['farm_type']
+            text += f"• #{auction['id']} {farm_name} за {auction['current_bid']} ⭐ ({auction['end_time'][:10]})\n"
+    await message.reply(text)
+
 @dp.message(Command("broadcast"))
 async def cmd_broadcast(message: Message):
     if message.from_user.id not in ADMIN_IDS:
@@ -1156,14 +1600,15 @@ async def cmd_dice(message: Message):
             return
         
         await spend_stars(user_id, bet)
+        stats.inc("casino_bets", bet)
         
-        import random
         player_dice = random.randint(1, 6)
         bot_dice = random.randint(1, 6)
         
         if player_dice > bot_dice:
             win = bet * 2
             await add_stars(user_id, win)
+            stats.inc("casino_payouts", win)
             await message.reply(
                 f"🎲 Вы: {player_dice}\n"
                 f"🎲 Бот: {bot_dice}\n\n"
@@ -1215,8 +1660,8 @@ async def cmd_slots(message: Message):
             return
         
         await spend_stars(user_id, bet)
+        stats.inc("casino_bets", bet)
         
-        import random
         symbols = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎"]
         slot1 = random.choice(symbols)
         slot2 = random.choice(symbols)
@@ -1225,6 +1670,7 @@ async def cmd_slots(message: Message):
         if slot1 == slot2 == slot3:
             win = bet * 3
             await add_stars(user_id, win)
+            stats.inc("casino_payouts", win)
             await message.reply(
                 f"🎰 [{slot1}] [{slot2}] [{slot3}]\n\n"
                 f"🎉 ДЖЕКПОТ!\n"
@@ -1233,6 +1679,7 @@ async def cmd_slots(message: Message):
         elif slot1 == slot2 or slot2 == slot3 or slot1 == slot3:
             win = bet * 2
             await add_stars(user_id, win)
+            stats.inc("casino_payouts", win)
             await message.reply(
                 f"🎰 [{slot1}] [{slot2}] [{slot3}]\n\n"
                 f"✅ Вы выиграли {win} ⭐!"
@@ -1282,8 +1729,8 @@ async def cmd_roulette(message: Message):
             return
         
         await spend_stars(user_id, bet)
+        stats.inc("casino_bets", bet)
         
-        import random
         colors = ["🔴", "⚫", "🟢"]
         player_color = random.choice(colors)
         wheel_color = random.choice(colors)
@@ -1292,6 +1739,7 @@ async def cmd_roulette(message: Message):
             multiplier = 5 if wheel_color == "🟢" else 4
             win = bet * multiplier
             await add_stars(user_id, win)
+            stats.inc("casino_payouts", win)
             await message.reply(
                 f"🎯 Вы выбрали: {player_color}\n"
                 f"🎯 Выпало: {wheel_color}\n\n"
@@ -1325,10 +1773,26 @@ async def on_new_member(message: Message):
 async def health_check(request):
     return web.Response(text="OK")
 
+async def health_status(request):
+    try:
+        storage = await maintenance.report()
+    except Exception as e:
+        return web.json_response({"status": "error", "error": str(e)}, status=503)
+    return web.json_response({
+        "status": "ok", "db": storage, "loop": loop_monitor.summary(), "startup": startup_profile.summary()
+    })
+
+async def metrics_handler(request):
+    return web.Response(
+        body=REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
 async def start_http_server():
     app = web.Application()
     app.router.add_get('/', health_check)
-    app.router.add_get('/health', health_check)
+    app.router.add_get('/health', health_status)
+    app.router.add_get('/metrics', metrics_handler)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', int(os.environ.get('PORT', 8000)))
@@ -1336,19 +1800,83 @@ async def start_http_server():
     logger.info("HTTP сервер запущен на порту %s", os.environ.get('PORT', 8000))
     return runner
 
+async def preload():
+    # Fills the caches the first updates after a deploy would otherwise miss one by one
+    banned = await load_bans()
+    build_catalog_renders()
+    recent = []
+    if PRELOAD_USERS > 0:
+        since = (date.today() - timedelta(days=PRELOAD_DAYS)).isoformat()
+        recent = await get_recent_user_names(since, min(PRELOAD_USERS, USER_NAME_CACHE_SIZE))
+        for user_id, username, full_name in recent:
+            user_names.set(user_id, (username, full_name))
+    logger.info(f"Кэши прогреты: банов {banned}, недавних игроков {len(recent)}")
+
+async def reload_bans():
+    # The ban check only reads the in-memory set, bans written by anything but this process reach it here
+    while True:
+        await asyncio.sleep(BAN_RELOAD_INTERVAL)
+        try:
+            await load_bans()
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки списка банов: {e}")
+
+async def deferred(job, delay: float):
+    # Jobs that open with a burst of writes wait until the first updates after boot are served
+    await asyncio.sleep(delay)
+    await job()
+
 async def main():
-    import os
-    
+    startup_profile.mark("setup")
     await init_db()
+    startup_profile.mark("init_db")
     logger.info("База данных инициализирована")
     
+    await preload()
+    startup_profile.mark("preload")
+    
+    await expiry_notifier.load()
+    expiry_task = asyncio.create_task(expiry_notifier.run())
+    sweeper_task = asyncio.create_task(deferred(farm_sweeper.run, STARTUP_DEFER))
+    stats_task = asyncio.create_task(stats.run())
+    backup_task = asyncio.create_task(backup_manager.run()) if BACKUP_INTERVAL > 0 else None
+    archive_task = asyncio.create_task(deferred(archiver.run, STARTUP_DEFER)) if ARCHIVE_INTERVAL > 0 else None
+    maintenance_task = asyncio.create_task(maintenance.run()) if MAINTENANCE_INTERVAL > 0 else None
+    catalog_task = asyncio.create_task(catalog.watch()) if CATALOG_POLL_INTERVAL > 0 else None
+    loop_monitor_task = asyncio.create_task(loop_monitor.run()) if LOOP_MONITOR_INTERVAL > 0 else None
+    bans_task = asyncio.create_task(reload_bans()) if BAN_RELOAD_INTERVAL > 0 else None
+    startup_profile.mark("timers")
+    
+    bot_info = await bot.me()
+    logger.info(f"Бот авторизован как @{bot_info.username}")
+    
     http_runner = await start_http_server()
+    startup_profile.mark("connect")
     
     try:
         logger.info("Бот запущен")
         await dp.start_polling(bot)
     finally:
+        expiry_task.cancel()
+        sweeper_task.cancel()
+        stats_task.cancel()
+        if backup_task:
+            backup_task.cancel()
+        if archive_task:
+            archive_task.cancel()
+        if maintenance_task:
+            maintenance_task.cancel()
+        if catalog_task:
+            catalog_task.cancel()
+        if loop_monitor_task:
+            loop_monitor_task.cancel()
+        if bans_task:
+            bans_task.cancel()
+        income_repricer.stop()
+        await stats.flush()
         await http_runner.cleanup()
+        if update_recorder:
+            update_recorder.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
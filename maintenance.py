@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import database
+from config import (
+    MAINTENANCE_INTERVAL, MAINTENANCE_IDLE_RATE, MAINTENANCE_VACUUM_PAGES, MAINTENANCE_MAX_STEPS, MAINTENANCE_PAUSE
+)
+from metrics import updates_total, db_file_bytes, db_free_pages, db_wal_bytes, maintenance_runs, db_pages_vacuumed
+
+logger = logging.getLogger(__name__)
+
+class Maintenance:
+    # Refreshes planner statistics and returns free pages to the filesystem, but only in windows
+    # where fewer than idle_rate updates per second arrived; vacuum stops as soon as traffic returns.
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL, idle_rate: float = MAINTENANCE_IDLE_RATE,
+                 vacuum_pages: int = MAINTENANCE_VACUUM_PAGES, max_steps: int = MAINTENANCE_MAX_STEPS,
+                 pause: float = MAINTENANCE_PAUSE):
+        self.interval = interval
+        self.idle_rate = idle_rate
+        self.vacuum_pages = vacuum_pages
+        self.max_steps = max_steps
+        self.pause = pause
+        self._updates = updates_total.total()
+        self._sampled = time.monotonic()
+
+    def traffic(self) -> float:
+        now = time.monotonic()
+        updates = updates_total.total()
+        rate = (updates - self._updates) / max(now - self._sampled, 1e-9)
+        self._updates, self._sampled = updates, now
+        return rate
+
+    async def report(self) -> Dict:
+        stats = await database.get_storage_stats()
+        db_file_bytes.set(stats['file_bytes'])
+        db_free_pages.set(stats['freelist_count'])
+        db_wal_bytes.set(stats['wal_bytes'])
+        return stats
+
+    async def vacuum(self) -> int:
+        stats = await self.report()
+        if stats['auto_vacuum'] != 2 or not stats['freelist_count']:
+            return 0
+        freed = 0
+        free_pages = stats['freelist_count']
+        self.traffic()
+        for _ in range(self.max_steps):
+            remaining = await database.incremental_vacuum(self.vacuum_pages)
+            freed += free_pages - remaining
+            free_pages = remaining
+            if not remaining:
+                break
+            await asyncio.sleep(self.pause)
+            if self.traffic() > self.idle_rate:
+                break
+        db_pages_vacuumed.inc(freed)
+        db_free_pages.set(free_pages)
+        return freed
+
+    async def run_once(self) -> Dict:
+        started = time.perf_counter()
+        await database.optimize()
+        freed = await self.vacuum()
+        stats = await self.report()
+        maintenance_runs.inc(result="ok")
+        if freed:
+            logger.info(
+                f"Обслуживание БД: освобождено {freed} страниц, размер {stats['file_bytes'] // 1024 // 1024} МБ, "
+                f"за {time.perf_counter() - started:.1f} с"
+            )
+        return dict(stats, pages_freed=freed)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self.traffic() > self.idle_rate:
+                    maintenance_runs.inc(result="skipped")
+                    await self.report()
+                    continue
+                await self.run_once()
+            except Exception as e:
+                maintenance_runs.inc(result="error")
+                logger.error(f"Ошибка обслуживания БД: {e}")
@@ -0,0 +1,194 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def _samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+REGISTRY = Registry()
+
+updates_total = REGISTRY.counter("bot_updates_total", "Updates received from Telegram", ("type",))
+handlers_in_flight = REGISTRY.gauge("bot_handlers_in_flight", "Updates currently being processed")
+handler_latency = REGISTRY.histogram("bot_handler_duration_seconds", "Handler latency", ("handler",))
+handler_errors = REGISTRY.counter("bot_handler_errors_total", "Handlers that raised", ("handler",))
+db_calls = REGISTRY.counter("bot_db_calls_total", "database.py calls", ("function",))
+db_errors = REGISTRY.counter("bot_db_errors_total", "database.py calls that raised", ("function",))
+db_latency = REGISTRY.histogram("bot_db_call_duration_seconds", "database.py call duration", ("function",))
+api_requests = REGISTRY.counter("bot_api_requests_total", "Outbound Bot API requests", ("method",))
+api_errors = REGISTRY.counter("bot_api_errors_total", "Outbound Bot API requests that failed", ("method",))
+api_rate_limited = REGISTRY.counter("bot_api_rate_limited_total", "Outbound Bot API requests rejected with 429", ("method",))
+api_latency = REGISTRY.histogram("bot_api_request_duration_seconds", "Outbound Bot API request duration", ("method",))
+expiry_timers = REGISTRY.gauge("bot_expiry_timers", "Farm expiry timers waiting to fire")
+expiry_notifications = REGISTRY.counter("bot_expiry_notifications_total", "Farm expiry notifications", ("result",))
+backup_duration = REGISTRY.histogram("bot_backup_duration_seconds", "Online database backup duration", buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+backups_total = REGISTRY.counter("bot_backups_total", "Database backups", ("result",))
+last_backup_timestamp = REGISTRY.gauge("bot_last_backup_timestamp_seconds", "Unix time of the last successful backup")
+farms_expired = REGISTRY.counter("bot_farms_expired_total", "Farms deactivated by the background sweeper")
+rows_archived = REGISTRY.counter("bot_rows_archived_total", "Cold rows moved to the archive database", ("table",))
+db_file_bytes = REGISTRY.gauge("bot_db_file_bytes", "SQLite database file size")
+db_free_pages = REGISTRY.gauge("bot_db_freelist_pages", "Unused pages waiting for incremental vacuum")
+db_wal_bytes = REGISTRY.gauge("bot_db_wal_bytes", "SQLite WAL file size")
+maintenance_runs = REGISTRY.counter("bot_db_maintenance_runs_total", "Database maintenance windows", ("result",))
+db_pages_vacuumed = REGISTRY.counter("bot_db_pages_vacuumed_total", "Pages returned to the filesystem by incremental vacuum")
+startup_seconds = REGISTRY.gauge("bot_startup_seconds", "Time spent in each boot phase", ("phase",))
+loop_lag = REGISTRY.histogram("bot_event_loop_lag_seconds", "Delay of a timer wake-up past its deadline", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+loop_blocks = REGISTRY.counter("bot_event_loop_blocks_total", "Times the loop did not answer the watchdog within the block threshold")
+updates_throttled = REGISTRY.counter("bot_updates_throttled_total", "Updates dropped by a per-user or per-chat rate limit", ("kind",))
+updates_shed = REGISTRY.counter("bot_updates_shed_total", "Updates dropped because too many handlers were in flight", ("kind",))
+callback_duplicates = REGISTRY.counter("bot_callback_duplicates_total", "Repeated taps dropped while the same callback was in flight; shed when the instant answer failed", ("handler", "result"))
+user_lock_waits = REGISTRY.counter("bot_user_lock_waits_total", "Updates that waited for an earlier update of the same player (or lock stripe)")
+
+def observe_db_call(function: str, duration: float, error: bool):
+    db_calls.inc(function=function)
+    db_latency.observe(duration, function=function)
+    if error:
+        db_errors.inc(function=function)
+
+async def update_metrics_middleware(handler, event, data):
+    updates_total.inc(type=event.event_type)
+    handlers_in_flight.inc()
+    try:
+        return await handler(event, data)
+    finally:
+        handlers_in_flight.dec()
+
+def handler_metrics_middleware(label_func):
+    async def middleware(handler, event, data):
+        label = label_func(event)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(handler=label)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, handler=label)
+    return middleware
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        api_requests.inc(method=name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            api_rate_limited.inc(method=name)
+            api_errors.inc(method=name)
+            raise
+        except Exception:
+            api_errors.inc(method=name)
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, method=name)
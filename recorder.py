@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[redacted]"
+PERSONAL_KEYS = ("last_name", "phone_number", "contact", "location", "venue", "photo", "document", "voice", "video", "sticker", "animation", "audio", "bio")
+ID_ARGUMENT_COMMANDS = ("/start",)
+# Every column of game_bot.db holding a Telegram user or chat id
+SNAPSHOT_ID_COLUMNS = (
+    ("users", "user_id"), ("farms", "user_id"), ("nfts", "user_id"),
+    ("referrals", "referrer_id"), ("referrals", "referred_id"), ("auctions", "current_bidder_id"),
+    ("bans", "user_id"), ("bans", "banned_by"), ("farm_activations", "user_id"),
+    ("chats", "chat_id"), ("chat_members", "chat_id"), ("chat_members", "user_id"), ("daily_active", "user_id"),
+)
+
+def load_salt(path: str, recording_path: str) -> str:
+    # Telegram ids are small and dense, an unkeyed hash of them is reversed by brute force.
+    # The salt is generated once and kept away from the recordings, which are meant to be shared
+    salt_dir = os.path.dirname(os.path.abspath(path))
+    if salt_dir == os.path.dirname(os.path.abspath(recording_path)):
+        raise ValueError(f"Соль {path} не должна лежать в одной папке с записью {recording_path}")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    salt = secrets.token_hex(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(salt)
+    logger.info(f"Создана соль для записи апдейтов: {path}")
+    return salt
+
+def anonymize_id(value: int, salt: bytes) -> int:
+    digest = hashlib.blake2b(str(abs(value)).encode(), key=salt, digest_size=6).digest()
+    anonymized = int.from_bytes(digest, "big") or 1
+    return -anonymized if value < 0 else anonymized
+
+def anonymize_snapshot(path: str, salt: str):
+    # Rewrites a copy of game_bot.db the way UpdateRecorder rewrites updates, so a capture
+    # recorded with the same salt replays against the players it was recorded from
+    if not salt:
+        raise ValueError("Анонимизация снимка без соли не совпадёт с записью")
+    key = salt.encode()
+    conn = sqlite3.connect(path)
+    try:
+        conn.create_function("anonymize_id", 1, lambda value: anonymize_id(value, key), deterministic=True)
+        for table, column in SNAPSHOT_ID_COLUMNS:
+            conn.execute(f"UPDATE {table} SET {column} = anonymize_id({column}) WHERE {column} IS NOT NULL")
+        conn.execute("UPDATE users SET username = 'user' || user_id WHERE username IS NOT NULL")
+        conn.execute("UPDATE users SET full_name = 'User' WHERE full_name IS NOT NULL")
+        conn.execute("UPDATE chats SET title = 'Chat' WHERE title IS NOT NULL")
+        conn.execute("UPDATE bans SET reason = ? WHERE reason IS NOT NULL", (REDACTED,))
+        conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"Снимок {path} анонимизирован")
+
+class UpdateRecorder:
+    # Updates are anonymized on the loop and written in batches by a single worker thread,
+    # so the file keeps the order of updates and the loop never waits on the disk
+    def __init__(self, path: str, salt: str, keep_texts=(), flush_every: int = 100, flush_interval: float = 5.0):
+        if not salt:
+            raise ValueError("Запись апдейтов без соли не анонимизирует ID")
+        self.path = path
+        self.salt = salt.encode()
+        self.keep_texts = set(keep_texts)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self._file = open(path, "a", encoding="utf-8")
+        logger.info(f"Запись апдейтов в {path}")
+
+    def anonymize_id(self, value: int) -> int:
+        return anonymize_id(value, self.salt)
+
+    def redact_text(self, text: str) -> str:
+        if text in self.keep_texts:
+            return text
+        if not text.startswith("/"):
+            return REDACTED
+        command, *args = text.split()
+        kept = [command]
+        for arg in args:
+            if not arg.lstrip("-").isdigit():
+                kept.append(REDACTED)
+            elif command.split("@")[0] in ID_ARGUMENT_COMMANDS:
+                kept.append(str(self.anonymize_id(int(arg))))
+            else:
+                kept.append(arg)
+        return " ".join(kept)
+
+    def anonymize(self, obj):
+        if isinstance(obj, list):
+            return [self.anonymize(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        result = {}
+        is_user = "is_bot" in obj
+        is_chat = "type" in obj and "id" in obj and not is_user
+        for key, value in obj.items():
+            if key in PERSONAL_KEYS:
+                continue
+            if key in ("text", "caption") and isinstance(value, str):
+                result[key] = self.redact_text(value)
+            elif key in ("entities", "caption_entities"):
+                result[key] = [entity for entity in value if entity.get("type") == "bot_command" and entity.get("offset") == 0]
+            elif key == "id" and (is_user or is_chat) and isinstance(value, int) and not obj.get("is_bot"):
+                result[key] = self.anonymize_id(value)
+            elif key in ("first_name", "title") and (is_user or is_chat):
+                result[key] = "User" if key == "first_name" else "Chat"
+            elif key == "username" and (is_user or is_chat):
+                if obj.get("is_bot"):
+                    result[key] = value
+                else:
+                    result[key] = f"user{self.anonymize_id(obj['id'])}"
+            else:
+                result[key] = self.anonymize(value)
+        return result
+
+    def record(self, update):
+        payload = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        line = json.dumps({"ts": time.time(), "update": self.anonymize(payload)}, ensure_ascii=False)
+        self._buffer.append(line + "\n")
+        now = time.monotonic()
+        if len(self._buffer) >= self.flush_every or now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+
+    def _write(self, lines):
+        try:
+            self._file.writelines(lines)
+            self._file.flush()
+        except Exception as e:
+            logger.error(f"Ошибка записи апдейтов в {self.path}: {e}")
+
+    def flush(self, now: float = None):
+        lines, self._buffer = self._buffer, []
+        self._last_flush = now if now is not None else time.monotonic()
+        if lines:
+            self._writer.submit(self._write, lines)
+
+    async def __call__(self, handler, event, data):
+        try:
+            self.record(event)
+        except Exception as e:
+            logger.error(f"Ошибка записи апдейта: {e}")
+        return await handler(event, data)
+
+    def close(self):
+        self.flush()
+        self._writer.shutdown(wait=True)
+        self._file.close()
@@ -0,0 +1,229 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, Optional, Union
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+import database
+from config import FARM_ACTIVE_HOURS, EXPIRY_NOTIFY_RATE, FARM_SWEEP_INTERVAL, FARM_SWEEP_BATCH, FARM_SWEEP_PAUSE
+from metrics import expiry_timers, expiry_notifications, farms_expired
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_TEXT = "⏰ Ваши фермы перестали работать!\n\n🔄 Активируйте их снова: /activate"
+
+class TimerWheel:
+    # Hashed timing wheel: one slot per tick, user ids packed into array('q') (8 bytes per timer).
+    # Deadlines further away than the wheel covers wait in a heap until they come into range.
+    def __init__(self, resolution: float = 1.0, slots: int = 3600):
+        self.resolution = resolution
+        self.slots = slots
+        self._wheel: List[array] = [None] * slots
+        self._overflow = []
+        self._tick = int(time.time() // resolution)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, user_id: int, deadline: float):
+        tick = max(math.ceil(deadline / self.resolution), self._tick)
+        if tick - self._tick >= self.slots:
+            heapq.heappush(self._overflow, (tick, user_id))
+        else:
+            self._put(tick, user_id)
+        self._count += 1
+
+    def _put(self, tick: int, user_id: int):
+        index = tick % self.slots
+        bucket = self._wheel[index]
+        if bucket is None:
+            bucket = self._wheel[index] = array('q')
+        bucket.append(user_id)
+
+    def next_deadline(self) -> float:
+        # Start of the first tick not advanced yet: its slot is due as soon as that time comes
+        return self._tick * self.resolution
+
+    def advance(self, now: float) -> List[array]:
+        target = int(now // self.resolution)
+        due = []
+        overflow = self._overflow
+        while overflow and overflow[0][0] <= target:
+            due.append(array('q', [heapq.heappop(overflow)[1]]))
+        while self._tick <= target:
+            index = self._tick % self.slots
+            bucket = self._wheel[index]
+            if bucket is not None:
+                self._wheel[index] = None
+                due.append(bucket)
+            self._tick += 1
+        while overflow and overflow[0][0] - self._tick < self.slots:
+            tick, user_id = heapq.heappop(overflow)
+            self._put(tick, user_id)
+        self._count -= sum(len(bucket) for bucket in due)
+        return due
+
+class ExpiryNotifier:
+    def __init__(self, bot, rate: int = EXPIRY_NOTIFY_RATE, resolution: float = 1.0):
+        self.bot = bot
+        self.rate = rate
+        slots = int(FARM_ACTIVE_HOURS * 3600 / resolution) + 60
+        self.wheel = TimerWheel(resolution, slots)
+        self._queue = deque()
+        self._queued = set()
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, user_id: int, expires_at: Union[str, datetime, float]):
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        if isinstance(expires_at, datetime):
+            expires_at = expires_at.timestamp()
+        self.wheel.schedule(user_id, expires_at)
+        expiry_timers.set(len(self.wheel))
+
+    async def load(self, page_size: int = 10000) -> int:
+        after, after_id = datetime.now().isoformat(), 0
+        loaded = 0
+        while True:
+            rows = await database.get_farm_expiries(after, after_id, page_size)
+            for activation_id, user_id, expires_at in rows:
+                self.wheel.schedule(user_id, datetime.fromisoformat(expires_at).timestamp())
+            loaded += len(rows)
+            if len(rows) < page_size:
+                break
+            after_id, _, after = rows[-1]
+        expiry_timers.set(len(self.wheel))
+        logger.info(f"Загружено таймеров окончания ферм: {loaded}")
+        return loaded
+
+    def _enqueue(self, buckets: List[array]):
+        for bucket in buckets:
+            for user_id in bucket:
+                if user_id not in self._queued:
+                    self._queued.add(user_id)
+                    self._queue.append(user_id)
+        if self._queue:
+            self._wakeup.set()
+
+    async def tick(self):
+        while True:
+            delay = self.wheel.next_deadline() - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._enqueue(self.wheel.advance(time.time()))
+            expiry_timers.set(len(self.wheel))
+
+    async def send(self):
+        interval = 1 / self.rate if self.rate > 0 else 0
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            user_id = self._queue[0]
+            try:
+                # Timers are never cancelled: a later batch may still be running, or the player
+                # reactivated since, in which case the timer moves to the stored next expiry
+                next_expiry = (await database.get_income_state(user_id))['next_expiry']
+                if next_expiry and datetime.fromisoformat(next_expiry).timestamp() > time.time():
+                    self.schedule(user_id, next_expiry)
+                    expiry_notifications.inc(result="rescheduled")
+                else:
+                    await self.bot.send_message(user_id, EXPIRY_TEXT)
+                    expiry_notifications.inc(result="sent")
+            except TelegramRetryAfter as e:
+                expiry_notifications.inc(result="rate_limited")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest):
+                expiry_notifications.inc(result="undeliverable")
+            except Exception as e:
+                expiry_notifications.inc(result="error")
+                logger.error(f"Ошибка уведомления об окончании ферм для {user_id}: {e}")
+            self._queue.popleft()
+            self._queued.discard(user_id)
+            if interval:
+                await asyncio.sleep(interval)
+
+    async def run(self):
+        await asyncio.gather(self.tick(), self.send())
+
+class FarmSweeper:
+    # Expires farms in small transactions so foreground writes never wait behind one big UPDATE
+    def __init__(self, interval: float = FARM_SWEEP_INTERVAL, batch_size: int = FARM_SWEEP_BATCH, pause: float = FARM_SWEEP_PAUSE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def _drain(self, step) -> int:
+        total = 0
+        while True:
+            count = await step(self.batch_size)
+            total += count
+            if count < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
+
+    async def sweep(self) -> tuple[int, int]:
+        expired = await self._drain(database.expire_farms_batch)
+        refreshed = await self._drain(database.refresh_expired_income_batch)
+        if expired:
+            farms_expired.inc(expired)
+            logger.info(f"Деактивировано ферм: {expired}, обновлено игроков: {refreshed}")
+        return expired, refreshed
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой деактивации ферм: {e}")
+            await asyncio.sleep(self.interval)
+
+class IncomeRepricer:
+    # A catalog reload changes the value of farms and NFTs players already own. Running activations
+    # and holders' boost are rewritten in small transactions; changes arriving during a pass are
+    # picked up by the next one, always priced from the current catalog
+    def __init__(self, batch_size: int = FARM_SWEEP_BATCH, pause: float = FARM_SWEEP_PAUSE):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.farm_types = set()
+        self.nft_types = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def request(self, farm_types: Iterable[str], nft_types: Iterable[str]):
+        self.farm_types.update(farm_types)
+        self.nft_types.update(nft_types)
+        if (self.farm_types or self.nft_types) and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self.run())
+
+    async def _drain(self, step, types) -> int:
+        after, total = 0, 0
+        while True:
+            after, count = await step(types, after, self.batch_size)
+            total += count
+            if count < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
+
+    async def run(self):
+        try:
+            while self.farm_types or self.nft_types:
+                farm_types, self.farm_types = self.farm_types, set()
+                nft_types, self.nft_types = self.nft_types, set()
+                repriced = await self._drain(database.reprice_activations_batch, farm_types) if farm_types else 0
+                reboosted = await self._drain(database.reboost_holders_batch, nft_types) if nft_types else 0
+                logger.info(f"Доходы пересчитаны по новому каталогу: активаций {repriced}, игроков с NFT {reboosted}")
+        except Exception as e:
+            logger.error(f"Ошибка пересчета доходов после перезагрузки каталога: {e}")
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
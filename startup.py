@@ -0,0 +1,44 @@
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class StartupProfile:
+    # Wall time of each boot phase, measured back to back from `started`, plus the time until the
+    # first update was answered; exported once as a gauge and kept for /health
+    def __init__(self, started: float, gauge=None):
+        self.started = started
+        self.gauge = gauge
+        self.phases: Dict[str, float] = {}
+        self.first_update: Optional[float] = None
+        self._last = started
+
+    def mark(self, phase: str) -> float:
+        now = time.perf_counter()
+        duration = now - self._last
+        self._last = now
+        self.phases[phase] = duration
+        if self.gauge:
+            self.gauge.set(duration, phase=phase)
+        return duration
+
+    def summary(self) -> Dict:
+        result = {phase: round(duration, 4) for phase, duration in self.phases.items()}
+        if self.first_update is not None:
+            result["first_update"] = round(self.first_update, 4)
+        return result
+
+    async def middleware(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            if self.first_update is None:
+                self.first_update = time.perf_counter() - self.started
+                if self.gauge:
+                    self.gauge.set(self.first_update, phase="first_update")
+                logger.info(
+                    "Профиль запуска: "
+                    + ", ".join(f"{phase} {duration:.2f} с" for phase, duration in self.phases.items())
+                    + f"; первое обновление через {self.first_update:.2f} с"
+                )
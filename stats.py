@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict
+
+from aiogram.types import Message, CallbackQuery
+
+import database
+from config import STATS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class StatsBuffer:
+    # Event counters (casino, DAU) are summed in memory and flushed into the
+    # stats_daily rollup; table totals are kept by triggers in database.py.
+    def __init__(self, flush_interval: float = STATS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._counters: Dict[str, Counter] = {}
+        self._active: Dict[str, set] = {}
+        self._seen_day = None
+        self._seen = set()
+
+    def inc(self, key: str, amount: int = 1):
+        self._counters.setdefault(date.today().isoformat(), Counter())[key] += amount
+
+    def mark_active(self, user_id: int):
+        day = date.today().isoformat()
+        if day != self._seen_day:
+            self._seen_day = day
+            self._seen = set()
+        if user_id not in self._seen:
+            self._seen.add(user_id)
+            self._active.setdefault(day, set()).add(user_id)
+
+    async def flush(self):
+        counters, self._counters = self._counters, {}
+        active, self._active = self._active, {}
+        try:
+            for day in list(counters):
+                await database.record_daily_stats(day, dict(counters[day]))
+                del counters[day]
+            for day in list(active):
+                await database.mark_active_users(day, active[day])
+                del active[day]
+        finally:
+            # Each day is written in one transaction: what was not written goes back for the
+            # next flush, merged with whatever arrived meanwhile
+            for day, values in counters.items():
+                self._counters.setdefault(day, Counter()).update(values)
+            for day, user_ids in active.items():
+                self._active.setdefault(day, set()).update(user_ids)
+
+    async def snapshot(self, days: int = 7) -> Dict:
+        await self.flush()
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        return await database.get_stats_snapshot(since)
+
+    async def middleware(self, handler, event, data):
+        if isinstance(event, (Message, CallbackQuery)) and event.from_user:
+            self.mark_active(event.from_user.id)
+        return await handler(event, data)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения статистики: {e}")
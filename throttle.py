@@ -0,0 +1,148 @@
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram.types import Message, CallbackQuery
+
+from config import THROTTLE_LIMITS, THROTTLE_NOTICE_INTERVAL, THROTTLE_MAX_IN_FLIGHT, ADMIN_IDS
+from metrics import handlers_in_flight, updates_throttled, updates_shed, callback_duplicates
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN_TEXT = "⏳ Слишком часто! Подождите пару секунд."
+SWEEP_INTERVAL = 60.0
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    # "casino=0.5:3,chat=5:20" -> {"casino": (0.5 per second, burst 3), "chat": (5.0, 20)}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, value = item.split("=")
+        rate, burst = value.split(":")
+        limits[name.strip()] = (float(rate), int(burst))
+    return limits
+
+class Throttle:
+    # Token buckets kept as one float per key, the time at which the bucket is full again (GCRA):
+    # a request is allowed while that time is at most burst - 1 intervals ahead. Keys whose bucket
+    # is already full carry no information and are swept out, so memory follows recent activity.
+    # Runs as an outer middleware, ahead of every database access on the update path.
+    def __init__(self, classify: Callable, limits: Dict[str, Tuple[float, int]] = None,
+                 notice_interval: float = THROTTLE_NOTICE_INTERVAL, max_in_flight: int = THROTTLE_MAX_IN_FLIGHT,
+                 exempt: Iterable[int] = ADMIN_IDS):
+        self.classify = classify
+        self.limits = limits if limits is not None else parse_limits(THROTTLE_LIMITS)
+        self.notice_interval = notice_interval
+        self.max_in_flight = max_in_flight
+        self.exempt = frozenset(exempt)
+        self._buckets: Dict[str, Dict[int, float]] = {name: {} for name in self.limits}
+        self._notices: Dict[int, float] = {}
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def _take(self, name: str, key: int, now: float) -> Optional[float]:
+        # New full-at time if a token is available, None when the bucket is empty
+        limit = self.limits.get(name)
+        if limit is None:
+            return now
+        rate, burst = limit
+        interval = 1 / rate
+        full_at = max(self._buckets[name].get(key, now), now)
+        if full_at - now > (burst - 1) * interval:
+            return None
+        return full_at + interval
+
+    def limited(self, name: str, user_id: int, chat_id: Optional[int], now: float) -> Optional[int]:
+        # None when the update may pass, otherwise the user or group chat whose bucket is empty.
+        # Both ids share one key space: group chat ids are negative.
+        user_full_at = self._take(name, user_id, now)
+        if user_full_at is None:
+            return user_id
+        if chat_id is not None and "chat" in self.limits:
+            chat_full_at = self._take("chat", chat_id, now)
+            if chat_full_at is None:
+                return chat_id
+            self._buckets["chat"][chat_id] = chat_full_at
+        if name in self._buckets:
+            self._buckets[name][user_id] = user_full_at
+        return None
+
+    def sweep(self, now: float):
+        for buckets in self._buckets.values():
+            for key in [key for key, full_at in buckets.items() if full_at <= now]:
+                del buckets[key]
+        for key in [key for key, sent in self._notices.items() if now - sent >= self.notice_interval]:
+            del self._notices[key]
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    async def _answer_dropped(self, event):
+        # A dropped callback still needs its answer, or the button spins until Telegram gives up.
+        # Answering touches no database, so it is safe even while shedding load
+        if not isinstance(event, CallbackQuery):
+            return
+        try:
+            await event.answer()
+        except Exception as e:
+            logger.debug(f"Не удалось ответить на отброшенное нажатие {event.data}: {e}")
+
+    async def _slow_down(self, event, key: int, now: float):
+        # One reply per user (or per group, for the shared bucket) per window, the rest is dropped
+        # silently apart from the callback answer
+        if now - self._notices.get(key, float("-inf")) < self.notice_interval:
+            await self._answer_dropped(event)
+            return
+        self._notices[key] = now
+        try:
+            # A reply for messages, a toast for callbacks, which also stops the button spinner
+            await event.answer(SLOW_DOWN_TEXT)
+        except Exception as e:
+            logger.debug(f"Не удалось предупредить {key} о лимите: {e}")
+
+    async def __call__(self, handler, event, data):
+        if not isinstance(event, (Message, CallbackQuery)) or not event.from_user or event.from_user.id in self.exempt:
+            return await handler(event, data)
+        name = self.classify(event)
+        if name is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        if self.max_in_flight and handlers_in_flight.value() > self.max_in_flight:
+            updates_shed.inc(kind=name)
+            await self._answer_dropped(event)
+            return None
+
+        user_id = event.from_user.id
+        chat = event.chat if isinstance(event, Message) else (event.message.chat if event.message else None)
+        chat_id = chat.id if chat and chat.type in ("group", "supergroup") else None
+        key = self.limited(name, user_id, chat_id, now)
+        if key is not None:
+            updates_throttled.inc(kind=name)
+            await self._slow_down(event, key, now)
+            return None
+        return await handler(event, data)
+
+class CallbackDedup:
+    # Repeated taps on the same button while its first tap is still being handled: the repeats
+    # are answered at once (clearing their spinners) and never reach the handler
+    def __init__(self, label: Callable, enabled: bool = True):
+        self.label = label
+        self.enabled = enabled
+        self.in_flight = set()
+
+    async def __call__(self, handler, event: CallbackQuery, data):
+        if not self.enabled or not event.from_user:
+            return await handler(event, data)
+        key = (event.from_user.id, event.data)
+        if key in self.in_flight:
+            try:
+                await event.answer()
+                callback_duplicates.inc(handler=self.label(event), result="answered")
+            except Exception as e:
+                callback_duplicates.inc(handler=self.label(event), result="shed")
+                logger.debug(f"Не удалось ответить на повторное нажатие {event.data}: {e}")
+            return None
+        self.in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight.discard(key)
@@ -0,0 +1,75 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from config import TRACE_SLOW_UPDATE_MS, TRACE_DB_CALL_BUDGET
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+class Trace:
+    __slots__ = ("label", "user_id", "started", "db_calls", "api_calls")
+
+    def __init__(self, label: str, user_id: Optional[int]):
+        self.label = label
+        self.user_id = user_id
+        self.started = time.perf_counter()
+        self.db_calls = []
+        self.api_calls = []
+
+    def summary(self, duration: float) -> dict:
+        db_time = sum(duration for _, duration in self.db_calls)
+        api_time = sum(duration for _, duration in self.api_calls)
+        return {
+            "handler": self.label,
+            "user_id": self.user_id,
+            "duration_ms": round(duration * 1000, 2),
+            "db_calls": len(self.db_calls),
+            "db_ms": round(db_time * 1000, 2),
+            "db_by_function": dict(Counter(name for name, _ in self.db_calls).most_common()),
+            "api_calls": len(self.api_calls),
+            "api_ms": round(api_time * 1000, 2),
+            "api_by_method": dict(Counter(name for name, _ in self.api_calls).most_common()),
+        }
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def record_db_call(function: str, duration: float, error: bool):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.db_calls.append((function, duration))
+
+class RequestTraceMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        trace = _current_trace.get()
+        if trace is None:
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            trace.api_calls.append((method.__api_method__, time.perf_counter() - started))
+
+def trace_middleware(label_func):
+    async def middleware(handler, event, data):
+        user = getattr(event, "from_user", None)
+        trace = Trace(label_func(event), user.id if user else None)
+        token = _current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - trace.started
+            over_budget = len(trace.db_calls) > TRACE_DB_CALL_BUDGET
+            if over_budget or duration * 1000 >= TRACE_SLOW_UPDATE_MS:
+                summary = trace.summary(duration)
+                summary["db_budget_exceeded"] = over_budget
+                logger.warning("slow update trace %s", json.dumps(summary, ensure_ascii=False))
+    return middleware
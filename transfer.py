@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import time
+from itertools import chain, islice
+from typing import Dict, List, Optional
+
+import database
+
+PAGE_SIZE = 10000
+CHUNK_SIZE = 50000
+FORMATS = ("jsonl", "csv")
+
+# Exported tables with the unique column used for keyset pagination, in import order
+TABLES = (
+    ("users", "user_id"),
+    ("farms", "id"),
+    ("nfts", "id"),
+    ("referrals", "id"),
+    ("auctions", "id"),
+    ("bans", "user_id"),
+)
+TABLE_KEYS = dict(TABLES)
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel=6, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def _use_database(path: str, coro_func):
+    previous = database.DB_NAME
+    database.DB_NAME = path
+    try:
+        return asyncio.run(coro_func())
+    finally:
+        database.DB_NAME = previous
+
+def _pages(conn, table: str, key: str, key_index: int, page_size: int):
+    # Each page is its own short read, so a running bot is never blocked for the whole export.
+    # For a point-in-time dump export a /backup snapshot instead of the live file.
+    cursor = conn.execute(f"SELECT * FROM {table} ORDER BY {key} LIMIT ?", (page_size,))
+    while True:
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        cursor = conn.execute(f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                              (rows[-1][key_index], page_size))
+
+def export_table(conn, table: str, path: str, fmt: str, page_size: int = PAGE_SIZE) -> int:
+    key = TABLE_KEYS[table]
+    columns = [column[0] for column in conn.execute(f"SELECT * FROM {table} LIMIT 0").description]
+    count = 0
+    with _open(path, "w") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        for rows in _pages(conn, table, key, columns.index(key), page_size):
+            if fmt == "csv":
+                # NULL is written as an empty field and read back as NULL
+                writer.writerows(["" if value is None else value for value in row] for row in rows)
+            else:
+                f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+            count += len(rows)
+    return count
+
+def export(path: str, directory: str, tables: List[str], fmt: str = "jsonl", compress: bool = False,
+           page_size: int = PAGE_SIZE, verbose: bool = True) -> Dict[str, int]:
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    conn = sqlite3.connect(path)
+    try:
+        for table in tables:
+            started = time.perf_counter()
+            target = os.path.join(directory, f"{table}.{fmt}" + (".gz" if compress else ""))
+            counts[table] = export_table(conn, table, target, fmt, page_size)
+            if verbose:
+                print(f"{table:<10} {counts[table]:>10} rows in {time.perf_counter() - started:.2f}s -> {target}")
+    finally:
+        conn.close()
+    return counts
+
+def _find_dump(directory: str, table: str) -> Optional[tuple]:
+    for fmt in FORMATS:
+        for suffix in ("", ".gz"):
+            path = os.path.join(directory, f"{table}.{fmt}{suffix}")
+            if os.path.exists(path):
+                return path, fmt
+    return None
+
+def _read_rows(f, fmt: str, existing: set) -> tuple:
+    # Returns the columns present in both the dump and the table, the skipped ones and the value tuples
+    if fmt == "csv":
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        keep = [index for index, column in enumerate(columns) if column in existing]
+        names = [columns[index] for index in keep]
+        rows = (tuple(None if row[index] == "" else row[index] for index in keep) for row in reader)
+    else:
+        items = (json.loads(line) for line in f if line.strip())
+        first = next(items, None)
+        columns = list(first or ())
+        names = [column for column in columns if column in existing]
+        rows = (tuple(map(item.get, names)) for item in chain([first], items)) if first else iter(())
+    return names, [column for column in columns if column not in existing], rows
+
+def import_table(conn, table: str, path: str, fmt: str, chunk_size: int = CHUNK_SIZE) -> int:
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    count = 0
+    with _open(path, "r") as f:
+        names, skipped, rows = _read_rows(f, fmt, existing)
+        if skipped:
+            print(f"{table}: пропущены неизвестные колонки {', '.join(skipped)}")
+        if not names:
+            return 0
+        sql = f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        while chunk := list(islice(rows, chunk_size)):
+            with conn:
+                conn.executemany(sql, chunk)
+            count += len(chunk)
+    return count
+
+def _drop_schema(conn, kind: str, tables: List[str]) -> List[str]:
+    placeholders = ", ".join("?" * len(tables))
+    rows = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = ? AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        (kind, *tables)
+    ).fetchall()
+    for name, _ in rows:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return [sql for _, sql in rows]
+
+def import_dump(path: str, directory: str, tables: List[str], fast: bool = False,
+                chunk_size: int = CHUNK_SIZE, verbose: bool = True) -> Dict[str, int]:
+    # The bot must be stopped: triggers are dropped for the duration of the import
+    _use_database(path, database.init_db)
+    dumps = {table: _find_dump(directory, table) for table in tables}
+    tables = [table for table in tables if dumps[table]]
+    counts = {}
+    conn = sqlite3.connect(path)
+    try:
+        if fast:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+        with conn:
+            # Stats and search triggers would count every imported row as today's activity;
+            # totals and the FTS index are rebuilt from the final tables instead.
+            triggers = _drop_schema(conn, "trigger", tables)
+            indexes = _drop_schema(conn, "index", tables) if fast else []
+        for table in tables:
+            started = time.perf_counter()
+            dump_path, fmt = dumps[table]
+            counts[table] = import_table(conn, table, dump_path, fmt, chunk_size)
+            if verbose:
+                print(f"{table:<10} {counts[table]:>10} rows in {time.perf_counter() - started:.2f}s <- {dump_path}")
+        started = time.perf_counter()
+        with conn:
+            for sql in indexes + triggers:
+                conn.execute(sql)
+        if fast:
+            conn.execute("ANALYZE")
+        if verbose and indexes:
+            print(f"{len(indexes)} индексов построено за {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+    _use_database(path, database.rebuild_income_state)
+    _use_database(path, database.rebuild_stats_totals)
+    _use_database(path, database.rebuild_search_index)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream game state to and from JSONL/CSV dumps")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write one dump file per table")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    export_parser.add_argument("--gzip", action="store_true")
+    export_parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    import_parser = commands.add_parser("import", help="load dump files into a database")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--fast", action="store_true",
+                               help="no journal, no fsync, indexes built after loading")
+    import_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    for command in (export_parser, import_parser):
+        command.add_argument("--db", default=database.DB_NAME)
+        command.add_argument("--tables", nargs="*", choices=list(TABLE_KEYS), default=list(TABLE_KEYS))
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    if args.command == "export":
+        export(args.db, args.directory, args.tables, args.format, args.gzip, args.page_size)
+    else:
+        import_dump(args.db, args.directory, args.tables, args.fast, args.chunk_size)
+    print(f"Готово за {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
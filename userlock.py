@@ -0,0 +1,29 @@
+import asyncio
+from typing import Iterable, List
+
+from config import USER_LOCK_STRIPES, ADMIN_IDS
+from metrics import user_lock_waits
+
+class UserLocks:
+    # Handlers of one player never overlap, so read-modify-write helpers such as spend_stars and
+    # collect_farm_income see their own writes. The locks are a fixed pool indexed by user_id:
+    # memory does not grow with the player count, and two players sharing a stripe only wait
+    # for each other. Admins are left out: /broadcast and bulk commands run for minutes inside
+    # the handler and would hold their stripe for as long.
+    def __init__(self, stripes: int = USER_LOCK_STRIPES, enabled: bool = True, exempt: Iterable[int] = ADMIN_IDS):
+        self.locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(stripes)]
+        self.enabled = enabled
+        self.exempt = frozenset(exempt)
+
+    def lock(self, user_id: int) -> asyncio.Lock:
+        return self.locks[user_id % len(self.locks)]
+
+    async def middleware(self, handler, event, data):
+        user = getattr(event, "from_user", None)
+        if not self.enabled or user is None or user.id in self.exempt:
+            return await handler(event, data)
+        lock = self.lock(user.id)
+        if lock.locked():
+            user_lock_waits.inc()
+        async with lock:
+            return await handler(event, data)